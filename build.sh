@@ -6,5 +6,7 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py createcachetable
+python manage.py reconstruir_resumenes
 # --- ESTA ES LA LÍNEA NUEVA ---
 python crear_usuario.py
\ No newline at end of file
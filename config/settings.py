@@ -74,6 +74,43 @@ DATABASES = {
     )
 }
 
+# --- CACHÉ (DASHBOARD Y REPORTES) ---
+# locmem: memoria del proceso, sirve con un solo worker.
+# db / file: compartida entre los workers de gunicorn, para que la invalidación
+# de un worker la vean todos (con db hay que correr `createcachetable`).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'mym_cache',
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mym',
+        }
+    }
+
+# PDFs de guías ya renderizados (ver gestion/pdf_guias.py). Con PDF_PRERENDER=1
+# cada guía guardada deja encolado su PDF para `manage.py procesar_reportes`.
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', str(BASE_DIR / '.cache' / 'pdf_guias'))
+PDF_PRERENDER = os.environ.get('PDF_PRERENDER') == '1'
+# Motor de PDFs de guías: 'xhtml2pdf' (plantilla HTML) o 'reportlab' (dibujo directo, más rápido)
+PDF_MOTOR = os.environ.get('PDF_MOTOR', 'xhtml2pdf')
+# Procesos para renderizar PDFs en lote (acción "Imprimir guías" del admin)
+PDF_PROCESOS = int(os.environ.get('PDF_PROCESOS', os.cpu_count() or 1))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -123,6 +160,7 @@ JAZZMIN_SETTINGS = {
     "topmenu_links": [
         {"name": "🏠 Dashboard",  "url": "home", "permissions": ["auth.view_user"]}, 
         {"name": "⚙️ Panel Admin", "url": "admin:index", "permissions": ["auth.view_user"]},
+        {"name": "📒 Cuentas por cobrar", "url": "reporte_cobranza", "permissions": ["auth.view_user"]},
     ],
 
     "show_sidebar": True,
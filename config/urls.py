@@ -8,11 +8,24 @@ from django.conf.urls.static import static
 from gestion.views import (
     dashboard_analiticas,
     generar_pdf_guia,
+    generar_pdf_guias_lote,
     exportar_reporte_excel,
     health_check,
     api_info_producto,
     api_info_cliente,
-    reporte_asesores  # <--- AGREGADO: La nueva vista
+    api_info_lote,
+    api_catalogo_productos,
+    api_registrar_pago,
+    reporte_asesores,  # <--- AGREGADO: La nueva vista
+    api_reporte_asesores,
+    reporte_cobranza,
+    exportar_cobranza_excel,
+    estadisticas_cache,
+    encolar_reporte_excel,
+    trabajo_reporte,
+    api_trabajo_reporte,
+    descargar_trabajo_reporte,
+    recibos_periodo_nomina,
 )
 
 urlpatterns = [
@@ -26,11 +39,19 @@ urlpatterns = [
 
     # 3. RUTAS DE REPORTES Y PDF
     path('dashboard/', dashboard_analiticas, name='dashboard_analytics'),
+    path('dashboard/cache/', estadisticas_cache, name='estadisticas_cache'),
     path('imprimir/guia/<int:guia_id>/', generar_pdf_guia, name='imprimir_guia'),
+    path('imprimir/guias/', generar_pdf_guias_lote, name='imprimir_guias'),
     path('reporte/excel/', exportar_reporte_excel, name='exportar_excel'),
+    path('reporte/excel/encolar/', encolar_reporte_excel, name='encolar_excel'),
+    path('reporte/trabajo/<int:trabajo_id>/', trabajo_reporte, name='trabajo_reporte'),
+    path('reporte/trabajo/<int:trabajo_id>/descargar/', descargar_trabajo_reporte, name='descargar_trabajo_reporte'),
     
     # --- NUEVA RUTA: REPORTE DE ASESORES ---
     path('reporte/asesores/', reporte_asesores, name='reporte_asesores'),
+    path('reporte/cobranza/', reporte_cobranza, name='reporte_cobranza'),
+    path('reporte/cobranza/excel/', exportar_cobranza_excel, name='exportar_cobranza_excel'),
+    path('reporte/nomina/<int:periodo_id>/', recibos_periodo_nomina, name='recibos_periodo_nomina'),
 
     # 4. SALUD DEL SISTEMA (CRON JOBS)
     path('health/', health_check, name='health_check'),
@@ -39,6 +60,11 @@ urlpatterns = [
     # Estas rutas son las que llama tu archivo custom_admin.js
     path('api/cliente/<int:cliente_id>/', api_info_cliente, name='api_info_cliente'),
     path('api/producto/<int:producto_id>/', api_info_producto, name='api_info_producto'),
+    path('api/info/', api_info_lote, name='api_info_lote'),
+    path('api/catalogo/productos/', api_catalogo_productos, name='api_catalogo_productos'),
+    path('api/cliente/<int:cliente_id>/pago/', api_registrar_pago, name='api_registrar_pago'),
+    path('api/trabajo/<int:trabajo_id>/', api_trabajo_reporte, name='api_trabajo_reporte'),
+    path('api/reporte/asesores/', api_reporte_asesores, name='api_reporte_asesores'),
 ]
 
 # --- CONFIGURACIÓN PARA IMÁGENES (SOLO EN MODO DEBUG) ---
@@ -1,16 +1,24 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.urls import reverse
+from django.urls import path, reverse
 from django.utils import timezone 
-from django.http import HttpResponseRedirect, HttpResponse
-from django.db.models import Sum
-from datetime import datetime
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Sum, Count, F, Q, DecimalField
+from django.db.models.functions import Coalesce
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
 
 # Importamos tus modelos
-from .models import Cliente, Producto, GuiaEntrega, DetalleGuia, Pago, Proveedor, Gasto, Asistencia, PerfilColaborador
+from .models import Cliente, Producto, GuiaEntrega, DetalleGuia, Pago, Proveedor, Gasto, Asistencia, PerfilColaborador, MovimientoStock, SecuenciaGuia, TrabajoReporte, PeriodoNomina, programar_resumenes
+from . import cobranza, conciliacion, importar_asistencia, nomina
+from .busqueda import BusquedaIndexadaMixin
+from .paginacion import PaginacionKeysetMixin
+from .reportes import PLAZOS_POR_PAGAR, condicion_plazo
 
 # --- 0. CONFIGURACIÓN DE USUARIOS (NÓMINA) ---
 class PerfilInline(admin.StackedInline):
@@ -30,7 +38,7 @@ admin.site.register(User, UserAdmin)
 
 # --- 1. CONFIGURACIÓN DE PRODUCTOS (ORDENADO A-Z) ---
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
+class ProductoAdmin(BusquedaIndexadaMixin, admin.ModelAdmin):
     list_display = ('nombre', 'precio_unitario', 'stock_actual', 'alerta_stock')
     search_fields = ('nombre',)
     list_per_page = 20
@@ -41,100 +49,95 @@ class ProductoAdmin(admin.ModelAdmin):
             return []
         return ['nombre', 'precio_unitario']
 
+    # El stock solo se mueve por el kardex: si lo editan a mano se registra un AJUSTE
+    def save_model(self, request, obj, form, change):
+        nuevo_stock = obj.stock_actual
+        if change:
+            anterior = Producto.objects.filter(pk=obj.pk).values_list('stock_actual', flat=True).get()
+            obj.save(update_fields=['nombre', 'precio_unitario', 'actualizado'])
+        else:
+            anterior = 0
+            obj.stock_actual = 0
+            obj.save()
+
+        if nuevo_stock != anterior:
+            MovimientoStock(
+                producto=obj, tipo='AJUSTE', cantidad=nuevo_stock - anterior,
+                referencia=f"Ajuste manual ({request.user.username})",
+            ).save()
+        obj.refresh_from_db(fields=['stock_actual'])
+
     def alerta_stock(self, obj):
         if obj.stock_actual <= 10:
             return format_html('<span style="color:red; font-weight:bold;">⚠️ BAJO ({})</span>', obj.stock_actual)
         return format_html('<span style="color:green; font-weight:bold;">✅ OK ({})</span>', obj.stock_actual)
     alerta_stock.short_description = "Estado Stock"
 
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'tipo', 'cantidad', 'guia', 'referencia')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('producto__nombre', 'referencia')
+    date_hierarchy = 'fecha'
+    autocomplete_fields = ['producto']
+    list_select_related = ('producto', 'guia')
+    fields = ('producto', 'tipo', 'cantidad', 'referencia')
+
+    # Kardex de solo inserción: no se edita ni se borra, se corrige con otro AJUSTE
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'progreso', 'solicitado_por', 'creado', 'terminado', 'ver_estado')
+    list_filter = ('estado', 'tipo')
+    list_select_related = ('solicitado_por',)
+    readonly_fields = [f.name for f in TrabajoReporte._meta.fields]
+
+    # Los crea el dashboard y los procesa el worker; aquí solo se revisan o borran
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_model(self, request, obj):
+        if obj.archivo:
+            obj.archivo.delete(save=False)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for trabajo in queryset.exclude(archivo=''):
+            trabajo.archivo.delete(save=False)
+        super().delete_queryset(request, queryset)
+
+    def ver_estado(self, obj):
+        url = reverse('trabajo_reporte', args=[obj.pk])
+        return format_html('<a href="{}" class="btn btn-sm btn-info">Ver</a>', url)
+    ver_estado.short_description = "Estado"
+
 # --- 2. CONFIGURACIÓN DE ASISTENCIA (CON RECIBO) ---
 
 @admin.action(description="📄 Generar Recibo de Pago (Días seleccionados)")
 def generar_recibo_pago(modeladmin, request, queryset):
-    seleccion = queryset.order_by('fecha')
-    usuarios_seleccionados = set(asistencia.usuario for asistencia in seleccion)
-    
-    html_content = """
-    <html>
-    <head>
-        <title>Recibo de Nómina</title>
-        <style>
-            body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; padding: 40px; background: #f9f9f9; }
-            .contenedor-recibo { 
-                background: white; border: 1px solid #ccc; padding: 30px; margin-bottom: 40px; 
-                box-shadow: 0 0 10px rgba(0,0,0,0.1); page-break-inside: avoid; 
-            }
-            .header { text-align: center; border-bottom: 2px solid #333; padding-bottom: 10px; margin-bottom: 20px; }
-            .header h1 { margin: 0; color: #2c3e50; font-size: 24px; }
-            .header p { margin: 5px 0 0; color: #7f8c8d; font-size: 14px; }
-            .info-empleado { margin-bottom: 20px; font-size: 15px; }
-            table { width: 100%; border-collapse: collapse; margin-top: 10px; font-size: 14px; }
-            th, td { border: 1px solid #e0e0e0; padding: 10px; text-align: center; }
-            th { background-color: #f8f9fa; color: #333; font-weight: bold; }
-            tr:nth-child(even) { background-color: #fcfcfc; }
-            .total-row { background-color: #2c3e50 !important; color: white; font-weight: bold; font-size: 16px; }
-            .total-row td { border: 1px solid #2c3e50; }
-            .firmas { margin-top: 60px; display: flex; justify-content: space-between; }
-            .firma-box { width: 40%; border-top: 1px solid #333; text-align: center; padding-top: 10px; font-size: 14px; color: #333; }
-            @media print { .no-print { display: none; } body { background: white; padding: 0; } .contenedor-recibo { border: none; box-shadow: none; } }
-            .btn { padding: 10px 20px; text-decoration: none; border-radius: 5px; font-weight: bold; margin-right: 10px; display: inline-block; cursor: pointer; border: none;}
-            .btn-print { background: #28a745; color: white; }
-            .btn-back { background: #6c757d; color: white; }
-        </style>
-    </head>
-    <body>
-        <div class="no-print">
-            <button onclick="window.print()" class="btn btn-print">🖨️ Imprimir Recibo</button>
-            <a href="javascript:history.back()" class="btn btn-back">⬅️ Volver</a><br><br>
-        </div>
-    """
-
-    for usuario in usuarios_seleccionados:
-        asistencias_usuario = seleccion.filter(usuario=usuario)
-        nombre_completo = f"{usuario.first_name} {usuario.last_name}"
-        if len(nombre_completo.strip()) < 2: nombre_completo = usuario.username
-
-        try: tarifa = usuario.perfil.tarifa_por_hora
-        except: tarifa = 0
-
-        total_dinero = 0
-        total_horas = 0
-
-        html_content += f"""
-        <div class="contenedor-recibo">
-            <div class="header"><h1>RECIBO DE PAGO</h1><p>CREACIONES MYM - Control Interno</p></div>
-            <div class="info-empleado">
-                <p><strong>Colaborador:</strong> {nombre_completo}</p>
-                <p><strong>Fecha:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
-                <p><strong>Tarifa por Hora:</strong> S/. {tarifa}</p>
-            </div>
-            <table>
-                <thead><tr><th>Fecha</th><th>Entrada</th><th>Salida</th><th>Horas</th><th>Total</th></tr></thead>
-                <tbody>
-        """
-
-        for asistencia in asistencias_usuario:
-            horas = asistencia.horas_trabajadas()
-            pago_dia = float(horas) * float(tarifa)
-            total_dinero += pago_dia
-            total_horas += horas
-            html_content += f"<tr><td>{asistencia.fecha.strftime('%d/%m/%Y')}</td><td>{asistencia.hora_entrada.strftime('%H:%M') if asistencia.hora_entrada else '-'}</td><td>{asistencia.hora_salida.strftime('%H:%M') if asistencia.hora_salida else '-'}</td><td>{horas}</td><td>S/. {pago_dia:.2f}</td></tr>"
-
-        html_content += f"""
-                <tr class="total-row"><td colspan="3" style="text-align:right;padding-right:20px;">TOTAL:</td><td>{total_horas:.2f} hrs</td><td>S/. {total_dinero:.2f}</td></tr>
-                </tbody>
-            </table>
-            <div class="firmas"><div class="firma-box"><br>Administración</div><div class="firma-box"><br>Recibí Conforme<br>{nombre_completo}</div></div>
-        </div>
-        """
-
-    html_content += "</body></html>"
-    return HttpResponse(html_content)
+    # Horas y pago salen de nomina.py (una consulta); los días de periodos
+    # cerrados no se recalculan, se imprimen desde su recibo guardado
+    abiertas, periodos_cerrados = nomina.separar_cerradas(queryset)
+    return render(request, 'gestion/recibo_pago.html', {
+        'recibos': nomina.calcular_recibos(abiertas),
+        'periodos_cerrados': periodos_cerrados,
+        'emitido': timezone.localtime(),
+    })
 
 @admin.register(Asistencia)
-class AsistenciaAdmin(admin.ModelAdmin):
+class AsistenciaAdmin(PaginacionKeysetMixin, admin.ModelAdmin):
     list_display = ('usuario', 'fecha_visual', 'hora_entrada', 'hora_salida', 'calculo_horas', 'pago_estimado')
     list_filter = ('fecha', 'usuario')
+    ordering = ('-fecha', '-id')  # único: lo usa la paginación por cursor
+    list_select_related = ('usuario',)
     actions = [generar_recibo_pago]
     
     def get_actions(self, request):
@@ -148,22 +151,70 @@ class AsistenciaAdmin(admin.ModelAdmin):
         return obj.fecha.strftime("%d/%m/%Y")
     fecha_visual.short_description = "Fecha"
 
+    # Horas y pago vienen anotados desde la BD (nomina.anotar_jornada): se
+    # pueden ordenar y sumar, y no hay una consulta de perfil por fila
     def calculo_horas(self, obj):
-        horas = obj.horas_trabajadas()
+        horas = obj._horas
         color = "green" if horas >= 8 else "orange"
         if horas == 0: color = "red"
-        return format_html('<b style="color:{}">{} hrs</b>', color, horas)
+        return format_html('<b style="color:{}">{} hrs</b>', color, f"{horas:.2f}")
     calculo_horas.short_description = "Jornada"
+    calculo_horas.admin_order_field = '_horas'
 
     def pago_estimado(self, obj):
-        try:
-            horas = obj.horas_trabajadas()
-            tarifa = obj.usuario.perfil.tarifa_por_hora
-            total = float(horas) * float(tarifa)
-            return f"S/. {total:.2f}"
-        except:
+        if obj._tarifa is None:  # colaborador sin perfil de nómina
             return "-"
+        return f"S/. {obj._pago:.2f}"
     pago_estimado.short_description = "Pago (Día)"
+    pago_estimado.admin_order_field = '_pago'
+
+    # Totales del filtro actual (fechas, colaborador) arriba de la lista, en un solo aggregate
+    def changelist_view(self, request, extra_context=None):
+        respuesta = super().changelist_view(request, extra_context)
+        cl = getattr(respuesta, 'context_data', {}).get('cl')
+        if cl is not None:
+            respuesta.context_data['totales'] = cl.queryset.aggregate(
+                dias=Count('id'), horas=Sum('_horas'), pago=Sum('_pago'),
+            )
+        return respuesta
+
+    # Un registro por día (restricción asistencia_unica_por_dia): si ya marcó
+    # entrada hoy, "Agregar" lo lleva a su registro para marcar la salida
+    def add_view(self, request, form_url='', extra_context=None):
+        hoy = timezone.localtime(timezone.now()).date()
+        registro = Asistencia.objects.filter(usuario=request.user, fecha=hoy).first()
+        if registro is not None:
+            messages.info(request, "Ya registraste tu entrada de hoy; aquí puedes marcar la salida.")
+            return HttpResponseRedirect(reverse('admin:gestion_asistencia_change', args=[registro.pk]))
+        return super().add_view(request, form_url, extra_context)
+
+    # --- IMPORTAR MARCACIONES DEL RELOJ (solo superusuario) ---
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='gestion_asistencia_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        resumen = None
+        if request.method == 'POST':
+            archivo = request.FILES.get('archivo')
+            if archivo is None:
+                messages.error(request, "Selecciona el archivo exportado del reloj (.csv o .xlsx).")
+            else:
+                try:
+                    resumen = importar_asistencia.importar_marcaciones(
+                        archivo, archivo.name, simular=bool(request.POST.get('simular')),
+                    )
+                except importar_asistencia.ErrorImportacion as error:
+                    messages.error(request, str(error))
+        return render(request, 'admin/gestion/asistencia/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Importar marcaciones del reloj",
+            'resumen': resumen,
+        })
 
     def save_model(self, request, obj, form, change):
         ahora_lima = timezone.localtime(timezone.now())
@@ -180,54 +231,153 @@ class AsistenciaAdmin(admin.ModelAdmin):
         return ['usuario', 'fecha', 'hora_entrada', 'hora_salida']
     
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        qs = nomina.anotar_jornada(super().get_queryset(request))
         if request.user.is_superuser:
             return qs 
         return qs.filter(usuario=request.user)
 
+@admin.register(PeriodoNomina)
+class PeriodoNominaAdmin(admin.ModelAdmin):
+    """Cerrar un periodo = crearlo aquí: se guardan los recibos de todos (nomina.cerrar_periodo)."""
+    list_display = ('__str__', 'colaboradores', 'total_pagado', 'cerrado_por', 'creado', 'ver_recibos')
+    fields = ('desde', 'hasta')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('cerrado_por').annotate(
+            _colaboradores=Count('recibos'), _total=Sum('recibos__total_pago'),
+        )
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_change_permission(self, request, obj=None):
+        return False  # un periodo cerrado no se edita; se borra y se vuelve a cerrar
+
+    def save_model(self, request, obj, form, change):
+        obj.cerrado_por = request.user
+        super().save_model(request, obj, form, change)
+        nomina.cerrar_periodo(obj)
+
+    def colaboradores(self, obj):
+        return obj._colaboradores
+    colaboradores.short_description = "Colaboradores"
+
+    def total_pagado(self, obj):
+        return f"S/. {obj._total or 0:.2f}"
+    total_pagado.short_description = "Total"
+
+    def ver_recibos(self, obj):
+        url = reverse('recibos_periodo_nomina', args=[obj.pk])
+        return format_html('<a href="{}" class="btn btn-sm btn-info" target="_blank">📄 Recibos</a>', url)
+    ver_recibos.short_description = "Recibos"
+
 # --- 3. CONFIGURACIÓN DE CLIENTES (ORDENADO A-Z) ---
+class FiltroDeuda(admin.SimpleListFilter):
+    title = 'deuda'
+    parameter_name = 'deuda'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('con_deuda', '💰 Con deuda'),
+            ('mayor_500', 'Más de S/. 500'),
+            ('mayor_1000', 'Más de S/. 1000'),
+            ('al_dia', '✅ Al día'),
+        ]
+
+    # Filtra sobre la anotación _deuda que agrega ClienteAdmin.get_queryset
+    def queryset(self, request, queryset):
+        if self.value() == 'con_deuda':
+            return queryset.filter(_deuda__gt=0)
+        if self.value() == 'mayor_500':
+            return queryset.filter(_deuda__gt=500)
+        if self.value() == 'mayor_1000':
+            return queryset.filter(_deuda__gt=1000)
+        if self.value() == 'al_dia':
+            return queryset.filter(_deuda__lte=0)
+        return queryset
+
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(BusquedaIndexadaMixin, admin.ModelAdmin):
     list_display = ('nombre_contacto', 'celular', 'ciudad', 'estado_deuda_visual', 'acciones_cobranza')
     search_fields = ('nombre_contacto', 'nombre_empresa')
-    list_filter = ('ciudad',)
+    list_filter = ('ciudad', FiltroDeuda)
     list_per_page = 20
     ordering = ('nombre_contacto',) # <--- NUEVO: Orden alfabético por nombre de contacto
 
-    def estado_deuda_visual(self, obj):
-        guias_pendientes = obj.guiaentrega_set.exclude(estado_pago='PAGADO')
-        datos = guias_pendientes.aggregate(
-            total_vendido=Sum('total_venta'),
-            total_abonado=Sum('monto_cobrado')
+    # Deuda y guías abiertas de cada cliente en la MISMA consulta del listado
+    # (antes eran ~4 consultas extra por fila)
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        abiertas = ~Q(guiaentrega__estado_pago='PAGADO')
+        return qs.annotate(
+            _deuda=Coalesce(
+                Sum(F('guiaentrega__total_venta') - F('guiaentrega__monto_cobrado'), filter=abiertas),
+                0, output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            _guias_abiertas=Count('guiaentrega', filter=abiertas),
         )
-        vendido = datos['total_vendido'] or 0
-        abonado = datos['total_abonado'] or 0
-        deuda = vendido - abonado
+
+    def estado_deuda_visual(self, obj):
+        deuda = obj._deuda
 
         if deuda > 0:
             texto_deuda = f"{deuda:.2f}"
             return format_html(
                 '<span style="color:#dc3545; font-weight:bold; font-size:1.1em;">S/. {}</span><br>'
                 '<span style="font-size:0.8em; color:#666;">En {} guía(s)</span>',
-                texto_deuda, guias_pendientes.count()
+                texto_deuda, obj._guias_abiertas
             )
         else:
             return mark_safe('<span style="color:#28a745; font-weight:bold;">✅ Al día</span>')
     
     estado_deuda_visual.short_description = "Deuda Total"
+    estado_deuda_visual.admin_order_field = '_deuda'
+
+    def get_urls(self):
+        return [
+            path('<int:cliente_id>/registrar-pago/', self.admin_site.admin_view(self.registrar_pago_view), name='gestion_cliente_registrar_pago'),
+        ] + super().get_urls()
+
+    # Un solo pago (transferencia, Yape) repartido entre las guías abiertas
+    # del cliente, de la más antigua a la más nueva (ver cobranza.py)
+    def registrar_pago_view(self, request, cliente_id):
+        if not request.user.has_perm('gestion.add_pago'):
+            raise PermissionDenied
+        cliente = get_object_or_404(Cliente, pk=cliente_id)
+        if request.method == 'POST':
+            formulario = cobranza.FormularioPago(request.POST)
+            try:
+                if not formulario.is_valid():
+                    raise cobranza.ErrorPago(formulario.primer_error())
+                resultado = cobranza.registrar_pago_cliente(cliente.pk, **formulario.cleaned_data)
+            except cobranza.ErrorPago as error:
+                messages.error(request, str(error))
+            else:
+                guias = ', '.join(f"N° {p['numero_guia']} (S/. {p['monto']})" for p in resultado['pagos'])
+                messages.success(
+                    request, f"💰 Pago de S/. {resultado['total']} registrado en {len(resultado['pagos'])} guía(s): {guias}. "
+                             f"Deuda restante: S/. {resultado['deuda_restante']}",
+                )
+                return HttpResponseRedirect(reverse('admin:gestion_guiaentrega_changelist') + f'?cliente__id__exact={cliente.pk}')
+
+        guias = list(cobranza.guias_por_pagar(cliente.pk))
+        return render(request, 'admin/gestion/cliente/registrar_pago.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f"Registrar pago de {cliente.nombre_contacto}",
+            'cliente': cliente,
+            'guias': guias,
+            'deuda': sum((saldo for _, _, _, saldo in guias), 0),
+        })
 
     def acciones_cobranza(self, obj):
-        guias_pendientes = obj.guiaentrega_set.exclude(estado_pago='PAGADO')
-        deuda = 0
-        if guias_pendientes.exists():
-            datos = guias_pendientes.aggregate(t=Sum('total_venta'), a=Sum('monto_cobrado'))
-            deuda = (datos['t'] or 0) - (datos['a'] or 0)
+        deuda = obj._deuda
 
         botones = []
 
         if deuda > 0:
             texto_deuda = f"{deuda:.2f}"
-            url_pagar = reverse('admin:gestion_guiaentrega_changelist') + f'?cliente__id__exact={obj.id}&estado_pago__in=PENDIENTE,PARCIAL'
+            url_pagar = reverse('admin:gestion_cliente_registrar_pago', args=[obj.id])
             botones.append(
                 f'<a class="button" href="{url_pagar}" style="background-color:#ffc107; color:#000; font-weight:bold; padding:4px 8px; border-radius:4px;">💰 Pagar</a>'
             )
@@ -259,34 +409,85 @@ class PagoInline(admin.TabularInline):
     model = Pago
     extra = 0
 
+@admin.action(description="🖨️ Imprimir guías seleccionadas (un solo PDF)")
+def imprimir_guias_pdf(modeladmin, request, queryset):
+    ids = ','.join(str(pk) for pk in queryset.values_list('pk', flat=True))
+    return HttpResponseRedirect(f"{reverse('imprimir_guias')}?ids={ids}")
+
+@admin.action(description="🗜️ Descargar guías seleccionadas (ZIP de PDFs)")
+def descargar_guias_zip(modeladmin, request, queryset):
+    ids = ','.join(str(pk) for pk in queryset.values_list('pk', flat=True))
+    return HttpResponseRedirect(f"{reverse('imprimir_guias')}?ids={ids}&formato=zip")
+
 @admin.register(GuiaEntrega)
-class GuiaEntregaAdmin(admin.ModelAdmin):
+class GuiaEntregaAdmin(BusquedaIndexadaMixin, PaginacionKeysetMixin, admin.ModelAdmin):
     list_display = ('numero_guia_visual', 'cliente', 'fecha_emision', 'total_venta', 'estado_pago_color', 'acciones_pdf')
     list_filter = ('estado_pago', 'fecha_emision') 
+    # La búsqueda real la hace BusquedaIndexadaMixin (índices, ver busqueda.py)
     search_fields = ('numero_guia', 'cliente__nombre_contacto', 'cliente__nombre_empresa')
     date_hierarchy = 'fecha_emision' 
     inlines = [DetalleGuiaInline, PagoInline]
     autocomplete_fields = ['cliente']
-    ordering = ('-fecha_emision', '-numero_guia')
+    # Termina en id para que sea único: la paginación por cursor depende de eso
+    ordering = ('-fecha_emision', '-numero_guia', 'id')
+    actions = [imprimir_guias_pdf, descargar_guias_zip]
+    # Cliente.__str__ en cada fila: sin esto es 1 consulta por guía
+    list_select_related = ('cliente',)
+    # PaginacionKeysetMixin: sin el COUNT(*) de toda la tabla, total estimado en
+    # Postgres y páginas por cursor en vez de OFFSET
 
     # --- 1. CARGA DEL JAVASCRIPT ---
     # ESTA LÍNEA ES LA CLAVE PARA QUE FUNCIONE EL CÁLCULO
     class Media:
         js = ('gestion/js/custom_admin.js',)
 
-    # --- 2. CONTADOR DE GUÍAS CORREGIDO (ABSOLUTO) ---
-    def get_changeform_initial_data(self, request):
-        initial = super().get_changeform_initial_data(request)
-        
-        # Buscamos la última guía POR ID (global), no por año
-        ultima_guia = GuiaEntrega.objects.order_by('id').last()
-
-        if ultima_guia and ultima_guia.numero_guia.isdigit():
-            siguiente = int(ultima_guia.numero_guia) + 1
-            initial['numero_guia'] = str(siguiente).zfill(6) 
+    # --- 2. CONTADOR DE GUÍAS (POR AÑO, EL MISMO QUE USA EL MODELO) ---
+    # El número se asigna recién al guardar (SecuenciaGuia.siguiente); aquí solo
+    # mostramos cuál tocaría. Si escriben uno a mano, se respeta.
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        if obj is None and 'numero_guia' in form.base_fields:
+            campo = form.base_fields['numero_guia']
+            campo.required = False
+            campo.widget.attrs['placeholder'] = f"Automático ({SecuenciaGuia.proximo(timezone.localdate().year)})"
+            campo.help_text = "Déjelo vacío para asignar el siguiente número del año."
+        return form
+
+    # --- 3. GUARDADO DE INLINES SIN RECÁLCULO EN CASCADA ---
+    # Cada línea/pago se guarda sin tocar la guía; al final se recalculan los
+    # totales UNA sola vez (1 consulta de agregados + 1 UPDATE).
+    def save_formset(self, request, form, formset, change):
+        if formset.model not in (DetalleGuia, Pago):
+            return super().save_formset(request, form, formset, change)
+        instancias = formset.save(commit=False)
+        if formset.model is Pago:
+            for obj in formset.deleted_objects:
+                obj.delete(recalcular=False)
+            for obj in instancias:
+                obj.save(recalcular=False)
         else:
-            initial['numero_guia'] = '000001' 
-        return initial
+            # Todas las líneas mueven el stock juntas: 1 bulk_create en el kardex + 1 UPDATE
+            movimientos = []
+            for obj in formset.deleted_objects:
+                movimientos += obj.movimientos_stock(borrando=True)
+                obj.delete(recalcular=False, mover_stock=False)
+            for obj in instancias:
+                movimientos += obj.movimientos_stock()
+                obj.save(recalcular=False, mover_stock=False)
+            MovimientoStock.aplicar(movimientos)
+        formset.save_m2m()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.actualizar_estado_pago()
+
+    def delete_queryset(self, request, queryset):
+        fechas = set(queryset.values_list('fecha_emision', flat=True))
+        # Si el borrado falla, el stock devuelto no debe quedar aplicado
+        with transaction.atomic():
+            MovimientoStock.devolver_guias(queryset)
+            super().delete_queryset(request, queryset)
+        programar_resumenes(fechas)
 
     def changelist_view(self, request, extra_context=None):
         referer = request.META.get('HTTP_REFERER', '')
@@ -298,6 +499,39 @@ class GuiaEntregaAdmin(admin.ModelAdmin):
             return HttpResponseRedirect(f"{request.path}?{q.urlencode()}")
         return super().changelist_view(request, extra_context)
 
+    def get_urls(self):
+        return [
+            path('conciliar-banco/', self.admin_site.admin_view(self.conciliar_view), name='gestion_guiaentrega_conciliar'),
+        ] + super().get_urls()
+
+    # Extracto del banco o de Yape contra pagos y guías abiertas (ver conciliacion.py)
+    def conciliar_view(self, request):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        resumen = None
+        if request.method == 'POST':
+            archivo = request.FILES.get('archivo')
+            if archivo is None:
+                messages.error(request, "Selecciona el extracto del banco (.csv o .xlsx).")
+            else:
+                try:
+                    resumen = conciliacion.conciliar_extracto(archivo, archivo.name, crear=bool(request.POST.get('crear')))
+                except conciliacion.ErrorImportacion as error:
+                    messages.error(request, str(error))
+        return render(request, 'admin/gestion/guiaentrega/conciliar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Conciliar extracto bancario",
+            'resumen': resumen,
+            'ventana_dias': conciliacion.VENTANA_DIAS,
+            'secciones': [
+                ("⚠️ Ambiguos (revisar a mano)", resumen['listado']['ambiguas']),
+                ("❓ Sin coincidencia", resumen['listado']['sin_coincidencia']),
+                ("⛔ Filas rechazadas", resumen['listado']['rechazadas']),
+                ("✅ Conciliados", resumen['listado']['conciliadas']),
+            ] if resumen else [],
+        })
+
     def numero_guia_visual(self, obj):
         return format_html('<b style="color: #2c3e50;">#{}</b>', obj.numero_guia)
     numero_guia_visual.short_description = "N° Guía"
@@ -308,32 +542,55 @@ class GuiaEntregaAdmin(admin.ModelAdmin):
         return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, obj.get_estado_pago_display())
     estado_pago_color.short_description = "Estado Pago"
 
+    @cached_property
+    def url_pdf_molde(self):
+        # Un solo reverse() para toda la lista; cada fila solo reemplaza el id
+        return reverse('imprimir_guia', args=[0]).replace('/0/', '/{}/')
+
     def acciones_pdf(self, obj):
-        try:
-            url_base = reverse('imprimir_guia', args=[obj.id])
-            url_ver = f"{url_base}?ver=true"
-            return format_html(
-                '<a class="button ver-pdf-modal" href="{}" style="cursor:pointer; background-color:#17a2b8; color:white; padding:3px 8px; border-radius:3px;">👁️ Ver</a>&nbsp;'
-                '<a class="button" href="{}" style="background-color:#6c757d; color:white; padding:3px 8px; border-radius:3px;">📥 PDF</a>',
-                url_ver, url_base
-            )
-        except: return "-"
+        url_base = self.url_pdf_molde.format(obj.id)
+        url_ver = f"{url_base}?ver=true"
+        return format_html(
+            '<a class="button ver-pdf-modal" href="{}" style="cursor:pointer; background-color:#17a2b8; color:white; padding:3px 8px; border-radius:3px;">👁️ Ver</a>&nbsp;'
+            '<a class="button" href="{}" style="background-color:#6c757d; color:white; padding:3px 8px; border-radius:3px;">📥 PDF</a>',
+            url_ver, url_base
+        )
     acciones_pdf.short_description = "Documentos"
 
 # --- 5. CONFIGURACIÓN DE FINANZAS ---
 @admin.register(Proveedor)
-class ProveedorAdmin(admin.ModelAdmin):
+class ProveedorAdmin(BusquedaIndexadaMixin, admin.ModelAdmin):
     list_display = ('razon_social', 'tipo', 'telefono', 'ruc_dni')
     search_fields = ('razon_social', 'ruc_dni')
     list_filter = ('tipo',)
 
+class FiltroVencimiento(admin.SimpleListFilter):
+    title = 'vencimiento'
+    parameter_name = 'vencimiento'
+
+    def lookups(self, request, model_admin):
+        return PLAZOS_POR_PAGAR
+
+    # Mismo criterio que Gasto.esta_vencido(), pero como WHERE (índice
+    # parcial gasto_pendiente_venc_idx) en vez de revisar gasto por gasto
+    def queryset(self, request, queryset):
+        if self.value() in dict(PLAZOS_POR_PAGAR):
+            return queryset.filter(condicion_plazo(self.value(), timezone.now().date()), estado='PENDIENTE')
+        return queryset
+
 @admin.register(Gasto)
-class GastoAdmin(admin.ModelAdmin):
-    list_display = ('descripcion', 'proveedor', 'fecha_emision', 'monto', 'estado_color')
-    list_filter = ('estado', 'categoria', 'fecha_emision')
+class GastoAdmin(BusquedaIndexadaMixin, PaginacionKeysetMixin, admin.ModelAdmin):
+    list_display = ('descripcion', 'proveedor', 'fecha_emision', 'fecha_vencimiento', 'monto', 'estado_color')
+    ordering = ('-fecha_emision', '-id')
+    list_filter = (FiltroVencimiento, 'estado', 'categoria', 'fecha_emision')
     search_fields = ('descripcion', 'proveedor__razon_social')
     date_hierarchy = 'fecha_emision' 
 
+    def delete_queryset(self, request, queryset):
+        fechas = set(queryset.values_list('fecha_emision', flat=True))
+        super().delete_queryset(request, queryset)
+        programar_resumenes(fechas)
+
     def estado_color(self, obj):
         color = 'green' if obj.estado == 'PAGADO' else 'red'
         return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, obj.get_estado_display())
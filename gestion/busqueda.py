@@ -0,0 +1,143 @@
+"""
+Búsqueda indexada para el admin (cajas de búsqueda y autocompletado).
+
+El icontains de Django es un LIKE '%texto%': no usa índices y recorre toda
+la tabla, y en las guías además la cruza con clientes. Aquí:
+
+- Postgres: índices GIN de trigramas (pg_trgm) sobre UPPER(campo), que es
+  exactamente la expresión que arma icontains, así que el mismo filtro ya
+  los usa (migración 0016).
+- SQLite: una tabla FTS5 "sombra" por modelo (gestion_busqueda_<modelo>)
+  con tokenizador trigram, que también encuentra subcadenas. Se mantiene al
+  día con las señales de guardado/borrado (signals.py) y se reconstruye con
+  `manage.py reconstruir_busqueda`.
+
+Las búsquedas por un campo de otra tabla (cliente de la guía, proveedor del
+gasto) se resuelven como `cliente_id IN (clientes que calzan)`, que va por
+el índice de la FK, en vez de un JOIN con OR que obliga a recorrer todo.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+from .models import Cliente, Gasto, GuiaEntrega, Producto, Proveedor
+
+# Campos de texto propios de cada modelo (mismo orden que las columnas FTS)
+CAMPOS = {
+    Cliente: ('nombre_contacto', 'nombre_empresa'),
+    Producto: ('nombre',),
+    Proveedor: ('razon_social', 'ruc_dni'),
+    GuiaEntrega: ('numero_guia',),
+    Gasto: ('descripcion',),
+}
+
+# FK cuyo texto también se busca: la guía por su cliente, el gasto por su proveedor
+RELACIONES = {
+    GuiaEntrega: {'cliente': Cliente},
+    Gasto: {'proveedor': Proveedor},
+}
+
+# El tokenizador trigram no puede buscar palabras más cortas
+MINIMO_FTS = 3
+
+
+def tabla_fts(modelo):
+    return f"gestion_busqueda_{modelo._meta.model_name}"
+
+
+def usa_fts(modelo, using='default'):
+    """True si la BD es SQLite y la migración pudo crear la tabla FTS del modelo."""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return False
+    if getattr(conexion, 'tablas_busqueda', None) is None:
+        conexion.tablas_busqueda = {
+            tabla for tabla in conexion.introspection.table_names() if tabla.startswith('gestion_busqueda_')
+        }
+    return tabla_fts(modelo) in conexion.tablas_busqueda
+
+
+def _frase(palabra):
+    # Entre comillas FTS5 trata todo como texto literal (sin AND/OR/NEAR/*)
+    return '"' + palabra.replace('"', '""') + '"'
+
+
+# --- MANTENER LA TABLA FTS AL DÍA ---
+def indexar(instancia, update_fields=None):
+    modelo = type(instancia)
+    campos = CAMPOS[modelo]
+    if not usa_fts(modelo, instancia._state.db or 'default'):
+        return
+    if update_fields is not None and not set(update_fields) & set(campos):
+        return  # se guardó otra cosa (totales, stock...): el texto no cambió
+    tabla = tabla_fts(modelo)
+    valores = [getattr(instancia, campo) or '' for campo in campos]
+    with connections[instancia._state.db or 'default'].cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {tabla} (rowid, {', '.join(campos)}) VALUES (%s{', %s' * len(campos)})",
+            [instancia.pk, *valores],
+        )
+
+
+def desindexar(instancia, using='default'):
+    modelo = type(instancia)
+    if not usa_fts(modelo, using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabla_fts(modelo)} WHERE rowid = %s", [instancia.pk])
+
+
+def reconstruir(modelo, using='default'):
+    """Vuelve a llenar la tabla FTS del modelo desde cero. Devuelve las filas indexadas."""
+    tabla = tabla_fts(modelo)
+    campos = ', '.join(CAMPOS[modelo])
+    origen = ', '.join(f"COALESCE({campo}, '')" for campo in CAMPOS[modelo])
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabla}")
+        cursor.execute(f"INSERT INTO {tabla} (rowid, {campos}) SELECT id, {origen} FROM {modelo._meta.db_table}")
+        return cursor.rowcount
+
+
+# --- FILTROS ---
+def filtro(modelo, palabra, using='default'):
+    """Q de los registros de `modelo` que contienen `palabra` en sus campos o en los de sus FK."""
+    if len(palabra) >= MINIMO_FTS and usa_fts(modelo, using):
+        tabla = tabla_fts(modelo)
+        q = Q(pk__in=RawSQL(f"SELECT rowid FROM {tabla} WHERE {tabla} MATCH %s", [_frase(palabra)]))
+    else:
+        # Postgres (con los índices trigram) o palabras cortas
+        q = reduce(or_, (Q(**{f"{campo}__icontains": palabra}) for campo in CAMPOS[modelo]))
+
+    for relacion, relacionado in RELACIONES.get(modelo, {}).items():
+        coinciden = relacionado.objects.using(using).filter(filtro(relacionado, palabra, using)).values('pk')
+        q |= Q(**{f"{relacion}__in": coinciden})
+    return q
+
+
+def buscar(queryset, termino):
+    """Como la búsqueda del admin: cada palabra (o "frase entre comillas") tiene que aparecer."""
+    for palabra in smart_split(termino):
+        if palabra.startswith(('"', "'")) and palabra[0] == palabra[-1]:
+            palabra = unescape_string_literal(palabra)
+        palabra = palabra.strip()
+        if palabra:
+            queryset = queryset.filter(filtro(queryset.model, palabra, queryset.db))
+    return queryset
+
+
+class BusquedaIndexadaMixin:
+    """
+    Para ModelAdmin: reemplaza la búsqueda por icontains de search_fields
+    (que se deja igual, el admin la necesita para mostrar la caja y para
+    autocomplete_fields) por la búsqueda indexada de CAMPOS/RELACIONES.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        # Solo filtra por pk o por FK hacia adelante: nunca duplica filas
+        return buscar(queryset, search_term), False
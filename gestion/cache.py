@@ -0,0 +1,77 @@
+"""
+Caché versionada para resultados de reportes (dashboard).
+
+Cada entrada lleva en la clave el número de "generación" vigente. Cualquier
+cambio en guías, pagos, detalles, gastos o productos incrementa la generación
+(ver signals.py), así las entradas viejas dejan de usarse sin tener que
+buscarlas y borrarlas; expiran solas por timeout.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+CLAVE_GENERACION = 'mym:reportes:generacion'
+CLAVE_ACIERTOS = 'mym:reportes:aciertos'
+CLAVE_FALLOS = 'mym:reportes:fallos'
+TIMEOUT_REPORTES = 60 * 10
+
+
+def _incrementar(clave):
+    # incr falla si la clave no existe; add solo la crea si falta
+    cache.add(clave, 0, timeout=None)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, timeout=None)
+        return 1
+
+
+def generacion():
+    return cache.get_or_set(CLAVE_GENERACION, 1, timeout=None)
+
+
+def _nueva_generacion():
+    conexion = transaction.get_connection()
+    if getattr(conexion, 'generacion_pendiente', False):
+        conexion.generacion_pendiente = False
+        _incrementar(CLAVE_GENERACION)
+
+
+def invalidar():
+    """
+    Nueva generación al confirmar la transacción (no antes, para no cachear datos
+    sin commit). Como en programar_resumenes, la marca va en la conexión: guardar
+    una guía con 200 líneas sube la generación una vez, no 200.
+    """
+    transaction.get_connection().generacion_pendiente = True
+    transaction.on_commit(_nueva_generacion, robust=True)
+
+
+def obtener_o_calcular(nombre, parametros, calcular, timeout=TIMEOUT_REPORTES):
+    """Devuelve el resultado cacheado de calcular() para (nombre, parametros) en la generación actual."""
+    firma = hashlib.md5(repr(parametros).encode()).hexdigest()
+    clave = f"mym:reportes:{generacion()}:{nombre}:{firma}"
+
+    valor = cache.get(clave)
+    if valor is not None:
+        _incrementar(CLAVE_ACIERTOS)
+        return valor
+
+    _incrementar(CLAVE_FALLOS)
+    valor = calcular()
+    cache.set(clave, valor, timeout)
+    return valor
+
+
+def estadisticas():
+    datos = cache.get_many([CLAVE_GENERACION, CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos = datos.get(CLAVE_ACIERTOS, 0)
+    fallos = datos.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'generacion': datos.get(CLAVE_GENERACION, 1),
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / total, 3) if total else 0,
+    }
@@ -0,0 +1,120 @@
+"""
+Pago de un cliente repartido entre sus guías abiertas.
+
+El cliente paga un solo monto (una transferencia, un Yape) y se reparte por
+antigüedad (FIFO): primero se salda la guía más antigua, luego la que sigue,
+y la última puede quedar PARCIAL. Todos los Pago se crean con bulk_create y
+los totales y estados de las guías tocadas se recalculan juntos con
+recalcular_totales (una consulta de agregados y un solo UPDATE), todo en la
+misma transacción. Antes era un Pago por guía desde cada inline, y cada
+save() recalculaba su guía por separado.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import pdf_guias
+from .cache import invalidar as invalidar_cache_reportes
+from .models import GuiaEntrega, Pago
+from .reportes import guias_con_saldo
+
+CENTAVOS = Decimal('0.01')
+
+
+class ErrorPago(Exception):
+    """El pago no se puede registrar (monto inválido o mayor que la deuda)."""
+
+
+def leer_monto(valor):
+    try:
+        monto = Decimal(str(valor).strip().replace(',', '.')).quantize(CENTAVOS)
+    except InvalidOperation:  # texto cualquiera o demasiados dígitos
+        monto = None
+    if monto is None or not monto.is_finite():  # 'nan' pasa el quantize sin error
+        raise ErrorPago(f"Monto inválido: '{valor}'")
+    if monto <= 0:
+        raise ErrorPago("El monto debe ser mayor que cero.")
+    return monto
+
+
+class FormularioPago(forms.Form):
+    """Lo que mandan el admin y la API: mismas reglas para los dos."""
+    monto = forms.CharField(error_messages={'required': "Falta el monto."})
+    comprobante_banco = forms.CharField(
+        required=False, max_length=Pago._meta.get_field('comprobante_banco').max_length,
+        error_messages={'max_length': "El código de operación no puede pasar de %(limit_value)d caracteres."},
+    )
+
+    def clean_monto(self):
+        try:
+            return leer_monto(self.cleaned_data['monto'])
+        except ErrorPago as error:
+            raise forms.ValidationError(str(error))
+
+    def primer_error(self):
+        return next(iter(self.errors.values()))[0]
+
+
+def guias_por_pagar(cliente_id):
+    """(id, numero_guia, fecha_emision, saldo) de las guías abiertas del cliente, de la más antigua a la más nueva."""
+    return guias_con_saldo().filter(cliente_id=cliente_id).annotate(saldo=F('total_venta') - F('monto_cobrado')).order_by(
+        'fecha_emision', 'id',
+    ).values_list('pk', 'numero_guia', 'fecha_emision', 'saldo')
+
+
+def repartir(saldos, monto):
+    """[(guia_id, saldo)] en orden FIFO -> [(guia_id, asignado)] hasta agotar el monto."""
+    asignaciones = []
+    for guia_id, saldo in saldos:
+        if monto <= 0:
+            break
+        asignado = min(monto, saldo)
+        asignaciones.append((guia_id, asignado))
+        monto -= asignado
+    return asignaciones
+
+
+@transaction.atomic
+def registrar_pago_cliente(cliente_id, monto, comprobante_banco='', fecha=None):
+    """
+    Reparte `monto` entre las guías abiertas del cliente (FIFO) y devuelve
+    {'pagos': [{'guia_id', 'numero_guia', 'monto', 'estado_pago'}], 'total',
+    'deuda_anterior', 'deuda_restante'}. Si el monto supera la deuda no
+    registra nada y levanta ErrorPago.
+    """
+    monto = leer_monto(monto)
+    # select_for_update: dos cobros simultáneos del mismo cliente no reparten sobre los mismos saldos
+    guias = list(guias_por_pagar(cliente_id).select_for_update())
+    deuda = sum((saldo for _, _, _, saldo in guias), Decimal('0.00'))
+    if not guias:
+        raise ErrorPago("El cliente no tiene guías pendientes.")
+    if monto > deuda:
+        raise ErrorPago(f"El monto (S/ {monto}) supera la deuda del cliente (S/ {deuda}).")
+
+    asignaciones = repartir([(pk, saldo) for pk, _, _, saldo in guias], monto)
+    Pago.objects.bulk_create([
+        Pago(guia_id=guia_id, monto=asignado, comprobante_banco=comprobante_banco, fecha=fecha or timezone.localdate())
+        for guia_id, asignado in asignaciones
+    ])
+
+    # bulk_create no manda señales: lo que harían los save() de cada Pago, una vez
+    ids = [guia_id for guia_id, _ in asignaciones]
+    GuiaEntrega.objects.filter(pk__in=ids).recalcular_totales()
+    invalidar_cache_reportes()
+    for guia_id in ids:
+        pdf_guias.invalidar(guia_id)
+
+    numeros = {pk: numero for pk, numero, _, _ in guias}
+    estados = dict(GuiaEntrega.objects.filter(pk__in=ids).values_list('pk', 'estado_pago'))
+    return {
+        'pagos': [
+            {'guia_id': guia_id, 'numero_guia': numeros[guia_id], 'monto': asignado, 'estado_pago': estados[guia_id]}
+            for guia_id, asignado in asignaciones
+        ],
+        'total': monto,
+        'deuda_anterior': deuda,
+        'deuda_restante': deuda - monto,
+    }
@@ -0,0 +1,325 @@
+"""
+Conciliación del extracto bancario (o de Yape) contra los pagos y las guías.
+
+El extracto (CSV o XLSX) se lee en streaming, como las marcaciones del reloj
+(ver importar_asistencia.py), y se procesa por bloques de LOTE movimientos.
+Por bloque hay unas pocas consultas con IN (...) sobre columnas indexadas, y
+el cruce se hace con diccionarios, nunca comparando cada movimiento con
+cada guía:
+
+1. N° de operación ya registrado en Pago.comprobante_banco -> ya estaba.
+2. Celular de origen (columna o dentro de la glosa) de un cliente -> sus
+   guías abiertas. Se usa la guía cuyo saldo es justo el monto; si no hay
+   una sola, se reparte de la más antigua a la más nueva (como
+   cobranza.registrar_pago_cliente) mientras alcance su deuda.
+3. Sin cliente: guías abiertas con saldo igual al monto, emitidas dentro
+   de los VENTANA_DIAS anteriores al movimiento. Si hay una sola, es esa.
+
+Lo que calza con más de una guía, o con un N° de operación repetido o
+vacío, queda como ambiguo para revisarlo a mano. Los cargos (montos
+negativos) se ignoran. Con crear=True los Pago se crean con bulk_create y
+las guías tocadas se recalculan con recalcular_cobrado, todo en una sola
+transacción. Si no, solo se informa lo que se crearía.
+"""
+import re
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F
+
+from . import pdf_guias
+from .cache import invalidar as invalidar_cache_reportes
+from .cobranza import repartir
+from .importar_asistencia import ErrorImportacion, leer_filas, normalizar
+from .models import Cliente, GuiaEntrega, Pago
+from .reportes import guias_con_saldo
+
+# Nombres de columna aceptados (sin tildes ni mayúsculas)
+COLUMNAS = {
+    'fecha': ('fecha', 'fecha operacion', 'fecha de operacion', 'fecha valuta', 'date'),
+    'monto': ('monto', 'importe', 'abono', 'monto abonado', 'amount'),
+    'operacion': (
+        'operacion', 'n operacion', 'nro operacion', 'nro. operacion', 'n. operacion', 'numero de operacion', 'n de operacion',
+        'codigo de operacion', 'codigo', 'referencia',
+    ),
+    'celular': ('celular', 'telefono', 'origen', 'celular origen'),
+    'descripcion': ('descripcion', 'glosa', 'concepto', 'detalle'),
+}
+OBLIGATORIAS = ('fecha', 'monto', 'operacion')
+FORMATOS_FECHA = ('%d/%m/%y', '%Y/%m/%d')
+
+LOTE = 1000
+VENTANA_DIAS = 30  # un pago suele llegar dentro del mes de la guía
+MAX_FILAS_LISTADAS = 100
+CENTAVOS = Decimal('0.01')
+FECHA_DMA = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b')
+# Sobre el texto tal cual: los espacios o guiones solo valen dentro del número,
+# así un monto o un año pegado al celular no lo tapa ni se le suma
+CELULAR = re.compile(r'(?<!\d)(?:\+?51[\s-]?)?(9(?:[\s-]?\d){8})(?!\d)')
+SEPARADORES = re.compile(r'[\s-]')
+
+
+def _indices(cabecera):
+    nombres = [normalizar(c) for c in cabecera]
+    indices = {}
+    for campo, alias in COLUMNAS.items():
+        alias = set(map(normalizar, alias))
+        for posicion, nombre in enumerate(nombres):
+            if nombre in alias:
+                indices[campo] = posicion
+                break
+    faltan = [campo for campo in OBLIGATORIAS if campo not in indices]
+    if faltan:
+        raise ErrorImportacion(
+            f"Faltan columnas: {', '.join(faltan)}. "
+            f"Cabecera leída: {', '.join(str(c) for c in cabecera if c)}"
+        )
+    return indices
+
+
+def _monto(valor):
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor)).quantize(CENTAVOS)
+    texto = str(valor).replace('S/.', '').replace('S/', '').replace(' ', '').strip()
+    if ',' in texto and '.' in texto:
+        # El que va primero es el separador de miles: 1,234.50 o 1.234,50
+        miles = ',' if texto.index(',') < texto.index('.') else '.'
+        texto = texto.replace(miles, '').replace(',', '.')
+    else:
+        texto = texto.replace(',', '.')
+    try:
+        monto = Decimal(texto).quantize(CENTAVOS)
+    except InvalidOperation:
+        monto = None
+    if monto is None or not monto.is_finite():
+        raise ValueError(f"monto '{valor}' no se entiende")
+    return monto
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    try:
+        return date.fromisoformat(texto[:10])
+    except ValueError:
+        pass
+    # dd/mm/aaaa (lo que exportan los bancos) sin strptime, que es lo más lento de la lectura
+    encontrada = FECHA_DMA.match(texto)
+    if encontrada:
+        dia, mes, anio = map(int, encontrada.groups())
+        try:
+            return date(anio, mes, dia)
+        except ValueError:
+            raise ValueError(f"fecha '{texto}' no existe")
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"fecha '{texto}' no se entiende")
+
+
+def _celular(*textos):
+    """Los 9 dígitos del celular (con o sin +51, espacios o guiones) del primer texto que tenga uno."""
+    for texto in textos:
+        encontrado = CELULAR.search(str(texto or ''))
+        if encontrado:
+            return SEPARADORES.sub('', encontrado.group(1))
+    return None
+
+
+def _celda(fila, indices, campo):
+    posicion = indices.get(campo)
+    return fila[posicion] if posicion is not None and posicion < len(fila) else None
+
+
+class _Conciliacion:
+    """Estado de una corrida: contadores, lo listado y lo que ya se asignó de cada guía."""
+
+    def __init__(self, crear):
+        self.crear = crear
+        self.resumen = {
+            'filas': 0, 'rechazadas': 0, 'ignoradas': 0, 'registradas': 0,
+            'conciliadas': 0, 'ambiguas': 0, 'sin_coincidencia': 0,
+            'pagos': 0, 'monto_conciliado': Decimal('0.00'),
+        }
+        self.listas = {tipo: [] for tipo in ('rechazadas', 'registradas', 'conciliadas', 'ambiguas', 'sin_coincidencia')}
+        self.codigos = set()             # N° de operación ya vistos en el archivo
+        self.asignado = defaultdict(Decimal)  # guia_id -> monto asignado en esta corrida
+        self.guias_tocadas = set()
+
+    def anotar(self, tipo, numero, movimiento, detalle):
+        self.resumen[tipo] += 1
+        if len(self.listas[tipo]) < MAX_FILAS_LISTADAS:
+            self.listas[tipo].append({
+                'fila': numero,
+                'fecha': movimiento.get('fecha'),
+                'operacion': movimiento.get('operacion'),
+                'monto': movimiento.get('monto'),
+                'detalle': detalle,
+            })
+
+    def restante(self, guia):
+        return guia['saldo'] - self.asignado[guia['pk']]
+
+    def procesar(self, bloque):
+        """bloque: [(numero de fila, movimiento)] con monto > 0 y fecha ya leídos."""
+        codigos = {m['operacion'] for _, m in bloque if m['operacion']}
+        registrados = dict(
+            Pago.objects.filter(comprobante_banco__in=codigos).values_list('comprobante_banco', 'guia__numero_guia')
+        ) if codigos else {}
+
+        celulares = {m['celular'] for _, m in bloque if m['celular']}
+        clientes = defaultdict(set)
+        for celular, pk in Cliente.objects.filter(celular__in=celulares).values_list('celular', 'pk') if celulares else ():
+            clientes[celular].add(pk)
+
+        # Guías abiertas de los clientes identificados (por celular)...
+        guias_cliente = defaultdict(list)
+        ids = {pk for pks in clientes.values() if len(pks) == 1 for pk in pks}
+        if ids:
+            for guia in self._guias_abiertas().filter(cliente_id__in=ids):
+                guias_cliente[guia['cliente_id']].append(guia)
+
+        # ... y para el resto, las de saldo igual a algún monto dentro de la ventana de fechas
+        guias_monto = defaultdict(list)
+        sin_cliente = [m for _, m in bloque if len(clientes.get(m['celular'], ())) != 1]
+        if sin_cliente:
+            desde = min(m['fecha'] for m in sin_cliente) - timedelta(days=VENTANA_DIAS)
+            hasta = max(m['fecha'] for m in sin_cliente)
+            guias = self._guias_abiertas().filter(
+                fecha_emision__range=(desde, hasta), saldo__in={m['monto'] for m in sin_cliente},
+            )
+            for guia in guias:
+                guias_monto[guia['saldo']].append(guia)
+
+        pagos = []
+        for numero, movimiento in bloque:
+            asignaciones, detalle = self._cruzar(movimiento, registrados, clientes, guias_cliente, guias_monto)
+            if asignaciones is None:
+                self.anotar(detalle[0], numero, movimiento, detalle[1])
+                continue
+            for guia, monto in asignaciones:
+                self.asignado[guia['pk']] += monto
+                self.guias_tocadas.add(guia['pk'])
+                pagos.append(Pago(
+                    guia_id=guia['pk'], monto=monto, fecha=movimiento['fecha'],
+                    comprobante_banco=movimiento['operacion'],
+                ))
+            self.resumen['monto_conciliado'] += movimiento['monto']
+            self.anotar('conciliadas', numero, movimiento, ', '.join(
+                f"N° {guia['numero_guia']} (S/ {monto:.2f})" for guia, monto in asignaciones
+            ))
+
+        self.resumen['pagos'] += len(pagos)
+        if self.crear:
+            Pago.objects.bulk_create(pagos, batch_size=LOTE)
+
+    @staticmethod
+    def _guias_abiertas():
+        return guias_con_saldo().annotate(saldo=F('total_venta') - F('monto_cobrado')).order_by(
+            'fecha_emision', 'id',
+        ).values('pk', 'numero_guia', 'cliente_id', 'fecha_emision', 'saldo')
+
+    def _cruzar(self, movimiento, registrados, clientes, guias_cliente, guias_monto):
+        """([(guia, monto)], None) si calza; (None, (tipo, motivo)) si no."""
+        operacion, monto = movimiento['operacion'], movimiento['monto']
+        if operacion in registrados:
+            return None, ('registradas', f"Ya registrado en la guía N° {registrados[operacion]}")
+        if not operacion:
+            return None, ('ambiguas', "Sin N° de operación")
+        if operacion in self.codigos:
+            return None, ('ambiguas', "N° de operación repetido en el extracto")
+        self.codigos.add(operacion)
+
+        deudor = clientes.get(movimiento['celular'], ())
+        if len(deudor) > 1:
+            return None, ('ambiguas', f"El celular {movimiento['celular']} es de {len(deudor)} clientes")
+        if deudor:
+            abiertas = [g for g in guias_cliente[next(iter(deudor))] if self.restante(g) > 0]
+            exactas = [g for g in abiertas if self.restante(g) == monto]
+            if len(exactas) == 1:
+                return [(exactas[0], monto)], None
+            deuda = sum((self.restante(g) for g in abiertas), Decimal('0.00'))
+            if not abiertas or monto > deuda:
+                return None, ('ambiguas', f"El cliente del celular {movimiento['celular']} debe S/ {deuda:.2f}")
+            por_guia = {g['pk']: g for g in abiertas}
+            return [(por_guia[pk], asignado) for pk, asignado in repartir([(g['pk'], self.restante(g)) for g in abiertas], monto)], None
+
+        desde = movimiento['fecha'] - timedelta(days=VENTANA_DIAS)
+        candidatas = [
+            g for g in guias_monto.get(monto, ())
+            if desde <= g['fecha_emision'] <= movimiento['fecha'] and self.restante(g) == monto
+        ]
+        if len(candidatas) == 1:
+            return [(candidatas[0], monto)], None
+        if candidatas:
+            return None, ('ambiguas', f"{len(candidatas)} guías con saldo S/ {monto:.2f}: " + ', '.join(
+                f"N° {g['numero_guia']}" for g in candidatas[:5]
+            ))
+        return None, ('sin_coincidencia', "Ninguna guía abierta con ese saldo en la ventana de fechas")
+
+
+def conciliar_extracto(archivo, nombre, lote=LOTE, crear=False):
+    """
+    Concilia el extracto (abierto en binario). Devuelve un resumen con los
+    contadores (filas, rechazadas, ignoradas, registradas, conciliadas,
+    ambiguas, sin_coincidencia, pagos, monto_conciliado), las primeras
+    MAX_FILAS_LISTADAS filas de cada tipo, segundos y filas/s. Con
+    crear=False no escribe nada.
+    """
+    inicio = time.perf_counter()
+    filas = iter(leer_filas(archivo, nombre))
+    try:
+        indices = _indices(next(filas))
+    except StopIteration:
+        raise ErrorImportacion("El archivo está vacío.")
+
+    corrida = _Conciliacion(crear)
+    with transaction.atomic():
+        bloque = []
+        for numero, fila in enumerate(filas, start=2):
+            if not any(fila):
+                continue
+            corrida.resumen['filas'] += 1
+            movimiento = {'operacion': str(_celda(fila, indices, 'operacion') or '').strip()[:100]}
+            try:
+                movimiento['monto'] = _monto(_celda(fila, indices, 'monto'))
+                movimiento['fecha'] = _fecha(_celda(fila, indices, 'fecha'))
+            except (ValueError, TypeError) as error:
+                corrida.anotar('rechazadas', numero, movimiento, str(error))
+                continue
+            if movimiento['monto'] <= 0:
+                corrida.resumen['ignoradas'] += 1  # cargos: no son cobranzas
+                continue
+            movimiento['celular'] = _celular(_celda(fila, indices, 'celular'), _celda(fila, indices, 'descripcion'))
+            bloque.append((numero, movimiento))
+            if len(bloque) >= lote:
+                corrida.procesar(bloque)
+                bloque = []
+        if bloque:
+            corrida.procesar(bloque)
+
+        if crear and corrida.guias_tocadas:
+            tocadas = sorted(corrida.guias_tocadas)
+            for desde in range(0, len(tocadas), lote):
+                GuiaEntrega.objects.filter(pk__in=tocadas[desde:desde + lote]).recalcular_cobrado()
+            # bulk_create y update() no mandan señales: lo que harían los save() de cada Pago
+            invalidar_cache_reportes()
+            for guia_id in tocadas:
+                pdf_guias.invalidar(guia_id)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        **corrida.resumen,
+        'listado': corrida.listas,
+        'segundos': segundos,
+        'filas_por_segundo': corrida.resumen['filas'] / segundos if segundos else 0,
+        'creado': crear,
+    }
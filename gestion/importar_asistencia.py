@@ -0,0 +1,233 @@
+"""
+Carga de marcaciones del reloj biométrico (CSV o XLSX) a Asistencia.
+
+El archivo se lee en streaming (csv del estándar u openpyxl en modo
+read_only), así que un export de semanas de todo el personal no se carga
+entero en memoria: por cada (colaborador, día) solo se guarda la primera y
+la última marcación. La primera es la entrada y la última la salida (con
+una sola marcación, la salida queda vacía como cuando marcan en el admin).
+
+Contra la BD se cruza por la restricción única (usuario, fecha): si el día
+ya existe se completa (entrada más temprana, salida más tardía) con
+bulk_update; si no, bulk_create. Todo por lotes y en una sola transacción.
+Las filas que no se entienden se rechazan con su número de fila y el motivo.
+"""
+import codecs
+import csv
+import io
+import time
+import unicodedata
+from datetime import date, datetime
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Asistencia
+
+# Nombres de columna aceptados (sin tildes ni mayúsculas)
+COLUMNAS = {
+    'usuario': ('usuario', 'username', 'empleado', 'codigo', 'user id', 'id usuario'),
+    'fecha_hora': ('fecha_hora', 'fecha y hora', 'marcacion', 'datetime', 'checktime'),
+    'fecha': ('fecha', 'date'),
+    'hora': ('hora', 'time'),
+}
+FORMATOS_FECHA_HORA = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+)
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+FORMATOS_HORA = ('%H:%M:%S', '%H:%M')
+
+LOTE = 1000
+MAX_RECHAZOS_LISTADOS = 50
+
+
+class ErrorImportacion(Exception):
+    """El archivo entero no se puede usar (formato o columnas)."""
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(texto.lower().replace('_', ' ').split())
+
+
+def _codificacion(archivo, muestra=64 * 1024):
+    # Muchos relojes (y el "CSV" de Excel en Windows) exportan en Windows-1252:
+    # si el inicio del archivo no es UTF-8 válido, se lee con esa codificación
+    inicio = archivo.read(muestra)
+    archivo.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(inicio, final=False)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8-sig'
+
+
+def leer_filas(archivo, nombre):
+    """Filas del archivo (la primera es la cabecera), una por una."""
+    if nombre.lower().endswith('.xlsx'):
+        import openpyxl  # como en reportes.py: solo se carga si se usa
+
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            yield from libro.active.iter_rows(values_only=True)
+        finally:
+            libro.close()
+    elif nombre.lower().endswith(('.csv', '.txt')):
+        texto = io.TextIOWrapper(archivo, encoding=_codificacion(archivo), newline='')
+        try:
+            muestra = texto.read(4096)
+            texto.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+            except csv.Error:
+                dialecto = csv.excel
+            yield from csv.reader(texto, dialecto)
+        except UnicodeDecodeError:
+            raise ErrorImportacion(
+                f"No se pudo leer el texto del archivo ({texto.encoding}): guárdalo como 'CSV UTF-8' y vuelve a subirlo."
+            )
+        finally:
+            texto.detach()  # el archivo es de quien lo abrió: no se cierra aquí
+    else:
+        raise ErrorImportacion("Formato no soportado: sube un .csv o .xlsx")
+
+
+def _indices(cabecera):
+    nombres = [normalizar(c) for c in cabecera]
+    indices = {}
+    for campo, alias in COLUMNAS.items():
+        for posicion, nombre in enumerate(nombres):
+            if nombre in map(normalizar, alias):
+                indices[campo] = posicion
+                break
+    if 'usuario' not in indices or not ('fecha_hora' in indices or {'fecha', 'hora'} <= indices.keys()):
+        raise ErrorImportacion(
+            "Faltan columnas: se necesita 'usuario' y 'fecha_hora' (o 'fecha' y 'hora'). "
+            f"Cabecera leída: {', '.join(str(c) for c in cabecera if c)}"
+        )
+    return indices
+
+
+def _parsear(valor, formatos):
+    texto = str(valor).strip()
+    try:
+        return datetime.fromisoformat(texto)  # lo más común y mucho más rápido que strptime
+    except ValueError:
+        pass
+    for formato in formatos:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"no se entiende '{texto}'")
+
+
+def _marcacion(fila, indices):
+    # En XLSX las celdas de fecha/hora ya vienen como datetime/date/time
+    if 'fecha_hora' in indices:
+        valor = fila[indices['fecha_hora']]
+        return valor if isinstance(valor, datetime) else _parsear(valor, FORMATOS_FECHA_HORA)
+    fecha, hora = fila[indices['fecha']], fila[indices['hora']]
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    elif not isinstance(fecha, date):
+        fecha = _parsear(fecha, FORMATOS_FECHA).date()
+    if isinstance(hora, datetime):
+        hora = hora.time()
+    elif not hasattr(hora, 'hour'):
+        hora = _parsear(hora, FORMATOS_HORA).time()
+    return datetime.combine(fecha, hora)
+
+
+def _juntar(*horas):
+    """(entrada, salida) a partir de todas las marcaciones conocidas del día."""
+    horas = [h for h in horas if h is not None]
+    entrada, salida = min(horas), max(horas)
+    return entrada, (salida if salida > entrada else None)
+
+
+def importar_marcaciones(archivo, nombre, lote=LOTE, simular=False):
+    """
+    Importa el archivo (abierto en binario). Devuelve un resumen con filas
+    leídas, días creados/actualizados/sin cambios, filas rechazadas (las
+    primeras MAX_RECHAZOS_LISTADOS con su motivo), segundos y filas/s.
+    Con simular=True no escribe nada.
+    """
+    inicio = time.perf_counter()
+    usuarios = {normalizar(username): pk for pk, username in User.objects.values_list('pk', 'username')}
+    filas = iter(leer_filas(archivo, nombre))
+    try:
+        indices = _indices(next(filas))
+    except StopIteration:
+        raise ErrorImportacion("El archivo está vacío.")
+
+    # (usuario_id, fecha) -> [primera marcación, última marcación, cantidad]
+    dias = {}
+    leidas = rechazadas = 0
+    motivos = []
+    for numero, fila in enumerate(filas, start=2):
+        if not any(fila):
+            continue
+        leidas += 1
+        try:
+            usuario_id = usuarios.get(normalizar(fila[indices['usuario']]))
+            if usuario_id is None:
+                raise ValueError(f"usuario '{fila[indices['usuario']]}' no existe")
+            marca = _marcacion(fila, indices)
+        except (ValueError, TypeError, IndexError) as error:
+            rechazadas += 1
+            if len(motivos) < MAX_RECHAZOS_LISTADOS:
+                motivos.append((numero, str(error)))
+            continue
+        clave = (usuario_id, marca.date())
+        hora = marca.time().replace(microsecond=0)
+        dia = dias.get(clave)
+        if dia is None:
+            dias[clave] = [hora, hora, 1]
+        else:
+            dia[0], dia[1], dia[2] = min(dia[0], hora), max(dia[1], hora), dia[2] + 1
+
+    creadas = actualizadas = sin_cambios = 0
+    claves = sorted(dias)
+    with transaction.atomic():
+        for desde in range(0, len(claves), lote):
+            bloque = claves[desde:desde + lote]
+            existentes = {
+                (a.usuario_id, a.fecha): a
+                for a in Asistencia.objects.filter(
+                    usuario_id__in={u for u, _ in bloque}, fecha__in={f for _, f in bloque},
+                )
+            }
+            nuevas, cambiadas = [], []
+            for clave in bloque:
+                primera, ultima, cantidad = dias[clave]
+                actual = existentes.get(clave)
+                if actual is None:
+                    entrada, salida = _juntar(primera, ultima if cantidad > 1 else None)
+                    nuevas.append(Asistencia(usuario_id=clave[0], fecha=clave[1], hora_entrada=entrada, hora_salida=salida))
+                    continue
+                entrada, salida = _juntar(actual.hora_entrada, actual.hora_salida, primera, ultima if cantidad > 1 else None)
+                if (entrada, salida) == (actual.hora_entrada, actual.hora_salida):
+                    sin_cambios += 1
+                else:
+                    actual.hora_entrada, actual.hora_salida = entrada, salida
+                    cambiadas.append(actual)
+            if not simular:
+                Asistencia.objects.bulk_create(nuevas, batch_size=lote)
+                Asistencia.objects.bulk_update(cambiadas, ['hora_entrada', 'hora_salida'], batch_size=lote)
+            creadas += len(nuevas)
+            actualizadas += len(cambiadas)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'filas': leidas,
+        'rechazadas': rechazadas,
+        'motivos': motivos,
+        'creadas': creadas,
+        'actualizadas': actualizadas,
+        'sin_cambios': sin_cambios,
+        'segundos': segundos,
+        'filas_por_segundo': leidas / segundos if segundos else 0,
+        'simulado': simular,
+    }
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion import conciliacion
+
+
+class Command(BaseCommand):
+    help = "Concilia un extracto del banco o de Yape (.csv o .xlsx) contra los pagos y las guías pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del extracto (.csv o .xlsx)")
+        parser.add_argument('--lote', type=int, default=conciliacion.LOTE, help="Movimientos por lote (default 1000)")
+        parser.add_argument('--crear', action='store_true', help="Registra los pagos conciliados (si no, solo muestra la propuesta)")
+
+    def handle(self, *args, **opciones):
+        try:
+            with open(opciones['archivo'], 'rb') as archivo:
+                resumen = conciliacion.conciliar_extracto(
+                    archivo, opciones['archivo'], lote=opciones['lote'], crear=opciones['crear'],
+                )
+        except (OSError, conciliacion.ErrorImportacion) as error:
+            raise CommandError(str(error))
+
+        for tipo in ('rechazadas', 'ambiguas', 'sin_coincidencia'):
+            for fila in resumen['listado'][tipo]:
+                self.stdout.write(self.style.WARNING(f"⚠️  Fila {fila['fila']} ({fila['operacion'] or 'sin N°'}): {fila['detalle']}"))
+
+        self.stdout.write(
+            f"📥 {resumen['filas']} movimientos leídos en {resumen['segundos']:.2f} s "
+            f"({resumen['filas_por_segundo']:.0f} filas/s), {resumen['ignoradas']} cargos ignorados, "
+            f"{resumen['rechazadas']} filas rechazadas."
+        )
+        self.stdout.write(
+            f"⚠️  {resumen['ambiguas']} ambiguos y {resumen['sin_coincidencia']} sin coincidencia "
+            f"(se listan hasta {conciliacion.MAX_FILAS_LISTADAS} de cada uno); {resumen['registradas']} ya estaban registrados."
+        )
+        prefijo = "✅ Listo: se registraron" if resumen['creado'] else "🔍 Propuesta (usa --crear para guardar): se registrarían"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo} {resumen['pagos']} pagos por S/ {resumen['monto_conciliado']} "
+            f"de {resumen['conciliadas']} movimientos conciliados."
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion import importar_asistencia
+
+
+class Command(BaseCommand):
+    help = "Importa las marcaciones exportadas del reloj biométrico (.csv o .xlsx) a Control de Asistencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del export del reloj (.csv o .xlsx)")
+        parser.add_argument('--lote', type=int, default=importar_asistencia.LOTE, help="Registros por lote (default 1000)")
+        parser.add_argument('--solo-revisar', action='store_true', help="Lee y valida todo pero no guarda nada")
+
+    def handle(self, *args, **opciones):
+        try:
+            with open(opciones['archivo'], 'rb') as archivo:
+                resumen = importar_asistencia.importar_marcaciones(
+                    archivo, opciones['archivo'], lote=opciones['lote'], simular=opciones['solo_revisar'],
+                )
+        except (OSError, importar_asistencia.ErrorImportacion) as error:
+            raise CommandError(str(error))
+
+        for numero, motivo in resumen['motivos']:
+            self.stdout.write(self.style.WARNING(f"⚠️  Fila {numero}: {motivo}"))
+        if resumen['rechazadas'] > len(resumen['motivos']):
+            self.stdout.write(self.style.WARNING(f"⚠️  ... y {resumen['rechazadas'] - len(resumen['motivos'])} filas rechazadas más."))
+
+        self.stdout.write(
+            f"📥 {resumen['filas']} marcaciones leídas en {resumen['segundos']:.2f} s "
+            f"({resumen['filas_por_segundo']:.0f} filas/s), {resumen['rechazadas']} rechazadas."
+        )
+        prefijo = "🔍 Solo revisión: se crearían" if resumen['simulado'] else "✅ Listo:"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo} {resumen['creadas']} días nuevos, {resumen['actualizadas']} completados, "
+            f"{resumen['sin_cambios']} sin cambios."
+        ))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.pdf_guias import calentar
+from gestion.trabajos import ejecutar, limpiar_vencidos, tomar_siguiente
+
+
+class Command(BaseCommand):
+    help = "Worker de reportes: procesa los TrabajoReporte en cola usando la BD como cola."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Procesa lo pendiente y termina (útil para cron)")
+        parser.add_argument('--espera', type=float, default=2.0, help="Segundos entre revisiones de la cola (default 2)")
+
+    def handle(self, *args, **opciones):
+        procesados = 0
+        ultima_limpieza = 0
+        calentar()  # los procesos del pool de PDFs heredan todo ya cargado
+        while True:
+            if time.monotonic() - ultima_limpieza > 300:
+                borrados, huerfanos = limpiar_vencidos()
+                if borrados or huerfanos:
+                    self.stdout.write(f"🧹 {borrados} reportes vencidos borrados, {huerfanos} marcados como interrumpidos.")
+                ultima_limpieza = time.monotonic()
+
+            trabajo = tomar_siguiente()
+            if trabajo is None:
+                if opciones['una_vez']:
+                    break
+                time.sleep(opciones['espera'])
+                continue
+
+            self.stdout.write(f"⚙️  Procesando {trabajo}...")
+            ejecutar(trabajo)
+            procesados += 1
+            if trabajo.estado == 'ERROR':
+                self.stdout.write(self.style.ERROR(f"⛔ Trabajo {trabajo.pk}: {trabajo.mensaje}"))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {procesados} trabajos procesados."))
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Sum, Value, When
+
+from gestion.models import MovimientoStock, Producto
+
+
+class Command(BaseCommand):
+    help = "Recalcula Producto.stock_actual a partir del kardex (MovimientoStock), por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Productos por lote (default 500)")
+        parser.add_argument('--solo-revisar', action='store_true', help="Solo reporta diferencias, no corrige")
+
+    def handle(self, *args, **opciones):
+        lote = opciones['lote']
+        solo_revisar = opciones['solo_revisar']
+        revisados = con_diferencias = 0
+        ultimo_id = 0
+
+        while True:
+            with transaction.atomic():
+                # Bloqueamos el lote para que una venta simultánea no se pierda al corregir
+                productos = list(
+                    Producto.objects.select_for_update()
+                    .filter(pk__gt=ultimo_id).order_by('pk')
+                    .values_list('pk', 'stock_actual')[:lote]
+                )
+                if not productos:
+                    break
+                ultimo_id = productos[-1][0]
+
+                saldos = dict(
+                    MovimientoStock.objects.filter(producto_id__in=[pk for pk, _ in productos])
+                    .order_by().values('producto_id').annotate(saldo=Sum('cantidad'))
+                    .values_list('producto_id', 'saldo')
+                )
+                diferencias = {}
+                for pk, stock in productos:
+                    saldo = saldos.get(pk) or Decimal('0')
+                    if saldo != stock:
+                        diferencias[pk] = saldo
+                        self.stdout.write(f"⚠️  Producto {pk}: stock_actual={stock} kardex={saldo}")
+
+                con_diferencias += len(diferencias)
+                if diferencias and not solo_revisar:
+                    Producto.objects.filter(pk__in=diferencias).update(stock_actual=Case(
+                        *[When(pk=pk, then=Value(int(saldo))) for pk, saldo in diferencias.items()],
+                        output_field=models.IntegerField(),
+                    ))
+
+            revisados += len(productos)
+
+        accion = "con diferencias" if solo_revisar else "corregidos"
+        self.stdout.write(self.style.SUCCESS(f"✅ {revisados} productos revisados, {con_diferencias} {accion}."))
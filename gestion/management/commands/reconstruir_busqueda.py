@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from gestion import busqueda
+
+
+class Command(BaseCommand):
+    help = "Vuelve a llenar las tablas FTS de la búsqueda del admin (SQLite), p. ej. tras cargas masivas o .update()."
+
+    def handle(self, *args, **opciones):
+        hechos = 0
+        for modelo in busqueda.CAMPOS:
+            if not busqueda.usa_fts(modelo):
+                self.stdout.write(f"⚠️  {modelo._meta.verbose_name_plural}: sin tabla FTS (solo aplica a SQLite 3.34+).")
+                continue
+            filas = busqueda.reconstruir(modelo)
+            hechos += 1
+            self.stdout.write(f"🔎 {modelo._meta.verbose_name_plural}: {filas} filas indexadas.")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {hechos} índices de búsqueda reconstruidos."))
@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from gestion.models import Gasto, GuiaEntrega, ResumenDiario, refrescar_resumenes
+from gestion.reportes import verificar_resumenes
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los resúmenes diarios (ventas, gastos, asesores) desde GuiaEntrega y Gasto, por lotes de días."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help="AAAA-MM-DD (default: primera guía/gasto)")
+        parser.add_argument('--hasta', type=date.fromisoformat, help="AAAA-MM-DD (default: última guía/gasto)")
+        parser.add_argument('--lote', type=int, default=31, help="Días por lote (default 31)")
+        parser.add_argument('--solo-verificar', action='store_true', help="Solo compara resúmenes vs. tablas, no reconstruye")
+
+    def rango_con_datos(self):
+        fechas = [
+            valor
+            for modelo in (GuiaEntrega, Gasto)
+            for valor in modelo.objects.aggregate(a=Min('fecha_emision'), b=Max('fecha_emision')).values()
+        ]
+        fechas += list(ResumenDiario.objects.aggregate(a=Min('fecha'), b=Max('fecha')).values())
+        fechas = [f for f in fechas if f]
+        return (min(fechas), max(fechas)) if fechas else (None, None)
+
+    def handle(self, *args, **opciones):
+        primera, ultima = self.rango_con_datos()
+        desde = opciones['desde'] or primera
+        hasta = opciones['hasta'] or ultima
+        if not desde or not hasta:
+            self.stdout.write("No hay guías ni gastos registrados.")
+            return
+
+        if opciones['solo_verificar']:
+            diferencias = verificar_resumenes(desde, hasta)
+            for fecha, campo, real, resumen in diferencias:
+                self.stdout.write(f"⚠️  {fecha} {campo}: real={real} resumen={resumen}")
+            estilo = self.style.WARNING if diferencias else self.style.SUCCESS
+            self.stdout.write(estilo(f"{len(diferencias)} diferencias entre {desde} y {hasta}."))
+            return
+
+        dia = desde
+        while dia <= hasta:
+            fin_lote = min(dia + timedelta(days=opciones['lote'] - 1), hasta)
+            refrescar_resumenes([dia + timedelta(days=i) for i in range((fin_lote - dia).days + 1)])
+            dia = fin_lote + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Resúmenes reconstruidos del {desde} al {hasta}."))
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 11:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def crear_saldos_iniciales(apps, schema_editor):
+    # El stock que ya existía entra al kardex como un AJUSTE de apertura,
+    # así la reconciliación (reconciliar_stock) parte del mismo saldo.
+    Producto = apps.get_model('gestion', 'Producto')
+    MovimientoStock = apps.get_model('gestion', 'MovimientoStock')
+    lote = []
+    for producto_id, stock in Producto.objects.exclude(stock_actual=0).values_list('id', 'stock_actual').iterator(chunk_size=1000):
+        lote.append(MovimientoStock(producto_id=producto_id, tipo='AJUSTE', cantidad=stock, referencia='Saldo inicial'))
+        if len(lote) >= 1000:
+            MovimientoStock.objects.bulk_create(lote)
+            lote = []
+    MovimientoStock.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_alter_detalleguia_cantidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('VENTA', 'Venta (salida)'), ('DEVOLUCION', 'Devolución (entrada)'), ('AJUSTE', 'Ajuste de inventario'), ('COMPRA', 'Compra / Producción (entrada)')], default='AJUSTE', max_length=20)),
+                ('cantidad', models.DecimalField(decimal_places=2, help_text='Negativo para salidas, positivo para entradas', max_digits=10)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('referencia', models.CharField(blank=True, max_length=150)),
+                ('guia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to='gestion.guiaentrega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='gestion.producto')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock',
+                'verbose_name_plural': 'Kardex (Movimientos de Stock)',
+                'ordering': ['-fecha', '-id'],
+            },
+        ),
+        migrations.RunPython(crear_saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+def crear_contadores(apps, schema_editor):
+    # Un contador por año, partiendo del mayor número numérico ya emitido
+    GuiaEntrega = apps.get_model('gestion', 'GuiaEntrega')
+    SecuenciaGuia = apps.get_model('gestion', 'SecuenciaGuia')
+    maximos = {}
+    for fecha, numero in GuiaEntrega.objects.values_list('fecha_emision', 'numero_guia').iterator(chunk_size=2000):
+        if numero.isdigit():
+            maximos[fecha.year] = max(maximos.get(fecha.year, 0), int(numero))
+    SecuenciaGuia.objects.bulk_create([
+        SecuenciaGuia(anio=anio, ultimo_numero=maximo) for anio, maximo in maximos.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0008_movimientostock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaGuia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField(unique=True, verbose_name='Año')),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Guías',
+                'verbose_name_plural': 'Secuencias de Guías',
+            },
+        ),
+        migrations.RunPython(crear_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 11:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_secuenciaguia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['fecha_emision'], name='gasto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guiaentrega',
+            index=models.Index(fields=['fecha_emision'], name='guia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guiaentrega',
+            index=models.Index(fields=['estado_pago'], name='guia_estado_idx'),
+        ),
+    ]
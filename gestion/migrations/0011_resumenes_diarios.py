@@ -0,0 +1,57 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0010_indices_reportes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('total_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_guias', models.PositiveIntegerField(default=0)),
+                ('total_gastos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenGastoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('categoria', models.CharField(choices=[('SUMINISTRO', 'Compra de Material/Insumos'), ('OPERATIVO', 'Gasto Operativo (Luz, Local, Personal)'), ('DEUDA', 'Pago de Deuda/Préstamo')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'categoria'), name='resumen_gasto_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenAsesorDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('total_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_guias', models.PositiveIntegerField(default=0)),
+                ('asesor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'asesor'], name='resumen_asesor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajoreporte',
+            name='tipo',
+            field=models.CharField(choices=[('EXCEL', 'Reporte Excel de movimientos'), ('PDF_GUIA', 'Pre-render de PDF de guía')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 12:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_trabajo_pdf_lote'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['-fecha', '-id'], name='asistencia_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['-fecha_emision', '-id'], name='gasto_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guiaentrega',
+            index=models.Index(fields=['-fecha_emision', '-numero_guia', 'id'], name='guia_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 12:12
+
+import sqlite3
+
+from django.db import migrations
+
+# (tabla, modelo, campos de texto) — lo mismo que busqueda.CAMPOS
+INDEXADOS = [
+    ('gestion_cliente', 'cliente', ('nombre_contacto', 'nombre_empresa')),
+    ('gestion_producto', 'producto', ('nombre',)),
+    ('gestion_proveedor', 'proveedor', ('razon_social', 'ruc_dni')),
+    ('gestion_guiaentrega', 'guiaentrega', ('numero_guia',)),
+    ('gestion_gasto', 'gasto', ('descripcion',)),
+]
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # GIN de trigramas sobre UPPER(campo::text): la misma expresión que genera icontains
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for tabla, modelo, campos in INDEXADOS:
+            for campo in campos:
+                schema_editor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {modelo}_{campo}_trgm ON {tabla} "
+                    f"USING gin (UPPER({campo}::text) gin_trgm_ops)"
+                )
+    elif vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34):
+        # Tablas FTS5 sombra con tokenizador trigram (SQLite 3.34+); sin él la búsqueda sigue con icontains
+        for tabla, modelo, campos in INDEXADOS:
+            origen = ', '.join(f"COALESCE({campo}, '')" for campo in campos)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE gestion_busqueda_{modelo} USING fts5({', '.join(campos)}, tokenize='trigram')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO gestion_busqueda_{modelo} (rowid, {', '.join(campos)}) SELECT id, {origen} FROM {tabla}"
+            )
+    schema_editor.connection.tablas_busqueda = None  # que busqueda.usa_fts vuelva a mirar
+
+
+def borrar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for tabla, modelo, campos in INDEXADOS:
+        if vendor == 'postgresql':
+            for campo in campos:
+                schema_editor.execute(f"DROP INDEX IF EXISTS {modelo}_{campo}_trgm")
+        elif vendor == 'sqlite':
+            schema_editor.execute(f"DROP TABLE IF EXISTS gestion_busqueda_{modelo}")
+    schema_editor.connection.tablas_busqueda = None
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_indices_keyset'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 12:21
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_producto_actualizado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoNomina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DateField()),
+                ('hasta', models.DateField()),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cerrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Periodo de Nómina',
+                'verbose_name_plural': 'Periodos de Nómina (cerrados)',
+                'ordering': ['-desde'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReciboNomina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('colaborador', models.CharField(help_text='Nombre tal como salió en el recibo', max_length=300)),
+                ('tarifa', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('total_horas', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('total_pago', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('dias', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recibos', to='gestion.periodonomina')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL, verbose_name='Colaborador')),
+            ],
+            options={
+                'verbose_name': 'Recibo de Nómina',
+                'verbose_name_plural': 'Recibos de Nómina',
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'usuario'), name='recibo_unico_por_periodo')],
+            },
+        ),
+    ]
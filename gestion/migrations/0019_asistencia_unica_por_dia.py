@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def juntar_duplicados(apps, schema_editor):
+    # Antes de la restricción: si alguien marcó entrada dos veces el mismo día,
+    # queda un solo registro con la entrada más temprana y la salida más tardía
+    Asistencia = apps.get_model('gestion', 'Asistencia')
+    db = schema_editor.connection.alias
+    repetidos = (
+        Asistencia.objects.using(db).values('usuario_id', 'fecha')
+        .annotate(n=Count('id')).filter(n__gt=1)
+    )
+    for grupo in repetidos:
+        registros = list(
+            Asistencia.objects.using(db).filter(usuario_id=grupo['usuario_id'], fecha=grupo['fecha']).order_by('id')
+        )
+        horas = [h for r in registros for h in (r.hora_entrada, r.hora_salida) if h is not None]
+        queda = registros[0]
+        if horas:
+            queda.hora_entrada = min(horas)
+            queda.hora_salida = max(horas) if max(horas) > min(horas) else None
+            queda.save(update_fields=['hora_entrada', 'hora_salida'])
+        Asistencia.objects.using(db).filter(pk__in=[r.pk for r in registros[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_periodos_nomina'),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='asistencia',
+            constraint=models.UniqueConstraint(fields=('usuario', 'fecha'), name='asistencia_unica_por_dia'),
+        ),
+    ]
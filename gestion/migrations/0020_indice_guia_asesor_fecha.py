@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 12:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0019_asistencia_unica_por_dia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guiaentrega',
+            index=models.Index(fields=['asesor', 'fecha_emision'], name='guia_asesor_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0020_indice_guia_asesor_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guiaentrega',
+            index=models.Index(condition=models.Q(('estado_pago', 'PAGADO'), _negated=True), fields=['cliente', 'fecha_emision', 'total_venta', 'monto_cobrado', 'estado_pago'], name='guia_abierta_cliente_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0021_indice_guias_abiertas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['fecha_vencimiento', 'proveedor', 'categoria', 'monto', 'estado'], name='gasto_pendiente_venc_idx'),
+        ),
+    ]
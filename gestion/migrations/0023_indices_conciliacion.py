@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0022_indice_gastos_pendientes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['celular'], name='cliente_celular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['comprobante_banco'], name='pago_comprobante_idx'),
+        ),
+    ]
@@ -1,7 +1,16 @@
-from django.db import models
+from collections import defaultdict
+from contextlib import nullcontext
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Sum, Count, Value, Case, When, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import date, datetime # <--- OJO: Importamos datetime también
+from .cache import invalidar as invalidar_cache_reportes
 from django.contrib.auth.models import User
 
 # 1. CATALOGO DE PRODUCTOS
@@ -9,6 +18,8 @@ class Producto(models.Model):
     nombre = models.CharField(max_length=200, verbose_name="Nombre del Producto")
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock_actual = models.IntegerField(default=0)
+    # Lo pone cada save(): de aquí sale la versión del catálogo de precios (api_catalogo_productos)
+    actualizado = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.nombre} - S/. {self.precio_unitario}"
@@ -24,7 +35,141 @@ class Cliente(models.Model):
     def __str__(self):
         return f"{self.nombre_contacto} ({self.nombre_empresa or 'Particular'})"
 
+    class Meta:
+        indexes = [
+            # Conciliación bancaria: el celular de origen del Yape identifica al cliente
+            models.Index(fields=['celular'], name='cliente_celular_idx'),
+        ]
+
 # 3. LA GUÍA DE ENTREGA (Cabecera)
+class SecuenciaGuia(models.Model):
+    """
+    Contador de numero_guia por año. Se incrementa con un UPDATE atómico
+    (F() + 1) que bloquea la fila hasta el commit, así dos guías creadas a la
+    vez nunca reciben el mismo número, y si la guía falla el número se
+    devuelve junto con el rollback (sin huecos).
+    """
+    anio = models.PositiveIntegerField(unique=True, verbose_name="Año")
+    ultimo_numero = models.PositiveIntegerField(default=0)
+
+    @staticmethod
+    def formatear(numero):
+        return str(numero).zfill(6)
+
+    @classmethod
+    def _crear(cls, anio):
+        # Primera guía del año (o primera vez con este contador): partimos del
+        # mayor número numérico que ya exista ese año
+        existentes = GuiaEntrega.objects.filter(fecha_emision__year=anio).values_list('numero_guia', flat=True)
+        maximo = max((int(n) for n in existentes if n.isdigit()), default=0)
+        try:
+            with transaction.atomic():
+                cls.objects.create(anio=anio, ultimo_numero=maximo)
+        except IntegrityError:
+            pass  # Otro proceso la creó primero
+
+    @classmethod
+    def siguiente(cls, anio):
+        """Asigna (consume) el siguiente número del año."""
+        with transaction.atomic():
+            if not cls.objects.filter(anio=anio).update(ultimo_numero=F('ultimo_numero') + 1):
+                cls._crear(anio)
+                cls.objects.filter(anio=anio).update(ultimo_numero=F('ultimo_numero') + 1)
+            numero = cls.objects.filter(anio=anio).values_list('ultimo_numero', flat=True).get()
+        return cls.formatear(numero)
+
+    @classmethod
+    def proximo(cls, anio):
+        """Número que tocaría ahora, SIN consumirlo (solo para mostrar)."""
+        ultimo = cls.objects.filter(anio=anio).values_list('ultimo_numero', flat=True).first()
+        if ultimo is None:
+            existentes = GuiaEntrega.objects.filter(fecha_emision__year=anio).values_list('numero_guia', flat=True)
+            ultimo = max((int(n) for n in existentes if n.isdigit()), default=0)
+        return cls.formatear(ultimo + 1)
+
+    @classmethod
+    def reservar(cls, anio, numero):
+        """Número escrito a mano: el contador avanza hasta él para no repetirlo después."""
+        with transaction.atomic():
+            if not cls.objects.filter(anio=anio).update(ultimo_numero=Greatest(F('ultimo_numero'), Value(numero))):
+                cls._crear(anio)
+                cls.objects.filter(anio=anio).update(ultimo_numero=Greatest(F('ultimo_numero'), Value(numero)))
+
+    def __str__(self):
+        return f"{self.anio}: {self.formatear(self.ultimo_numero)}"
+
+    class Meta:
+        verbose_name = "Secuencia de Guías"
+        verbose_name_plural = "Secuencias de Guías"
+
+class GuiaEntregaQuerySet(models.QuerySet):
+
+    def recalcular_totales(self):
+        """
+        Recalcula total_venta, monto_cobrado y estado_pago de todas las guías
+        del queryset con UNA consulta de agregados y UN solo UPDATE condicional
+        (solo se escriben las guías cuyos valores cambiaron).
+        Devuelve la cantidad de guías actualizadas.
+        """
+        cero = Value(Decimal('0.00'), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        suma_detalles = DetalleGuia.objects.filter(guia=OuterRef('pk')).order_by().values('guia').annotate(
+            s=Sum(F('cantidad') * Coalesce('precio_aplicado', cero), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        ).values('s')
+        suma_pagos = Pago.objects.filter(guia=OuterRef('pk')).order_by().values('guia').annotate(
+            s=Sum('monto')
+        ).values('s')
+
+        filas = self.order_by().annotate(
+            _total=Coalesce(Subquery(suma_detalles), cero),
+            _cobrado=Coalesce(Subquery(suma_pagos), cero),
+        ).values_list('pk', 'fecha_emision', 'total_venta', 'monto_cobrado', 'estado_pago', '_total', '_cobrado')
+
+        cambios = {}
+        fechas = set()
+        for pk, fecha, total_actual, cobrado_actual, estado_actual, total, cobrado in filas:
+            total = Decimal(total).quantize(Decimal('0.01'))
+            cobrado = Decimal(cobrado).quantize(Decimal('0.01'))
+            estado = GuiaEntrega.calcular_estado(total, cobrado)
+            if (total, cobrado, estado) != (total_actual, cobrado_actual, estado_actual):
+                cambios[pk] = (total, cobrado, estado)
+                fechas.add(fecha)
+
+        if not cambios:
+            return 0
+
+        programar_resumenes(fechas)
+
+        campo_dinero = models.DecimalField(max_digits=12, decimal_places=2)
+        return GuiaEntrega.objects.filter(pk__in=cambios).update(
+            total_venta=Case(*[When(pk=pk, then=Value(v[0])) for pk, v in cambios.items()], output_field=campo_dinero),
+            monto_cobrado=Case(*[When(pk=pk, then=Value(v[1])) for pk, v in cambios.items()], output_field=campo_dinero),
+            estado_pago=Case(*[When(pk=pk, then=Value(v[2])) for pk, v in cambios.items()], output_field=models.CharField()),
+        )
+
+    def recalcular_cobrado(self):
+        """
+        Como recalcular_totales pero solo monto_cobrado y estado_pago (cambiaron
+        los pagos, no los detalles), y con un UPDATE por conjunto: la suma de
+        pagos y el estado (mismas reglas que calcular_estado) los resuelve la
+        BD fila por fila, sin armar un CASE por guía. Es para miles de guías de
+        una vez (conciliación bancaria). Devuelve la cantidad de guías actualizadas.
+        """
+        campo_dinero = models.DecimalField(max_digits=12, decimal_places=2)
+        suma_pagos = Pago.objects.filter(guia=OuterRef('pk')).order_by().values('guia').annotate(
+            s=Sum('monto')
+        ).values('s')
+        cobrado = Round(Coalesce(Subquery(suma_pagos), Value(Decimal('0.00')), output_field=campo_dinero), 2)
+
+        programar_resumenes(set(self.order_by().values_list('fecha_emision', flat=True).distinct()))
+        return self.order_by().update(
+            monto_cobrado=cobrado,
+            estado_pago=Case(
+                When(Q(total_venta__gt=0, total_venta__lte=cobrado), then=Value('PAGADO')),
+                When(GreaterThan(cobrado, 0), then=Value('PARCIAL')),
+                default=Value('PENDIENTE'),
+            ),
+        )
+
 class GuiaEntrega(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT)
     asesor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -47,34 +192,54 @@ class GuiaEntrega(models.Model):
     monto_cobrado = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     observaciones = models.TextField(blank=True, default="No hay devoluciones.")
 
+    objects = GuiaEntregaQuerySet.as_manager()
+
+    @staticmethod
+    def calcular_estado(total_venta, monto_cobrado):
+        if monto_cobrado >= total_venta and total_venta > 0:
+            return 'PAGADO'
+        elif monto_cobrado > 0:
+            return 'PARCIAL'
+        return 'PENDIENTE'
+
     def actualizar_estado_pago(self):
-        total_pagado = sum([p.monto for p in self.pagos.all()])
-        self.monto_cobrado = total_pagado
-
-        if self.monto_cobrado >= self.total_venta and self.total_venta > 0:
-            self.estado_pago = 'PAGADO'
-        elif self.monto_cobrado > 0:
-            self.estado_pago = 'PARCIAL'
-        else:
-            self.estado_pago = 'PENDIENTE'
-        
-        self.save(update_fields=['monto_cobrado', 'estado_pago'])
+        # Totales y estado se recalculan en la BD (ver GuiaEntregaQuerySet)
+        GuiaEntrega.objects.filter(pk=self.pk).recalcular_totales()
+        self.refresh_from_db(fields=['total_venta', 'monto_cobrado', 'estado_pago'])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Para saber qué días del resumen tocar si cambian fecha o asesor
+        if 'fecha_emision' in field_names and 'asesor_id' in field_names:
+            instancia._resumen_original = (instancia.fecha_emision, instancia.asesor_id)
+        return instancia
 
     def save(self, *args, **kwargs):
-        # Lógica de autonumeración por año
-        if not self.pk and not self.numero_guia:
-            anio_actual = self.fecha_emision.year
-            ultima = GuiaEntrega.objects.filter(
-                fecha_emision__year=anio_actual
-            ).order_by('numero_guia').last()
-            
-            if ultima and ultima.numero_guia.isdigit():
-                nuevo = int(ultima.numero_guia) + 1
-                self.numero_guia = str(nuevo).zfill(6)
-            else:
-                self.numero_guia = '000001'
-        
-        super().save(*args, **kwargs)
+        if self.pk:
+            original = getattr(self, '_resumen_original', None)
+            super().save(*args, **kwargs)
+            if original != (self.fecha_emision, self.asesor_id):
+                programar_resumenes([original[0] if original else None, self.fecha_emision])
+                self._resumen_original = (self.fecha_emision, self.asesor_id)
+            return
+
+        # Autonumeración por año con el contador SecuenciaGuia (misma transacción que la guía)
+        with transaction.atomic():
+            if not self.numero_guia:
+                self.numero_guia = SecuenciaGuia.siguiente(self.fecha_emision.year)
+            elif self.numero_guia.isdigit():
+                SecuenciaGuia.reservar(self.fecha_emision.year, int(self.numero_guia))
+            super().save(*args, **kwargs)
+        programar_resumenes([self.fecha_emision])
+        self._resumen_original = (self.fecha_emision, self.asesor_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            MovimientoStock.devolver_guias([self.pk])
+            resultado = super().delete(*args, **kwargs)
+        programar_resumenes([self.fecha_emision])
+        return resultado
 
     def __str__(self):
         return f"Guía #{self.numero_guia} ({self.fecha_emision.year}) - {self.cliente}"
@@ -82,6 +247,22 @@ class GuiaEntrega(models.Model):
     class Meta:
         verbose_name = "Guía de Entrega"
         verbose_name_plural = "Guías de Entrega"
+        indexes = [
+            # Rangos de fechas del dashboard/reportes y la deuda (guías no pagadas)
+            models.Index(fields=['fecha_emision'], name='guia_fecha_idx'),
+            models.Index(fields=['estado_pago'], name='guia_estado_idx'),
+            # Mismo orden que el changelist del admin (paginación por cursor)
+            models.Index(fields=['-fecha_emision', '-numero_guia', 'id'], name='guia_keyset_idx'),
+            # Guías de un asesor en un rango (detalle del reporte de asesores)
+            models.Index(fields=['asesor', 'fecha_emision'], name='guia_asesor_fecha_idx'),
+            # Cuentas por cobrar: solo las guías abiertas, con todo lo que se lee
+            # (estado_pago incluido: SQLite no descarta el filtro si viene como
+            # parámetro) para agrupar por cliente y antigüedad sin tocar la tabla
+            models.Index(
+                fields=['cliente', 'fecha_emision', 'total_venta', 'monto_cobrado', 'estado_pago'],
+                condition=~models.Q(estado_pago='PAGADO'), name='guia_abierta_cliente_idx',
+            ),
+        ]
 
 # --- HISTORIAL DE PAGOS ---
 class Pago(models.Model):
@@ -90,18 +271,36 @@ class Pago(models.Model):
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     comprobante_banco = models.CharField(max_length=100, blank=True, help_text="Código de operación o Yape")
 
-    def save(self, *args, **kwargs):
+    # recalcular=False: el que llama se encarga de recalcular la guía una sola vez
+    # (por ejemplo GuiaEntregaAdmin.save_related, después de guardar todos los inlines)
+    def save(self, *args, recalcular=True, **kwargs):
         super().save(*args, **kwargs)
-        self.guia.actualizar_estado_pago()
+        if recalcular:
+            self.guia.actualizar_estado_pago()
     
-    def delete(self, *args, **kwargs):
+    def delete(self, *args, recalcular=True, **kwargs):
         guia_ref = self.guia
-        super().delete(*args, **kwargs)
-        guia_ref.actualizar_estado_pago()
+        resultado = super().delete(*args, **kwargs)
+        if recalcular:
+            guia_ref.actualizar_estado_pago()
+        return resultado
 
     def __str__(self):
         return f"Pago de {self.monto}"
 
+    class Meta:
+        indexes = [
+            # Conciliación bancaria: cada movimiento del extracto se busca por su N° de operación
+            models.Index(fields=['comprobante_banco'], name='pago_comprobante_idx'),
+        ]
+
+# Producto.stock_actual es entero: las líneas y los movimientos de kardex
+# también, aunque la columna cantidad admita decimales
+MENSAJE_CANTIDAD_ENTERA = "La cantidad debe ser un número entero de unidades."
+
+def cantidad_entera(cantidad):
+    return Decimal(str(cantidad)) % 1 == 0
+
 # 4. DETALLE DE GUIA
 class DetalleGuia(models.Model):
     guia = models.ForeignKey(GuiaEntrega, related_name='detalles', on_delete=models.CASCADE)
@@ -114,22 +313,142 @@ class DetalleGuia(models.Model):
         precio = self.precio_aplicado if self.precio_aplicado else 0
         return self.cantidad * precio
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Guardamos lo que había en la BD para saber cuánto stock mover al editar/borrar
+        if 'producto_id' in field_names and 'cantidad' in field_names:
+            instancia._stock_original = (instancia.producto_id, instancia.cantidad)
+        return instancia
+
+    def movimientos_stock(self, borrando=False):
+        """Movimientos de kardex (sin guardar) que reflejan el cambio de esta línea."""
+        original = getattr(self, '_stock_original', None)
+        if borrando:
+            if not original:
+                return []
+            return [MovimientoStock(producto_id=original[0], guia_id=self.guia_id, tipo='DEVOLUCION', cantidad=original[1])]
+
+        if not original:
+            return [MovimientoStock(producto_id=self.producto_id, guia_id=self.guia_id, tipo='VENTA', cantidad=-self.cantidad)]
+
+        producto_id, cantidad = original
+        if producto_id != self.producto_id:
+            return [
+                MovimientoStock(producto_id=producto_id, guia_id=self.guia_id, tipo='DEVOLUCION', cantidad=cantidad),
+                MovimientoStock(producto_id=self.producto_id, guia_id=self.guia_id, tipo='VENTA', cantidad=-self.cantidad),
+            ]
+        diferencia = cantidad - self.cantidad
+        if diferencia == 0:
+            return []
+        return [MovimientoStock(producto_id=producto_id, guia_id=self.guia_id,
+                                tipo='DEVOLUCION' if diferencia > 0 else 'VENTA', cantidad=diferencia)]
+
+    def clean(self):
+        if self.cantidad is not None and not cantidad_entera(self.cantidad):
+            raise ValidationError({'cantidad': MENSAJE_CANTIDAD_ENTERA})
+
+    # mover_stock=False: el que llama aplica los movimientos de todas las líneas
+    # juntos con MovimientoStock.aplicar (ver GuiaEntregaAdmin.save_formset)
+    def save(self, *args, recalcular=True, mover_stock=True, **kwargs):
         if not self.precio_aplicado:
             self.precio_aplicado = self.producto.precio_unitario
-        if not self.pk: 
-            self.producto.stock_actual -= self.cantidad
-            self.producto.save()
-        super().save(*args, **kwargs)
-        
-        total = sum([d.total_linea for d in self.guia.detalles.all()])
-        self.guia.total_venta = total
-        self.guia.save()
-        self.guia.actualizar_estado_pago()
+        movimientos = self.movimientos_stock() if mover_stock else []
+        with transaction.atomic() if movimientos else nullcontext():
+            super().save(*args, **kwargs)
+            MovimientoStock.aplicar(movimientos)
+        self._stock_original = (self.producto_id, self.cantidad)
+        if recalcular:
+            self.guia.actualizar_estado_pago()
+
+    def delete(self, *args, recalcular=True, mover_stock=True, **kwargs):
+        guia_ref = self.guia
+        movimientos = self.movimientos_stock(borrando=True) if mover_stock else []
+        with transaction.atomic() if movimientos else nullcontext():
+            resultado = super().delete(*args, **kwargs)
+            MovimientoStock.aplicar(movimientos)
+        if recalcular:
+            guia_ref.actualizar_estado_pago()
+        return resultado
 
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
 
+# 5. KARDEX: MOVIMIENTOS DE STOCK (solo inserción)
+class MovimientoStock(models.Model):
+    TIPOS = [
+        ('VENTA', 'Venta (salida)'),
+        ('DEVOLUCION', 'Devolución (entrada)'),
+        ('AJUSTE', 'Ajuste de inventario'),
+        ('COMPRA', 'Compra / Producción (entrada)'),
+    ]
+    producto = models.ForeignKey(Producto, related_name='movimientos', on_delete=models.PROTECT)
+    tipo = models.CharField(max_length=20, choices=TIPOS, default='AJUSTE')
+    # Con signo: negativo = sale del almacén, positivo = entra
+    cantidad = models.DecimalField(max_digits=10, decimal_places=2, help_text="Negativo para salidas, positivo para entradas")
+    fecha = models.DateTimeField(default=timezone.now)
+    guia = models.ForeignKey(GuiaEntrega, related_name='movimientos_stock', on_delete=models.SET_NULL, blank=True, null=True)
+    referencia = models.CharField(max_length=150, blank=True)
+
+    @staticmethod
+    def aplicar(movimientos):
+        """
+        Inserta los movimientos en UN bulk_create y mueve stock_actual de todos
+        los productos afectados en UN solo UPDATE con F() (sin leer el stock).
+        """
+        movimientos = [m for m in movimientos if m.cantidad]
+        if not movimientos:
+            return []
+        if not all(cantidad_entera(m.cantidad) for m in movimientos):
+            # stock_actual es entero: una fracción no se puede guardar tal cual
+            raise ValueError("El stock se mueve en unidades enteras.")
+
+        deltas = defaultdict(Decimal)
+        for m in movimientos:
+            deltas[m.producto_id] += m.cantidad
+
+        with transaction.atomic():
+            MovimientoStock.objects.bulk_create(movimientos)
+            Producto.objects.filter(pk__in=deltas).update(stock_actual=F('stock_actual') + Case(
+                *[When(pk=pk, then=Value(int(delta))) for pk, delta in deltas.items()],
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ))
+        # El UPDATE con F() no dispara post_save de Producto
+        invalidar_cache_reportes()
+        return movimientos
+
+    @staticmethod
+    def devolver_guias(guias):
+        """Devuelve al stock todas las líneas de las guías indicadas (antes de borrarlas)."""
+        detalles = DetalleGuia.objects.filter(guia__in=guias).values_list('producto_id', 'guia_id', 'cantidad')
+        return MovimientoStock.aplicar([
+            MovimientoStock(producto_id=producto_id, guia_id=guia_id, tipo='DEVOLUCION', cantidad=cantidad)
+            for producto_id, guia_id, cantidad in detalles
+        ])
+
+    def clean(self):
+        if self.cantidad is not None and not self.cantidad:
+            raise ValidationError({'cantidad': "La cantidad no puede ser cero."})
+        if self.cantidad is not None and not cantidad_entera(self.cantidad):
+            raise ValidationError({'cantidad': MENSAJE_CANTIDAD_ENTERA})
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("El kardex es de solo inserción: registre un AJUSTE en lugar de editar.")
+        if not self.cantidad:
+            # aplicar() descarta los ceros: el objeto quedaría sin pk
+            raise ValueError("Un movimiento de stock no puede tener cantidad cero.")
+        MovimientoStock.aplicar([self])
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.cantidad} x {self.producto.nombre}"
+
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Kardex (Movimientos de Stock)"
+        ordering = ['-fecha', '-id']
+
 # --- MÓDULO DE FINANZAS Y PROVEEDORES ---
 
 class Proveedor(models.Model):
@@ -174,6 +493,23 @@ class Gasto(models.Model):
     comprobante = models.CharField(max_length=50, blank=True, help_text="N° Factura o Boleta recibida")
     archivo_adjunto = models.FileField(upload_to='facturas_gastos/', blank=True, null=True, help_text="Foto o PDF de la factura")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        if 'fecha_emision' in field_names:
+            instancia._fecha_original = instancia.fecha_emision
+        return instancia
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        programar_resumenes([getattr(self, '_fecha_original', None), self.fecha_emision])
+        self._fecha_original = self.fecha_emision
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        programar_resumenes([self.fecha_emision])
+        return resultado
+
     def esta_vencido(self):
         if self.estado == 'PENDIENTE' and self.fecha_vencimiento:
             return date.today() > self.fecha_vencimiento
@@ -182,6 +518,179 @@ class Gasto(models.Model):
     def __str__(self):
         return f"{self.descripcion} - S/. {self.monto}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_emision'], name='gasto_fecha_idx'),
+            models.Index(fields=['-fecha_emision', '-id'], name='gasto_keyset_idx'),
+            # Cuentas por pagar (reportes.por_pagar y el filtro de vencimiento del
+            # admin): solo los pendientes. estado va en las columnas porque SQLite
+            # igual revisa estado = 'PENDIENTE' fila por fila; sin la columna
+            # tendría que ir a la tabla por cada una (ver guia_abierta_cliente_idx).
+            models.Index(
+                fields=['fecha_vencimiento', 'proveedor', 'categoria', 'monto', 'estado'],
+                condition=models.Q(estado='PENDIENTE'), name='gasto_pendiente_venc_idx',
+            ),
+        ]
+
+# --- RESÚMENES DIARIOS (para reportes por rango de fechas) ---
+# Un día = una fila: un reporte de un año lee como máximo 366 filas en vez de
+# recorrer todas las guías y gastos. Los mantienen los métodos save/delete y
+# recalcular_totales (vía programar_resumenes); reconstruir_resumenes los
+# rehace desde cero y reportes.verificar_resumenes compara contra las tablas.
+
+class ResumenDiario(models.Model):
+    fecha = models.DateField(unique=True)
+    total_ventas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cobrado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_guias = models.PositiveIntegerField(default=0)
+    total_gastos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Resumen {self.fecha}"
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+
+class ResumenGastoDiario(models.Model):
+    fecha = models.DateField()
+    categoria = models.CharField(max_length=20, choices=Gasto.CATEGORIAS)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'categoria'], name='resumen_gasto_unico'),
+        ]
+
+class ResumenAsesorDiario(models.Model):
+    fecha = models.DateField()
+    asesor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)  # igual que GuiaEntrega.asesor
+    total_ventas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cobrado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_guias = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'asesor'], name='resumen_asesor_idx'),
+        ]
+
+def _como_fecha(valor):
+    # fecha_emision usa default=timezone.now: en instancias nuevas llega como datetime
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).date() if timezone.is_aware(valor) else valor.date()
+    return valor
+
+def refrescar_resumenes(fechas):
+    """Recalcula desde las tablas reales los resúmenes de los días indicados."""
+    fechas = sorted({_como_fecha(f) for f in fechas if f})
+    if not fechas:
+        return
+
+    with transaction.atomic():
+        # Primero el candado: el upsert de las filas del día (en orden de fecha) las
+        # bloquea hasta el commit. Un refresco concurrente del mismo día espera aquí
+        # y lee los agregados ya con nuestros cambios confirmados, no antes.
+        ResumenDiario.objects.bulk_create(
+            [ResumenDiario(fecha=f) for f in fechas],
+            update_conflicts=True, unique_fields=['fecha'], update_fields=['fecha'],
+        )
+
+        por_asesor = GuiaEntrega.objects.filter(fecha_emision__in=fechas).order_by().values(
+            'fecha_emision', 'asesor_id'
+        ).annotate(ventas=Sum('total_venta'), cobrado=Sum('monto_cobrado'), guias=Count('id'))
+        por_categoria = Gasto.objects.filter(fecha_emision__in=fechas).order_by().values(
+            'fecha_emision', 'categoria'
+        ).annotate(total=Sum('monto'))
+
+        dias = {f: ResumenDiario(fecha=f) for f in fechas}
+        asesores = []
+        for fila in por_asesor:
+            dia = dias[fila['fecha_emision']]
+            dia.total_ventas += fila['ventas']
+            dia.total_cobrado += fila['cobrado']
+            dia.cantidad_guias += fila['guias']
+            asesores.append(ResumenAsesorDiario(
+                fecha=fila['fecha_emision'], asesor_id=fila['asesor_id'],
+                total_ventas=fila['ventas'], total_cobrado=fila['cobrado'], cantidad_guias=fila['guias'],
+            ))
+        gastos = []
+        for fila in por_categoria:
+            dias[fila['fecha_emision']].total_gastos += fila['total']
+            gastos.append(ResumenGastoDiario(fecha=fila['fecha_emision'], categoria=fila['categoria'], total=fila['total']))
+
+        ResumenDiario.objects.bulk_create(
+            dias.values(), update_conflicts=True, unique_fields=['fecha'],
+            update_fields=['total_ventas', 'total_cobrado', 'cantidad_guias', 'total_gastos'],
+        )
+        ResumenAsesorDiario.objects.filter(fecha__in=fechas).delete()
+        ResumenAsesorDiario.objects.bulk_create(asesores)
+        ResumenGastoDiario.objects.filter(fecha__in=fechas).delete()
+        ResumenGastoDiario.objects.bulk_create(gastos)
+    # Los reportes cacheados se calcularon con los resúmenes anteriores
+    invalidar_cache_reportes()
+
+def _refrescar_pendientes():
+    conexion = transaction.get_connection()
+    fechas, conexion.resumenes_pendientes = getattr(conexion, 'resumenes_pendientes', set()), set()
+    try:
+        refrescar_resumenes(fechas)
+    except Exception:
+        # Quedan pendientes para el próximo commit (o para reconstruir_resumenes)
+        conexion.resumenes_pendientes |= fechas
+        raise
+
+def programar_resumenes(fechas):
+    """
+    Marca días para refrescar al confirmar la transacción: aunque una guía
+    se toque varias veces en el mismo guardado, cada día se recalcula una vez.
+    Si la transacción se revierte, los días quedan pendientes para el próximo commit.
+    Un error al refrescar se registra en el log pero no anula la venta ya guardada.
+    """
+    conexion = transaction.get_connection()
+    if not hasattr(conexion, 'resumenes_pendientes'):
+        conexion.resumenes_pendientes = set()
+    conexion.resumenes_pendientes.update(f for f in fechas if f)
+    transaction.on_commit(_refrescar_pendientes, robust=True)
+
+# --- TRABAJOS DE REPORTES EN SEGUNDO PLANO ---
+# Los reportes pesados (Excel de rangos largos, PDFs en lote) no se generan en
+# la petición: se encolan aquí y los procesa `manage.py procesar_reportes`
+# usando la misma BD como cola (ver trabajos.py).
+class TrabajoReporte(models.Model):
+    TIPOS = [
+        ('EXCEL', 'Reporte Excel de movimientos'),
+        ('PDF_GUIA', 'Pre-render de PDF de guía'),
+        ('PDF_LOTE', 'Guías en lote (PDF/ZIP)'),
+        ('EXCEL_COBRANZA', 'Excel de cuentas por cobrar'),
+    ]
+    ESTADOS = [
+        ('PENDIENTE', '⏳ En cola'),
+        ('PROCESANDO', '⚙️ Procesando'),
+        ('TERMINADO', '✅ Listo'),
+        ('ERROR', '⛔ Error'),
+    ]
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
+    progreso = models.PositiveSmallIntegerField(default=0, help_text="0 a 100")
+    mensaje = models.TextField(blank=True)
+    archivo = models.FileField(upload_to='reportes/', blank=True, null=True)
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    creado = models.DateTimeField(default=timezone.now)
+    iniciado = models.DateTimeField(blank=True, null=True)
+    terminado = models.DateTimeField(blank=True, null=True)
+    expira = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = "Trabajo de Reporte"
+        verbose_name_plural = "Trabajos de Reportes"
+        indexes = [
+            models.Index(fields=['estado', 'id'], name='trabajo_cola_idx'),
+        ]
+
 # --- NUEVO: CONTROL DE ASISTENCIA (ESTO ES LO QUE FALTABA) ---
 class Asistencia(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Colaborador")
@@ -206,6 +715,13 @@ class Asistencia(models.Model):
     class Meta:
         verbose_name = "Registro de Asistencia"
         verbose_name_plural = "Control de Asistencias"
+        indexes = [
+            models.Index(fields=['-fecha', '-id'], name='asistencia_keyset_idx'),
+        ]
+        constraints = [
+            # Un registro por colaborador y día: el importador del reloj cruza por aquí
+            models.UniqueConstraint(fields=['usuario', 'fecha'], name='asistencia_unica_por_dia'),
+        ]
     
 # --- PEGAR ESTO AL FINAL DE GESTION/MODELS.PY ---
 
@@ -221,4 +737,51 @@ class PerfilColaborador(models.Model):
 
     class Meta:
         verbose_name = "Perfil de Colaborador"
-        verbose_name_plural = "Perfiles de Colaboradores"
\ No newline at end of file
+        verbose_name_plural = "Perfiles de Colaboradores"
+
+# --- NÓMINA: PERIODOS CERRADOS ---
+# Al cerrar un periodo se guarda una "foto" de cada recibo (horas, tarifa y
+# pago de cada día). Los recibos de periodos pasados se imprimen desde aquí:
+# no se recalculan aunque después cambie la tarifa o se corrija una asistencia.
+class PeriodoNomina(models.Model):
+    desde = models.DateField()
+    hasta = models.DateField()
+    cerrado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    creado = models.DateTimeField(default=timezone.now)
+
+    def clean(self):
+        if self.desde and self.hasta:
+            if self.desde > self.hasta:
+                raise ValidationError("La fecha inicial no puede ser posterior a la final.")
+            cruzados = PeriodoNomina.objects.filter(desde__lte=self.hasta, hasta__gte=self.desde).exclude(pk=self.pk)
+            if cruzados.exists():
+                raise ValidationError(f"Se cruza con el periodo ya cerrado {cruzados.first()}.")
+
+    def __str__(self):
+        return f"{self.desde:%d/%m/%Y} - {self.hasta:%d/%m/%Y}"
+
+    class Meta:
+        verbose_name = "Periodo de Nómina"
+        verbose_name_plural = "Periodos de Nómina (cerrados)"
+        ordering = ['-desde']
+
+
+class ReciboNomina(models.Model):
+    periodo = models.ForeignKey(PeriodoNomina, on_delete=models.CASCADE, related_name='recibos')
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name="Colaborador")
+    colaborador = models.CharField(max_length=300, help_text="Nombre tal como salió en el recibo")
+    tarifa = models.DecimalField(max_digits=6, decimal_places=2)
+    total_horas = models.DecimalField(max_digits=8, decimal_places=2)
+    total_pago = models.DecimalField(max_digits=12, decimal_places=2)
+    # [{"fecha", "entrada", "salida", "horas", "pago"}, ...] ya formateado por nomina.py
+    dias = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"{self.colaborador} ({self.periodo})"
+
+    class Meta:
+        verbose_name = "Recibo de Nómina"
+        verbose_name_plural = "Recibos de Nómina"
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'usuario'], name='recibo_unico_por_periodo'),
+        ]
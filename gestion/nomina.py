@@ -0,0 +1,167 @@
+"""
+Nómina a partir de los registros de Asistencia.
+
+Una sola consulta trae cada jornada con su duración (hora_salida -
+hora_entrada, restadas en la BD como intervalo) y la tarifa del perfil del
+colaborador ya unida; aquí solo se pasa la duración a horas y se multiplica
+en Decimal. Como en el recibo de siempre, las horas de cada día se redondean
+a 2 decimales y el total es la suma de los días.
+
+Los periodos cerrados (PeriodoNomina) guardan sus recibos en ReciboNomina y
+se imprimen desde ahí, sin recalcular.
+"""
+from datetime import date, time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, DurationField, ExpressionWrapper, F, Func, Max, Min, Value
+from django.db.models.functions import Coalesce, Round
+
+from .models import Asistencia, PeriodoNomina, ReciboNomina
+
+CENTAVOS = Decimal('0.01')
+
+
+def _horas(duracion):
+    if duracion is None:  # sin hora de salida todavía
+        return Decimal('0.00')
+    return (Decimal(duracion.total_seconds()) / 3600).quantize(CENTAVOS, ROUND_HALF_UP)
+
+
+def _nombre(username, nombres, apellidos):
+    nombre = f"{nombres} {apellidos}"
+    return nombre if len(nombre.strip()) >= 2 else username
+
+
+# --- HORAS Y PAGO COMO EXPRESIONES (PARA ORDENAR Y SUMAR EN LA BD) ---
+class HorasEntre(Func):
+    """
+    HorasEntre(fin, inicio): horas entre dos TimeField, redondeadas a 2
+    decimales como en el recibo (NULL si falta una).
+    El ORM no sabe pasar un intervalo a número en todas las BDs, así que va
+    el SQL de cada una.
+    """
+    output_field = DecimalField(max_digits=6, decimal_places=2)
+    arity = 2
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="ROUND((julianday(%(expressions)s)) * 24, 2)",
+            arg_joiner=") - julianday(", **extra_context,
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="ROUND((EXTRACT(EPOCH FROM (%(expressions)s)) / 3600)::numeric, 2)",
+            arg_joiner=" - ", **extra_context,
+        )
+
+
+def anotar_jornada(asistencias):
+    """_horas, _tarifa (None sin perfil) y _pago de cada asistencia, calculados en la BD."""
+    return asistencias.annotate(
+        _horas=Coalesce(HorasEntre('hora_salida', 'hora_entrada'), Value(Decimal('0'))),
+        _tarifa=F('usuario__perfil__tarifa_por_hora'),
+    ).annotate(
+        _pago=Round(
+            ExpressionWrapper(F('_horas') * F('_tarifa'), output_field=DecimalField(max_digits=10, decimal_places=2)), 2,
+        ),
+    )
+
+
+def jornadas(asistencias):
+    """Una fila por asistencia con duración y tarifa, ordenadas por colaborador y fecha (1 consulta)."""
+    return asistencias.order_by('usuario__username', 'usuario_id', 'fecha', 'id').annotate(
+        duracion=ExpressionWrapper(F('hora_salida') - F('hora_entrada'), output_field=DurationField()),
+        tarifa=Coalesce(
+            F('usuario__perfil__tarifa_por_hora'), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=6, decimal_places=2),
+        ),
+    ).values_list(
+        'usuario_id', 'usuario__username', 'usuario__first_name', 'usuario__last_name',
+        'fecha', 'hora_entrada', 'hora_salida', 'duracion', 'tarifa',
+    )
+
+
+def calcular_recibos(asistencias):
+    """
+    Recibos de las asistencias dadas, uno por colaborador:
+    {'usuario_id', 'colaborador', 'tarifa', 'dias': [{'fecha', 'entrada',
+    'salida', 'horas', 'pago'}], 'total_horas', 'total_pago'}.
+    """
+    recibos = {}
+    for usuario_id, username, nombres, apellidos, fecha, entrada, salida, duracion, tarifa in jornadas(asistencias):
+        recibo = recibos.get(usuario_id)
+        if recibo is None:
+            recibo = recibos[usuario_id] = {
+                'usuario_id': usuario_id,
+                'colaborador': _nombre(username, nombres, apellidos),
+                'tarifa': tarifa,
+                'dias': [],
+                'total_horas': Decimal('0.00'),
+                'total_pago': Decimal('0.00'),
+            }
+        horas = _horas(duracion)
+        pago = (horas * tarifa).quantize(CENTAVOS, ROUND_HALF_UP)
+        recibo['dias'].append({'fecha': fecha, 'entrada': entrada, 'salida': salida, 'horas': horas, 'pago': pago})
+        recibo['total_horas'] += horas
+        recibo['total_pago'] += pago
+    return list(recibos.values())
+
+
+# --- PERIODOS CERRADOS ---
+@transaction.atomic
+def cerrar_periodo(periodo):
+    """Guarda la foto de los recibos de todas las asistencias del periodo."""
+    recibos = calcular_recibos(Asistencia.objects.filter(fecha__range=(periodo.desde, periodo.hasta)))
+    return ReciboNomina.objects.bulk_create([
+        ReciboNomina(
+            periodo=periodo, usuario_id=recibo['usuario_id'], colaborador=recibo['colaborador'],
+            tarifa=recibo['tarifa'], total_horas=recibo['total_horas'], total_pago=recibo['total_pago'],
+            dias=recibo['dias'],
+        )
+        for recibo in recibos
+    ])
+
+
+def _dia_guardado(dia):
+    # En el JSONField las fechas, horas y montos quedaron como texto
+    return {
+        'fecha': date.fromisoformat(dia['fecha']),
+        'entrada': time.fromisoformat(dia['entrada']) if dia['entrada'] else None,
+        'salida': time.fromisoformat(dia['salida']) if dia['salida'] else None,
+        'horas': Decimal(dia['horas']),
+        'pago': Decimal(dia['pago']),
+    }
+
+
+def recibos_guardados(periodo):
+    """Los recibos del periodo cerrado, con la misma forma que calcular_recibos()."""
+    return [
+        {
+            'usuario_id': recibo.usuario_id,
+            'colaborador': recibo.colaborador,
+            'tarifa': recibo.tarifa,
+            'dias': [_dia_guardado(dia) for dia in recibo.dias],
+            'total_horas': recibo.total_horas,
+            'total_pago': recibo.total_pago,
+        }
+        for recibo in periodo.recibos.order_by('colaborador', 'id')
+    ]
+
+
+def separar_cerradas(asistencias):
+    """
+    (asistencias fuera de periodos cerrados, periodos cerrados que tienen
+    alguna de las asistencias). Lo de periodos cerrados se imprime desde su
+    recibo guardado, no se recalcula.
+    """
+    rango = asistencias.aggregate(desde=Min('fecha'), hasta=Max('fecha'))
+    if rango['desde'] is None:
+        return asistencias, []
+    abiertas, cerrados = asistencias, []
+    for periodo in PeriodoNomina.objects.filter(desde__lte=rango['hasta'], hasta__gte=rango['desde']):
+        if asistencias.filter(fecha__range=(periodo.desde, periodo.hasta)).exists():
+            cerrados.append(periodo)
+            abiertas = abiertas.exclude(fecha__range=(periodo.desde, periodo.hasta))
+    return abiertas, cerrados
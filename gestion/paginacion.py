@@ -0,0 +1,175 @@
+"""
+Paginadores para los changelists del admin con tablas que crecen todo el año.
+"""
+import base64
+import json
+
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def estimar_filas(queryset):
+    """
+    Filas que el planificador de Postgres espera para el queryset (EXPLAIN,
+    sin ejecutarlo), o None en otras bases de datos. Usa las estadísticas
+    de la tabla (ANALYZE/autovacuum), así que es aproximado.
+    """
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with conexion.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class PaginadorEstimado(Paginator):
+    """
+    En Postgres, COUNT(*) recorre todas las filas que calzan con el filtro.
+    Si el planificador estima más de UMBRAL filas usamos esa estimación para
+    el total (la paginación muestra "aprox."); por debajo, el conteo exacto
+    sale barato y se usa ese. En SQLite siempre cuenta exacto.
+    """
+    UMBRAL = 100_000
+
+    @cached_property
+    def count(self):
+        estimado = estimar_filas(self.object_list) if hasattr(self.object_list, 'query') else None
+        self.estimado = estimado is not None and estimado >= self.UMBRAL
+        if self.estimado:
+            return estimado
+        return super().count
+
+
+# --- PAGINACIÓN POR CURSOR (KEYSET) ---
+# Con OFFSET la BD igual lee y descarta todas las filas anteriores: la página
+# 5000 cuesta 5000 veces más que la primera, y si entra una guía nueva todo
+# se corre una fila. Con cursor pedimos "las que vienen después de esta
+# fila" según el orden del admin, que tiene que terminar en un campo único
+# (id) y no tener campos nulos.
+CURSOR_VAR = 'cursor'
+
+
+def _codificar(direccion, valores):
+    datos = json.dumps(valores, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return direccion + base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor, modelo, campos):
+    """'s...' / 'a...' -> ('s'|'a', valores con su tipo), o (None, None) si no hay cursor o está roto."""
+    if not cursor or cursor[0] not in 'sa':
+        return None, None
+    try:
+        datos = base64.urlsafe_b64decode(cursor[1:] + '=' * (-len(cursor[1:]) % 4))
+        valores = json.loads(datos)
+        valores = [
+            modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(campos, valores, strict=True)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        return None, None
+    return cursor[0], valores
+
+
+def despues_de(campos, valores, hacia_atras=False):
+    """
+    Filtro "viene después de (valores) en el orden campos". Ej. para
+    ('-fecha_emision', '-numero_guia', 'id'):
+        fecha < f  OR (fecha = f AND numero < n)  OR (fecha = f AND numero = n AND id > i)
+    más la cota fecha <= f, para que la BD recorra el índice como un rango.
+    """
+    condicion, iguales = Q(), Q()
+    for campo, valor in zip(campos, valores):
+        nombre, descendente = campo.lstrip('-'), campo.startswith('-')
+        if hacia_atras:
+            descendente = not descendente
+        condicion |= iguales & Q(**{f"{nombre}__{'lt' if descendente else 'gt'}": valor})
+        iguales &= Q(**{nombre: valor})
+
+    primero, descendente = campos[0].lstrip('-'), campos[0].startswith('-') != hacia_atras
+    return Q(**{f"{primero}__{'lte' if descendente else 'gte'}": valores[0]}) & condicion
+
+
+def _invertir(campos):
+    return [campo[1:] if campo.startswith('-') else f"-{campo}" for campo in campos]
+
+
+class ChangeListKeyset(ChangeList):
+    """
+    ChangeList que pagina con ?cursor= en vez de ?p= cuando se usa el orden
+    por defecto del admin (ModelAdmin.ordering). Si el usuario ordena por
+    otra columna, o pide "Mostrar todo", vuelve a la paginación normal.
+    Filtros, búsqueda y date_hierarchy se aplican igual (van en el WHERE).
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR, '')
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        parametros = super().get_filters_params(params)
+        parametros.pop(CURSOR_VAR, None)
+        return parametros
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Cambiar un filtro u orden siempre vuelve a la primera página
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        campos = list(self.model_admin.ordering)
+        self.es_keyset = not self.params.get(ORDER_VAR) and not self.show_all
+        if not self.es_keyset:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        result_count = paginator.count
+
+        direccion, valores = _decodificar(self.cursor, self.model, campos)
+        pagina = self.queryset.order_by(*campos)
+        if direccion == 's':
+            pagina = pagina.filter(despues_de(campos, valores))
+        elif direccion == 'a':
+            pagina = pagina.filter(despues_de(campos, valores, hacia_atras=True)).order_by(*_invertir(campos))
+
+        # Una fila de más para saber si hay otra página sin contar nada
+        filas = list(pagina[:self.list_per_page + 1])
+        hay_mas = len(filas) > self.list_per_page
+        filas = filas[:self.list_per_page]
+        if direccion == 'a':
+            filas.reverse()
+
+        def clave(obj):
+            return [getattr(obj, campo.lstrip('-')) for campo in campos]
+
+        hay_siguiente = hay_mas if direccion != 'a' else True
+        hay_anterior = direccion == 's' or (direccion == 'a' and hay_mas)
+        self.url_siguiente = self.get_query_string({CURSOR_VAR: _codificar('s', clave(filas[-1]))}) if filas and hay_siguiente else None
+        self.url_anterior = self.get_query_string({CURSOR_VAR: _codificar('a', clave(filas[0]))}) if filas and hay_anterior else None
+        self.url_primera = self.get_query_string(remove=[CURSOR_VAR]) if hay_anterior else None
+        self.conteo_estimado = getattr(paginator, 'estimado', False)
+
+        self.result_count = result_count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.result_list = filas
+        self.can_show_all = result_count <= self.list_max_show_all
+        self.multi_page = hay_siguiente or hay_anterior
+        self.paginator = paginator
+
+
+class PaginacionKeysetMixin:
+    """Para ModelAdmin cuyo `ordering` termina en un campo único (ver ChangeListKeyset)."""
+    show_full_result_count = False
+    paginator = PaginadorEstimado
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListKeyset
@@ -0,0 +1,315 @@
+"""
+Caché en disco de los PDFs de guías.
+
+El nombre de cada archivo lleva un hash del contenido que se imprime (guía,
+cliente, detalles con su producto, pagos) y del mtime de la plantilla: si
+algo cambia, el hash cambia y el PDF viejo simplemente deja de usarse. Ese
+mismo hash es el ETag, así el navegador no vuelve a bajar un PDF que ya tiene.
+Renderizar con xhtml2pdf es lo más lento del sistema; con esto solo se hace
+una vez por versión de la guía.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from functools import reduce
+from io import BytesIO
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.template.loader import get_template
+from django.utils import timezone
+
+from . import pdf_reportlab
+from .models import Cliente, DetalleGuia, GuiaEntrega, Pago, Producto
+
+PLANTILLA = 'gestion/guia_pdf.html'
+
+
+def _directorio():
+    directorio = str(settings.PDF_CACHE_DIR)
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _ruta(guia_id, version):
+    return os.path.join(_directorio(), f"guia_{guia_id}_{version}.pdf")
+
+
+CAMPOS_VERSION = (
+    'numero_guia', 'fecha_emision', 'direccion_entrega', 'total_venta', 'monto_cobrado', 'estado_pago',
+    'observaciones', 'cliente__nombre_contacto', 'cliente__nombre_empresa',
+)
+
+
+# --- MOTORES DE RENDER ---
+# 'xhtml2pdf': la plantilla HTML de siempre. 'reportlab': el mismo diseño
+# dibujado directo (pdf_reportlab.py), sin parsear HTML/CSS. Se elige con
+# PDF_MOTOR o por petición (?motor=reportlab).
+MOTORES = ('xhtml2pdf', 'reportlab')
+
+
+def motor_elegido(motor=None):
+    return motor if motor in MOTORES else settings.PDF_MOTOR
+
+
+def _fuente(motor):
+    # El archivo que define el diseño: si se edita, cambian todas las versiones
+    if motor == 'reportlab':
+        return pdf_reportlab.__file__
+    return get_template(PLANTILLA).origin.name
+
+
+def _firmar(datos_guia, detalles, pagos, motor):
+    firma = repr((sorted(datos_guia.items()), detalles, pagos, motor, os.path.getmtime(_fuente(motor))))
+    return hashlib.sha256(firma.encode()).hexdigest()[:32]
+
+
+def version_guia(guia_id, motor=None):
+    """Hash de todo lo que sale impreso en la guía (3 consultas, sin renderizar nada)."""
+    guia = GuiaEntrega.objects.filter(pk=guia_id).values(*CAMPOS_VERSION).first()
+    if guia is None:
+        return None
+    detalles = list(DetalleGuia.objects.filter(guia_id=guia_id).order_by('id').values_list(
+        'id', 'producto__nombre', 'cantidad', 'precio_aplicado',
+    ))
+    pagos = list(Pago.objects.filter(guia_id=guia_id).order_by('id').values_list('id', 'fecha', 'monto'))
+    return _firmar(guia, detalles, pagos, motor_elegido(motor))
+
+
+def version_de(guia, motor=None):
+    """Igual que version_guia, pero con una guía que ya trae cliente, detalles y pagos precargados."""
+    datos = {campo: reduce(getattr, campo.split('__'), guia) for campo in CAMPOS_VERSION}
+    detalles = [(d.id, d.producto.nombre, d.cantidad, d.precio_aplicado) for d in guia.detalles.all()]
+    pagos = [(p.id, p.fecha, p.monto) for p in guia.pagos.all()]
+    return _firmar(datos, detalles, pagos, motor_elegido(motor))
+
+
+def _html_guia(guia, detalles):
+    return get_template(PLANTILLA).render({
+        'guia': guia,
+        'detalles': detalles,
+        'saldo_pendiente': guia.total_venta - guia.monto_cobrado,
+    })
+
+
+def html_a_pdf(html):
+    """HTML -> bytes del PDF (None si falla). Sin Django: es lo que corre en los procesos del pool."""
+    from xhtml2pdf import pisa
+
+    salida = BytesIO()
+    if pisa.CreatePDF(html, dest=salida).err:
+        return None
+    return salida.getvalue()
+
+
+def _preparar(guia, detalles, motor):
+    # Lo que viaja al proceso que renderiza: HTML para xhtml2pdf, textos para reportlab
+    if motor == 'reportlab':
+        return pdf_reportlab.datos_guia(guia, detalles)
+    return _html_guia(guia, detalles)
+
+
+CONVERTIR = {
+    'xhtml2pdf': html_a_pdf,
+    'reportlab': pdf_reportlab.dibujar_guia,
+}
+
+
+def renderizar(guia_id, motor=None):
+    """
+    Genera el PDF (bytes) de la guía. Devuelve (pdf, entrada); pdf es None si
+    xhtml2pdf falló y entrada es el HTML que se intentó convertir.
+    """
+    motor = motor_elegido(motor)
+    guia = GuiaEntrega.objects.select_related('cliente').get(pk=guia_id)
+    entrada = _preparar(guia, guia.detalles.select_related('producto'), motor)
+    return CONVERTIR[motor](entrada), entrada
+
+
+def _guardar(guia_id, version, pdf):
+    # Escritura atómica: otro proceso nunca ve un PDF a medias
+    ruta = _ruta(guia_id, version)
+    descriptor, temporal = tempfile.mkstemp(dir=_directorio(), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        archivo.write(pdf)
+    os.replace(temporal, ruta)
+    _borrar_versiones(guia_id, excepto=ruta)
+    return ruta
+
+
+def obtener_pdf(guia_id, version=None, motor=None):
+    """
+    Ruta al PDF cacheado de la versión actual de la guía, renderizándolo si
+    falta. Devuelve (ruta, version), o (None, html) si el render falló.
+    """
+    version = version or version_guia(guia_id, motor)
+    ruta = _ruta(guia_id, version)
+    if os.path.exists(ruta):
+        return ruta, version
+
+    pdf, html = renderizar(guia_id, motor)
+    if pdf is None:
+        return None, html
+    return _guardar(guia_id, version, pdf), version
+
+
+def abrir_pdf(guia_id, version=None, motor=None):
+    """
+    Como obtener_pdf, pero devuelve el archivo ya abierto: (archivo, version)
+    o (None, html). Si una invalidación concurrente borra el PDF entre que se
+    encuentra y se abre, se vuelve a renderizar y se entrega desde memoria.
+    """
+    ruta, version_o_html = obtener_pdf(guia_id, version, motor)
+    if ruta is None:
+        return None, version_o_html
+    try:
+        return open(ruta, 'rb'), version_o_html
+    except FileNotFoundError:
+        pdf, html = renderizar(guia_id, motor)
+        if pdf is None:
+            return None, html
+        return BytesIO(pdf), version_o_html
+
+
+def calentar():
+    """
+    Carga xhtml2pdf/reportlab, compila la plantilla y hace un render de
+    descarte con una guía de mentira (no toca la BD). Así el primer PDF real
+    no paga las importaciones ni el armado de fuentes. Se llama al arrancar
+    cada worker de gunicorn (gunicorn.conf.py) y el worker de reportes.
+    """
+    motor = motor_elegido()
+    guia = GuiaEntrega(
+        numero_guia='000000', fecha_emision=timezone.localdate(), direccion_entrega='-',
+        cliente=Cliente(nombre_contacto='-'),
+    )
+    detalles = [DetalleGuia(producto=Producto(nombre='-'), cantidad=1, precio_aplicado=Decimal('0'))]
+    return CONVERTIR[motor](_preparar(guia, detalles, motor)) is not None
+
+
+# --- VARIAS GUÍAS A LA VEZ (HOJA DE RUTA DEL CHOFER) ---
+def pdfs_lote(guias_ids, procesos=None, progreso=None, motor=None):
+    """
+    PDFs de varias guías, en orden de fecha y número: lista de (guia, bytes).
+    Los datos salen en 3 consultas en total (guías+cliente, detalles+producto,
+    pagos). Las que ya están en la caché se leen del disco; el resto se
+    renderiza repartido en un ProcessPoolExecutor, porque xhtml2pdf usa un
+    solo núcleo y es puro CPU. Las plantillas se llenan aquí; a los procesos
+    solo viaja el HTML (o los textos, con el motor reportlab).
+    """
+    motor = motor_elegido(motor)
+    guias = list(
+        GuiaEntrega.objects.filter(pk__in=guias_ids).select_related('cliente').prefetch_related(
+            Prefetch('detalles', queryset=DetalleGuia.objects.select_related('producto').order_by('id')),
+            Prefetch('pagos', queryset=Pago.objects.order_by('id')),
+        ).order_by('fecha_emision', 'numero_guia', 'id')
+    )
+
+    pdfs = {}
+    pendientes = []
+    for guia in guias:
+        version = version_de(guia, motor)
+        ruta = _ruta(guia.pk, version)
+        try:
+            with open(ruta, 'rb') as archivo:
+                pdfs[guia.pk] = archivo.read()
+        except FileNotFoundError:  # no está en la caché (o se invalidó recién)
+            pendientes.append((guia, version, _preparar(guia, guia.detalles.all(), motor)))
+
+    procesos = procesos or settings.PDF_PROCESOS
+    entradas = [entrada for _, _, entrada in pendientes]
+    convertir = CONVERTIR[motor]
+    if procesos > 1 and len(pendientes) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(pendientes))) as pool:
+            resultados = pool.map(convertir, entradas, chunksize=max(1, len(entradas) // (procesos * 4)))
+            resultados = _con_progreso(resultados, len(entradas), progreso)
+            renderizados = list(resultados)
+    else:
+        renderizados = list(_con_progreso(map(convertir, entradas), len(entradas), progreso))
+
+    for (guia, version, _), pdf in zip(pendientes, renderizados):
+        if pdf is None:
+            raise RuntimeError(f"{motor} no pudo generar la guía {guia.numero_guia}")
+        _guardar(guia.pk, version, pdf)
+        pdfs[guia.pk] = pdf
+    return [(guia, pdfs[guia.pk]) for guia in guias]
+
+
+def _con_progreso(resultados, total, progreso):
+    for hechos, pdf in enumerate(resultados, start=1):
+        if progreso:
+            progreso(hechos / total)
+        yield pdf
+
+
+def unir_pdfs(pdfs):
+    """Un solo PDF con todas las guías, una detrás de otra."""
+    from pypdf import PdfWriter
+
+    escritor = PdfWriter()
+    for _, pdf in pdfs:
+        escritor.append(BytesIO(pdf))
+    salida = BytesIO()
+    escritor.write(salida)
+    return salida.getvalue()
+
+
+def zip_pdfs(pdfs):
+    salida = BytesIO()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+        for guia, pdf in pdfs:
+            archivo_zip.writestr(f"Guia-{guia.numero_guia}.pdf", pdf)
+    return salida.getvalue()
+
+
+def _borrar_versiones(guia_id, excepto=None):
+    for ruta in glob.glob(os.path.join(_directorio(), f"guia_{guia_id}_*.pdf")):
+        if ruta != excepto:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass  # otro proceso ya lo borró
+
+
+def _borrar_versiones_de(guias):
+    # Muchas guías a la vez (pagos en lote, conciliación): un solo listado del
+    # directorio en vez de un glob por guía
+    directorio = _directorio()
+    for nombre in os.listdir(directorio):
+        partes = nombre.split('_', 2)
+        if len(partes) == 3 and partes[0] == 'guia' and partes[1].isdigit() and int(partes[1]) in guias:
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except FileNotFoundError:
+                pass
+
+
+def _invalidar_pendientes():
+    conexion = transaction.get_connection()
+    guias, conexion.pdfs_pendientes = getattr(conexion, 'pdfs_pendientes', set()), set()
+    if len(guias) > 1:
+        _borrar_versiones_de(guias)
+    else:
+        for guia_id in guias:
+            _borrar_versiones(guia_id)
+    if getattr(settings, 'PDF_PRERENDER', False):
+        from .trabajos import encolar_pdf_guias
+        encolar_pdf_guias(guias)
+
+
+def invalidar(guia_id):
+    """
+    Borra los PDFs de la guía al confirmar la transacción (una vez por guía
+    aunque se guarden muchos detalles). Con PDF_PRERENDER activo además deja
+    encolado el nuevo render para el worker de reportes.
+    """
+    conexion = transaction.get_connection()
+    if not hasattr(conexion, 'pdfs_pendientes'):
+        conexion.pdfs_pendientes = set()
+    conexion.pdfs_pendientes.add(guia_id)
+    transaction.on_commit(_invalidar_pendientes, robust=True)
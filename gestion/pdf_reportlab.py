@@ -0,0 +1,166 @@
+"""
+Motor alternativo para la guía de entrega: dibuja el mismo diseño de
+gestion/guia_pdf.html directamente con reportlab (platypus), sin pasar por
+HTML/CSS. La guía tiene un diseño fijo (cabecera, cliente, detalle, totales),
+así que no hace falta el parser de xhtml2pdf en cada render.
+
+Recibe los datos ya formateados (ver datos_guia) para que el render no toque
+Django ni la BD y pueda correr en los procesos del pool de pdf_guias.
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.template.defaultfilters import date as formato_fecha, floatformat
+from django.utils.formats import localize
+
+AZUL = '#2c3e50'
+ROJO = '#e74c3c'
+GRIS_BORDE = '#dddddd'
+
+
+def datos_guia(guia, detalles):
+    """Lo que sale impreso, como textos (mismos filtros que la plantilla HTML)."""
+    return {
+        'numero_guia': guia.numero_guia,
+        'fecha': formato_fecha(guia.fecha_emision, "d/m/Y"),
+        'cliente': guia.cliente.nombre_contacto,
+        'empresa': guia.cliente.nombre_empresa or "-",
+        'direccion': guia.direccion_entrega,
+        'lineas': [
+            (localize(d.cantidad), d.producto.nombre, floatformat(d.precio_aplicado, 2), floatformat(d.total_linea, 2))
+            for d in detalles
+        ],
+        'total_venta': floatformat(guia.total_venta, 2),
+    }
+
+
+def dibujar_guia(datos):
+    """Datos de datos_guia() -> bytes del PDF (A4 vertical, márgenes de 2 cm como la plantilla)."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    azul, rojo, gris = colors.HexColor(AZUL), colors.HexColor(ROJO), colors.HexColor(GRIS_BORDE)
+    base = ParagraphStyle('base', fontName='Helvetica', fontSize=10, leading=14, textColor=colors.HexColor('#333333'))
+
+    def estilo(padre=base, **cambios):
+        return ParagraphStyle('x', parent=padre, **cambios)
+
+    def p(texto, **cambios):
+        return Paragraph(texto, estilo(**cambios) if cambios else base)
+
+    salida = BytesIO()
+    doc = SimpleDocTemplate(
+        salida, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm,
+        title="Guía de Entrega",
+    )
+    ancho = doc.width
+    historia = []
+
+    # --- CABECERA ---
+    empresa = [
+        p("Creaciones M&amp;M", fontName='Helvetica-Bold', fontSize=18, leading=22, textColor=azul),
+        p("Fabricación de Material Didáctico<br/>Carabayllo, Lima, Perú", fontSize=9, leading=12, textColor=colors.HexColor('#555555'), spaceBefore=5),
+        p("Cel: 977 167 119 / 906 196 891", fontSize=9, leading=12, textColor=colors.HexColor('#555555'), spaceBefore=5),
+    ]
+    documento = [
+        p("GUÍA DE ENTREGA", fontName='Helvetica-Bold', fontSize=14, leading=18, textColor=azul, alignment=TA_RIGHT),
+        p(f"N° {escape(datos['numero_guia'])}", fontName='Helvetica-Bold', fontSize=16, leading=20, textColor=rojo, alignment=TA_RIGHT, spaceBefore=5),
+        p(escape(datos['fecha']), fontName='Helvetica-Bold', alignment=TA_RIGHT, spaceBefore=10),
+    ]
+    cabecera = Table([[empresa, documento]], colWidths=[ancho * 0.6, ancho * 0.4])
+    cabecera.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LINEBELOW', (0, 0), (-1, -1), 2, azul),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+    ]))
+    historia += [cabecera, Spacer(1, 30)]
+
+    # --- CAJA DEL CLIENTE ---
+    etiqueta = estilo(fontName='Helvetica-Bold', textColor=azul)
+    cliente = Table([
+        [Paragraph("CLIENTE:", etiqueta), p(escape(datos['cliente']))],
+        [Paragraph("EMPRESA:", etiqueta), p(escape(datos['empresa']))],
+        [Paragraph("DIRECCIÓN:", etiqueta), p(escape(datos['direccion']))],
+    ], colWidths=[90 + 15, ancho - 105])
+    cliente.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9f9f9')),
+        ('BOX', (0, 0), (-1, -1), 1, gris),
+        ('LEFTPADDING', (0, 0), (0, -1), 15),
+        ('TOPPADDING', (0, 0), (-1, 0), 15),
+        ('BOTTOMPADDING', (0, -1), (-1, -1), 15),
+        ('BOTTOMPADDING', (0, 0), (-1, -2), 5),
+        ('TOPPADDING', (0, 1), (-1, -1), 0),
+    ]))
+    historia += [cliente, Spacer(1, 30)]
+
+    # --- DETALLE ---
+    cabeza = estilo(fontName='Helvetica-Bold', fontSize=9, textColor=colors.white, alignment=TA_CENTER)
+    filas = [[
+        Paragraph("CANT.", cabeza), Paragraph("DESCRIPCIÓN", estilo(cabeza, alignment=0)),
+        Paragraph("P. UNIT", cabeza), Paragraph("TOTAL", cabeza),
+    ]]
+    for cantidad, nombre, precio, total in datos['lineas']:
+        filas.append([
+            p(escape(cantidad), alignment=TA_CENTER),
+            p(escape(nombre)),
+            p(f"S/. {precio}", alignment=TA_RIGHT),
+            p(f"<b>S/. {total}</b>", alignment=TA_RIGHT),
+        ])
+    estilo_detalle = [
+        ('BACKGROUND', (0, 0), (-1, 0), azul),
+        ('BOX', (0, 0), (-1, 0), 1, azul),
+        ('GRID', (0, 1), (-1, -1), 1, gris),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ]
+    alturas = [None] * len(filas)
+    if len(datos['lineas']) < 5:
+        # Fila vacía de relleno, igual que la plantilla
+        filas.append(['', '', '', ''])
+        alturas.append(30)
+        estilo_detalle.append(('SPAN', (0, -1), (-1, -1)))
+    detalle = Table(filas, colWidths=[ancho * 0.1, ancho * 0.5, ancho * 0.2, ancho * 0.2], rowHeights=alturas)
+    detalle.setStyle(TableStyle(estilo_detalle))
+    historia += [detalle, Spacer(1, 30 + 20)]
+
+    # --- BANCOS Y TOTAL ---
+    bancos = [
+        p("<b>MÉTODOS DE PAGO:</b><br/>Transferencias a nombre de la empresa.", fontSize=9, leading=12, textColor=colors.HexColor('#555555')),
+        p("Cuentas: BCP / YAPE / PLIN", fontSize=9, leading=12, textColor=colors.HexColor('#555555'), spaceBefore=5),
+        p("* No hay devoluciones una vez retirada la mercadería.", fontSize=8, leading=10, textColor=colors.HexColor('#555555'), spaceBefore=5),
+    ]
+    grande = dict(fontName='Helvetica-Bold', fontSize=14, leading=18, alignment=TA_RIGHT)
+    totales = Table(
+        [[p("VENTA TOTAL:", textColor=azul, **grande), p(f"S/. {datos['total_venta']}", textColor=colors.black, **grande)]],
+        colWidths=[ancho * 0.4 * 0.55, ancho * 0.4 * 0.45],
+    )
+    totales.setStyle(TableStyle([
+        ('LINEBELOW', (1, 0), (1, 0), 1, gris),
+        ('LEFTPADDING', (0, 0), (-1, -1), 5),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ]))
+    inferior = Table([[bancos, '', totales]], colWidths=[ancho * 0.55, ancho * 0.05, ancho * 0.4])
+    inferior.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+    ]))
+    historia += [inferior, Spacer(1, 50)]
+
+    # --- PIE ---
+    historia.append(p(
+        '"NUESTRO MOTIVO ERES TÚ..... ¡Gracias por tu Preferencia!"',
+        fontName='Helvetica-BoldOblique', fontSize=11, textColor=rojo, alignment=TA_CENTER,
+    ))
+
+    doc.build(historia)
+    return salida.getvalue()
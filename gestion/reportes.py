@@ -0,0 +1,445 @@
+"""
+Cálculos de reportes reutilizables (dashboard, Excel, reportes gerenciales).
+Todo se resuelve en la base de datos con agregados condicionales para que el
+costo no crezca con el historial que se recorre en Python. Los totales por
+rango de fechas salen de los resúmenes diarios (ResumenDiario y compañía).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Min, Q, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Lag, Rank
+
+from .models import Gasto, GuiaEntrega, ResumenDiario, ResumenAsesorDiario, ResumenGastoDiario
+
+CERO = Decimal('0.00')
+
+
+def _suma(expresion, filtro=None):
+    return Coalesce(
+        Sum(expresion, filter=filtro),
+        CERO, output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+# --- KPIs DEL DASHBOARD ---
+def calcular_kpis(fecha_inicio, fecha_fin):
+    """
+    Indicadores del rango [fecha_inicio, fecha_fin] en 2 consultas: una sobre
+    ResumenDiario (ventas, cobrado y gastos) y otra sobre las guías impagas
+    (deuda en la calle, que no depende del rango).
+    """
+    totales = ResumenDiario.objects.filter(fecha__range=[fecha_inicio, fecha_fin]).aggregate(
+        total_ventas=_suma('total_ventas'),
+        total_cobrado=_suma('total_cobrado'),
+        total_gastos=_suma('total_gastos'),
+    )
+    deuda = GuiaEntrega.objects.exclude(estado_pago='PAGADO').aggregate(
+        deuda_calle=_suma(F('total_venta') - F('monto_cobrado')),
+    )
+
+    return {
+        **totales,
+        **deuda,
+        'ganancia_neta': totales['total_ventas'] - totales['total_gastos'],
+    }
+
+
+# --- RENDIMIENTO DE ASESORES (PERIODO ACTUAL VS ANTERIOR) ---
+def periodo_anterior(fecha_inicio, fecha_fin):
+    """El rango de la misma cantidad de días justo antes de [fecha_inicio, fecha_fin]."""
+    dias = (fecha_fin - fecha_inicio).days + 1
+    return fecha_inicio - timedelta(days=dias), fecha_inicio - timedelta(days=1)
+
+
+def rendimiento_asesores(fecha_inicio, fecha_fin):
+    """
+    Guías, vendido, cobrado, ticket promedio y puesto de cada asesor en el
+    rango (fechas date), con la variación contra el periodo anterior de igual
+    duración.
+
+    Es una sola consulta sobre ResumenAsesorDiario: se agrupa por (asesor,
+    periodo) y las funciones de ventana ponen el puesto dentro de cada periodo
+    (RANK) y traen lo del periodo anterior del mismo asesor (LAG). Devuelve
+    los asesores con ventas en el rango, ordenados por puesto.
+    """
+    anterior_inicio, _ = periodo_anterior(fecha_inicio, fecha_fin)
+    mismo_asesor = {'partition_by': [F('asesor_id')], 'order_by': F('periodo').asc()}
+    filas = ResumenAsesorDiario.objects.filter(fecha__range=[anterior_inicio, fecha_fin]).values(
+        'asesor_id', 'asesor__username', 'asesor__first_name', 'asesor__last_name',
+        periodo=Case(When(fecha__lt=fecha_inicio, then=Value(0)), default=Value(1)),
+    ).annotate(
+        cantidad=Sum('cantidad_guias'),
+        total=_suma('total_ventas'),
+        cobrado=_suma('total_cobrado'),
+    ).annotate(
+        puesto=Window(Rank(), partition_by=[F('periodo')], order_by=F('total').desc()),
+        # Cada asesor tiene a lo más 2 filas (anterior, actual): LAG en la actual es la anterior
+        cantidad_anterior=Window(Lag('cantidad'), **mismo_asesor),
+        total_anterior=Window(Lag('total'), **mismo_asesor),
+    ).order_by('periodo', 'puesto', 'asesor__username')
+
+    puestos_anteriores, reporte = {}, []
+    for fila in filas:
+        if fila['periodo'] == 0:
+            puestos_anteriores[fila['asesor_id']] = fila['puesto']
+            continue
+        nombre = f"{fila['asesor__first_name']} {fila['asesor__last_name']}".strip()
+        total, anterior = fila['total'], fila['total_anterior']
+        reporte.append({
+            'asesor_id': fila['asesor_id'],
+            'asesor': nombre or fila['asesor__username'] or 'Sin asesor',
+            'cantidad': fila['cantidad'],
+            'total': total,
+            'cobrado': fila['cobrado'],
+            'ticket_promedio': (total / fila['cantidad']).quantize(CERO) if fila['cantidad'] else CERO,
+            'puesto': fila['puesto'],
+            'puesto_anterior': puestos_anteriores.get(fila['asesor_id']),
+            'cantidad_anterior': fila['cantidad_anterior'] or 0,
+            'total_anterior': anterior or CERO,
+            'variacion': total - (anterior or CERO),
+            'variacion_pct': ((total - anterior) * 100 / anterior).quantize(Decimal('0.1')) if anterior else None,
+        })
+    return reporte
+
+
+# --- ANTIGÜEDAD DE CUENTAS POR COBRAR ---
+# (campo, título, desde, hasta) en días desde la emisión de la guía
+TRAMOS_ANTIGUEDAD = (
+    ('tramo_0_30', '0 a 30 días', 0, 30),
+    ('tramo_31_60', '31 a 60 días', 31, 60),
+    ('tramo_61_90', '61 a 90 días', 61, 90),
+    ('tramo_mas_90', 'Más de 90 días', 91, None),
+)
+
+
+def _saldo():
+    return ExpressionWrapper(F('total_venta') - F('monto_cobrado'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def guias_con_saldo():
+    """
+    Guías no pagadas con saldo (las de total 0 no cuentan). Todo lo que se
+    lee de ellas está en el índice parcial guia_abierta_cliente_idx, así que
+    la BD no toca la tabla.
+    """
+    return GuiaEntrega.objects.exclude(estado_pago='PAGADO').filter(total_venta__gt=F('monto_cobrado'))
+
+
+def rango_tramo(fecha_corte, desde, hasta):
+    """(fecha_emision desde, hasta) de un tramo; None = sin límite. Las guías con fecha futura van al primero."""
+    return (
+        fecha_corte - timedelta(days=hasta) if hasta is not None else None,
+        fecha_corte - timedelta(days=desde) if desde else None,
+    )
+
+
+def _sumas_por_tramo(fecha_corte):
+    # Un SUM(CASE WHEN fecha_emision en el tramo THEN saldo ELSE 0 END) por tramo
+    sumas = {}
+    for campo, _, desde, hasta in TRAMOS_ANTIGUEDAD:
+        inicio, fin = rango_tramo(fecha_corte, desde, hasta)
+        condicion = Q()
+        if inicio is not None:
+            condicion &= Q(fecha_emision__gte=inicio)
+        if fin is not None:
+            condicion &= Q(fecha_emision__lte=fin)
+        sumas[campo] = _suma(Case(When(condicion, then=_saldo()), default=Value(CERO)))
+    return sumas
+
+
+def cartera_por_cobrar(fecha_corte):
+    """Saldo de toda la cartera por tramo, total, guías y clientes con deuda (1 consulta, sin GROUP BY)."""
+    return guias_con_saldo().aggregate(
+        **_sumas_por_tramo(fecha_corte),
+        total=_suma(_saldo()),
+        guias=Count('id'),
+        clientes=Count('cliente_id', distinct=True),
+    )
+
+
+def deudores():
+    """cliente_id y saldo de cada cliente con deuda, de mayor a menor (para paginar)."""
+    return guias_con_saldo().values('cliente_id').annotate(total=Sum(_saldo())).order_by('-total', 'cliente_id')
+
+
+def antiguedad_por_cobrar(fecha_corte, clientes=None):
+    """
+    Saldo pendiente de cada cliente repartido en TRAMOS_ANTIGUEDAD según los
+    días de cada guía a la fecha de corte, más total, guías abiertas y la
+    más antigua. Una sola consulta agrupada por cliente con los SUM(CASE ...)
+    de cada tramo; `clientes` (ids) la limita a esos, p. ej. una página.
+    Ordenado de mayor a menor deuda.
+    """
+    guias = guias_con_saldo()
+    if clientes is not None:
+        guias = guias.filter(cliente_id__in=clientes)
+    return guias.values(
+        'cliente_id', 'cliente__nombre_contacto', 'cliente__nombre_empresa', 'cliente__celular',
+    ).annotate(
+        **_sumas_por_tramo(fecha_corte),
+        total=_suma(_saldo()),
+        guias=Count('id'),
+        mas_antigua=Min('fecha_emision'),
+    ).order_by('-total', 'cliente_id')
+
+
+# --- CUENTAS POR PAGAR (GASTOS PENDIENTES POR VENCIMIENTO) ---
+# (campo, título) de cada plazo; el mismo criterio que Gasto.esta_vencido()
+PLAZOS_POR_PAGAR = (
+    ('vencido', '⛔ Vencido'),
+    ('esta_semana', 'Vence esta semana'),
+    ('mas_adelante', 'Vence más adelante'),
+    ('sin_fecha', 'Sin fecha límite'),
+)
+DIAS_SEMANA = 7
+
+
+def condicion_plazo(plazo, hoy):
+    """Q de los gastos pendientes que caen en el plazo a la fecha `hoy`."""
+    fin_semana = hoy + timedelta(days=DIAS_SEMANA - 1)
+    return {
+        'vencido': Q(fecha_vencimiento__lt=hoy),
+        'esta_semana': Q(fecha_vencimiento__range=(hoy, fin_semana)),
+        'mas_adelante': Q(fecha_vencimiento__gt=fin_semana),
+        'sin_fecha': Q(fecha_vencimiento__isnull=True),
+    }[plazo]
+
+
+def gastos_por_pagar():
+    """Gastos pendientes; todo lo que se lee de ellos está en el índice parcial gasto_pendiente_venc_idx."""
+    return Gasto.objects.filter(estado='PENDIENTE')
+
+
+def _sumas_por_plazo(hoy):
+    return {
+        campo: _suma(Case(When(condicion_plazo(campo, hoy), then='monto'), default=Value(CERO)))
+        for campo, _ in PLAZOS_POR_PAGAR
+    }
+
+
+def por_pagar(hoy, agrupar_por=None):
+    """
+    Deuda pendiente repartida en PLAZOS_POR_PAGAR, más total y cantidad de
+    gastos. Sin `agrupar_por` es un solo dict con toda la deuda; con campos
+    (p. ej. 'proveedor_id', 'categoria') es una fila por grupo, de mayor a
+    menor vencido. Siempre una sola consulta.
+    """
+    sumas = dict(_sumas_por_plazo(hoy), total=_suma('monto'), gastos=Count('id'))
+    if agrupar_por is None:
+        return gastos_por_pagar().aggregate(**sumas)
+    return gastos_por_pagar().values(*agrupar_por).annotate(**sumas).order_by('-vencido', '-total', *agrupar_por)
+
+
+def resumen_por_pagar(hoy, proveedores=5):
+    """Totales, desglose por categoría y los `proveedores` con más deuda vencida (3 consultas)."""
+    etiquetas = dict(Gasto.CATEGORIAS)
+    categorias = list(por_pagar(hoy, ['categoria']))
+    for fila in categorias:
+        fila['categoria_nombre'] = etiquetas.get(fila['categoria'], fila['categoria'])
+    return {
+        'totales': por_pagar(hoy),
+        'categorias': categorias,
+        'proveedores': list(por_pagar(hoy, ['proveedor_id', 'proveedor__razon_social'])[:proveedores]),
+    }
+
+
+def gastos_por_categoria(fecha_inicio, fecha_fin):
+    """Total de gastos por categoría, desde ResumenGastoDiario."""
+    return dict(
+        ResumenGastoDiario.objects.filter(fecha__range=[fecha_inicio, fecha_fin])
+        .order_by().values('categoria').annotate(total=_suma('total'))
+        .values_list('categoria', 'total')
+    )
+
+
+# --- VERIFICACIÓN DE LOS RESÚMENES CONTRA LAS TABLAS REALES ---
+def verificar_resumenes(fecha_inicio, fecha_fin):
+    """
+    Compara los resúmenes del rango (por día, por asesor y por categoría de
+    gasto) con lo que dicen GuiaEntrega y Gasto.
+    Devuelve una lista de (fecha, campo, valor_real, valor_resumen); vacía = todo cuadra.
+    """
+    rango = [fecha_inicio, fecha_fin]
+    reales, resumenes = {}, {}
+
+    def fila(destino, clave, **valores):
+        destino.setdefault(clave, {'total_ventas': CERO, 'total_cobrado': CERO, 'cantidad_guias': 0}).update(valores)
+
+    # Por asesor se suma en Python: si se borró un usuario puede haber varias filas (fecha, NULL)
+    for guia in GuiaEntrega.objects.filter(fecha_emision__range=rango).order_by().values(
+        'fecha_emision', 'asesor_id'
+    ).annotate(v=_suma('total_venta'), c=_suma('monto_cobrado'), n=Count('id')):
+        fila(reales, (guia['fecha_emision'], 'asesor', guia['asesor_id']),
+             total_ventas=guia['v'], total_cobrado=guia['c'], cantidad_guias=guia['n'])
+    for resumen in ResumenAsesorDiario.objects.filter(fecha__range=rango).order_by().values(
+        'fecha', 'asesor_id'
+    ).annotate(v=_suma('total_ventas'), c=_suma('total_cobrado'), n=Sum('cantidad_guias')):
+        fila(resumenes, (resumen['fecha'], 'asesor', resumen['asesor_id']),
+             total_ventas=resumen['v'], total_cobrado=resumen['c'], cantidad_guias=resumen['n'])
+
+    for gasto in Gasto.objects.filter(fecha_emision__range=rango).order_by().values(
+        'fecha_emision', 'categoria'
+    ).annotate(t=_suma('monto')):
+        reales[(gasto['fecha_emision'], 'gasto', gasto['categoria'])] = {'total': gasto['t']}
+    for resumen in ResumenGastoDiario.objects.filter(fecha__range=rango).values('fecha', 'categoria', 'total'):
+        resumenes[(resumen['fecha'], 'gasto', resumen['categoria'])] = {'total': resumen['total']}
+
+    # La fila del día es la suma de su detalle
+    for (fecha, tipo, _), valores in list(reales.items()):
+        dia = reales.setdefault((fecha, 'dia', None), {
+            'total_ventas': CERO, 'total_cobrado': CERO, 'cantidad_guias': 0, 'total_gastos': CERO,
+        })
+        if tipo == 'gasto':
+            dia['total_gastos'] += valores['total']
+        else:
+            for campo, valor in valores.items():
+                dia[campo] += valor
+    for resumen in ResumenDiario.objects.filter(fecha__range=rango).values(
+        'fecha', 'total_ventas', 'total_cobrado', 'cantidad_guias', 'total_gastos',
+    ):
+        resumenes[(resumen.pop('fecha'), 'dia', None)] = resumen
+
+    diferencias = []
+    orden = {'dia': 0, 'asesor': 1, 'gasto': 2}
+    for clave in sorted(set(reales) | set(resumenes), key=lambda c: (c[0], orden[c[1]], str(c[2]))):
+        fecha, tipo, detalle = clave
+        real, resumen = reales.get(clave, {}), resumenes.get(clave, {})
+        for campo in real or resumen:
+            valor_real, valor_resumen = real.get(campo, 0), resumen.get(campo)
+            if (valor_resumen or 0) != valor_real:
+                nombre = campo if tipo == 'dia' else f"{tipo} {detalle}: {campo}"
+                diferencias.append((fecha, nombre, valor_real, valor_resumen))
+    return diferencias
+
+
+# --- EXPORTACIÓN A EXCEL (MEMORIA CONSTANTE) ---
+FILAS_POR_LOTE = 2000
+
+
+def escribir_excel_reporte(fecha_inicio, fecha_fin, destino, progreso=None):
+    """
+    Escribe el Excel de ventas y gastos del rango en `destino` (ruta o archivo).
+    Usa hojas write-only de openpyxl (cada fila va directo a disco) y lee la
+    BD por lotes con .iterator(), así la memoria no crece con la cantidad de filas.
+    Si se pasa `progreso`, se le llama con la fracción avanzada (0 a 1) por cada lote.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    ventas = GuiaEntrega.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin]).select_related('cliente').only(
+        'fecha_emision', 'numero_guia', 'estado_pago', 'total_venta', 'cliente__nombre_contacto',
+    ).order_by('fecha_emision', 'id')
+    gastos = Gasto.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin]).select_related('proveedor').only(
+        'fecha_emision', 'descripcion', 'categoria', 'estado', 'monto', 'proveedor__razon_social',
+    ).order_by('fecha_emision', 'id')
+
+    total_filas = (ventas.count() + gastos.count()) if progreso else 0
+    escritas = 0
+
+    def avanzar():
+        nonlocal escritas
+        escritas += 1
+        if progreso and escritas % FILAS_POR_LOTE == 0:
+            progreso(escritas / total_filas)
+
+    wb = Workbook(write_only=True)
+    header_font = Font(bold=True, color="FFFFFF")
+
+    def celda(ws, valor, **estilo):
+        c = WriteOnlyCell(ws, value=valor)
+        for atributo, v in estilo.items():
+            setattr(c, atributo, v)
+        return c
+
+    # --- HOJA 1: RESUMEN Y VENTAS ---
+    ws = wb.create_sheet("Reporte Ventas")
+    header_fill = PatternFill(start_color="2c3e50", end_color="2c3e50", fill_type="solid")
+
+    ws.append([celda(ws, f"REPORTE DE MOVIMIENTOS: {fecha_inicio} al {fecha_fin}", font=Font(bold=True, size=14))])
+    ws.merged_cells.add('A1:E1')
+    ws.append([])
+    ws.append([celda(ws, h, fill=header_fill, font=header_font) for h in ["Fecha", "Guía N°", "Cliente", "Estado", "Total (S/.)"]])
+
+    total_ventas = 0
+    for v in ventas.iterator(chunk_size=FILAS_POR_LOTE):
+        ws.append([
+            v.fecha_emision,
+            v.numero_guia,
+            v.cliente.nombre_contacto,
+            v.get_estado_pago_display(),
+            v.total_venta
+        ])
+        total_ventas += v.total_venta
+        avanzar()
+
+    ws.append(["", "", "", "TOTAL VENTAS:", celda(ws, total_ventas, font=Font(bold=True))])
+
+    # --- HOJA 2: GASTOS ---
+    ws2 = wb.create_sheet("Gastos")
+    ws2.append([celda(ws2, "DETALLE DE GASTOS Y COMPRAS", font=Font(bold=True, size=14))])
+    ws2.append([])
+    gastos_fill = PatternFill(start_color="c0392b", end_color="c0392b", fill_type="solid")
+    ws2.append([celda(ws2, h, fill=gastos_fill, font=header_font) for h in ["Fecha", "Proveedor", "Descripción", "Categoría", "Estado", "Monto (S/.)"]])
+
+    total_gastos = 0
+    for g in gastos.iterator(chunk_size=FILAS_POR_LOTE):
+        ws2.append([
+            g.fecha_emision,
+            g.proveedor.razon_social,
+            g.descripcion,
+            g.get_categoria_display(),
+            g.get_estado_display(),
+            g.monto
+        ])
+        avanzar()
+        total_gastos += g.monto
+
+    ws2.append(["", "", "", "", "TOTAL GASTOS:", celda(ws2, total_gastos, font=Font(bold=True))])
+
+    wb.save(destino)
+
+
+def escribir_excel_antiguedad(fecha_corte, destino, progreso=None):
+    """
+    Excel de antigüedad de cuentas por cobrar de todos los clientes (hoja
+    write-only, como escribir_excel_reporte, y con el mismo `progreso`).
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Por cobrar")
+
+    def celda(valor, **estilo):
+        c = WriteOnlyCell(ws, value=valor)
+        for atributo, v in estilo.items():
+            setattr(c, atributo, v)
+        return c
+
+    campos = [t[0] for t in TRAMOS_ANTIGUEDAD] + ['total']
+    ws.append([celda(f"CUENTAS POR COBRAR AL {fecha_corte:%d/%m/%Y}", font=Font(bold=True, size=14))])
+    ws.append([])
+    relleno = PatternFill(start_color="2c3e50", end_color="2c3e50", fill_type="solid")
+    ws.append([
+        celda(h, font=Font(bold=True, color="FFFFFF"), fill=relleno)
+        for h in ("Cliente", "Empresa", "Celular", "Guías", "Más antigua", *(t[1] for t in TRAMOS_ANTIGUEDAD), "Total (S/.)")
+    ])
+
+    filas = antiguedad_por_cobrar(fecha_corte)
+    total_filas = filas.count() if progreso else 0
+    totales = dict.fromkeys(campos, CERO)
+    for escritas, fila in enumerate(filas.iterator(chunk_size=FILAS_POR_LOTE), start=1):
+        if progreso and escritas % FILAS_POR_LOTE == 0:
+            progreso(escritas / total_filas)
+        ws.append([
+            fila['cliente__nombre_contacto'], fila['cliente__nombre_empresa'], fila['cliente__celular'],
+            fila['guias'], fila['mas_antigua'], *(fila[c] for c in campos),
+        ])
+        for campo in campos:
+            totales[campo] += fila[campo]
+
+    ws.append(["", "", "", "", celda("TOTALES:", font=Font(bold=True)), *(celda(v, font=Font(bold=True)) for v in totales.values())])
+    wb.save(destino)
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidar
+from .models import Cliente, DetalleGuia, Gasto, GuiaEntrega, Pago, Producto, Proveedor
+from . import busqueda, pdf_guias
+
+
+# Cualquier cambio en estos modelos deja obsoletos los reportes cacheados
+@receiver([post_save, post_delete], sender=GuiaEntrega)
+@receiver([post_save, post_delete], sender=Pago)
+@receiver([post_save, post_delete], sender=DetalleGuia)
+@receiver([post_save, post_delete], sender=Gasto)
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_reportes(sender, **kwargs):
+    invalidar()
+
+
+# El PDF cacheado de la guía ya no corresponde (ver pdf_guias.py)
+@receiver([post_save, post_delete], sender=GuiaEntrega)
+def invalidar_pdf_guia(sender, instance, **kwargs):
+    pdf_guias.invalidar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Pago)
+@receiver([post_save, post_delete], sender=DetalleGuia)
+def invalidar_pdf_por_linea(sender, instance, **kwargs):
+    pdf_guias.invalidar(instance.guia_id)
+
+
+# Tablas FTS de la búsqueda del admin (solo SQLite, ver busqueda.py)
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_save, sender=GuiaEntrega)
+@receiver(post_save, sender=Gasto)
+def indexar_busqueda(sender, instance, update_fields=None, **kwargs):
+    busqueda.indexar(instance, update_fields)
+
+
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Proveedor)
+@receiver(post_delete, sender=GuiaEntrega)
+@receiver(post_delete, sender=Gasto)
+def desindexar_busqueda(sender, instance, using, **kwargs):
+    busqueda.desindexar(instance, using)
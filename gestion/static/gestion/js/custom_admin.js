@@ -1,6 +1,11 @@
 /* gestion/static/gestion/js/custom_admin.js */
 
 document.addEventListener("DOMContentLoaded", function () {
+    // En el formulario de guías el archivo viene dos veces (custom_js de Jazzmin
+    // y Media de GuiaEntregaAdmin): sin esto todo se conectaba y pedía doble.
+    if (window.mymAdminCargado) return;
+    window.mymAdminCargado = true;
+
     const $ = django.jQuery; // Usamos el jQuery de Django para asegurar compatibilidad
 
     // =======================================================
@@ -59,14 +64,16 @@ document.addEventListener("DOMContentLoaded", function () {
         selectCliente.on('change', function() {
             let clienteId = $(this).val();
             if (clienteId) {
-                // Usamos la ruta /api/ definida en urls.py
+                // API en lote (/api/info/), la misma que usan los productos
                 $.ajax({
-                    url: `/api/cliente/${clienteId}/`, 
+                    url: '/api/info/',
+                    data: { clientes: clienteId },
                     type: 'GET',
                     success: function(data) {
-                        if (data.direccion) {
+                        let cliente = data.clientes[clienteId];
+                        if (cliente && cliente.direccion) {
                             // Rellenamos el campo si está vacío o si el usuario cambia de cliente
-                            inputDireccion.val(data.direccion);
+                            inputDireccion.val(cliente.direccion);
                         }
                     },
                     error: function(xhr) {
@@ -77,12 +84,45 @@ document.addEventListener("DOMContentLoaded", function () {
         });
     }
 
-    // --- B. FUNCIÓN PARA CALCULAR EL TOTAL EN TIEMPO REAL ---
+    // --- B. PRECIOS: UN SOLO CATÁLOGO POR FORMULARIO ---
+    // /api/catalogo/productos/ trae todos los precios de una vez y lleva ETag:
+    // el navegador lo guarda y al abrir otra guía solo recibe un 304 vacío.
+    // Antes era una petición /api/producto/<id>/ por cada fila.
+    // (Las filas del inline tienen la clase "dynamic-detalles": related_name='detalles')
+    const FILAS_DETALLE = '.dynamic-detalles';
+    let catalogoPrecios = null;
+
+    function cargarCatalogo() {
+        return $.ajax({ url: '/api/catalogo/productos/', type: 'GET' }).then(function(data) {
+            catalogoPrecios = data.precios;
+        });
+    }
+
+    // Precio de un producto: del catálogo, o de /api/info/ si es un producto
+    // creado después de cargar la página (y de paso se suma al catálogo)
+    function conPrecio(productoId, callback) {
+        if (catalogoPrecios && productoId in catalogoPrecios) {
+            callback(catalogoPrecios[productoId]);
+            return;
+        }
+        $.ajax({
+            url: '/api/info/',
+            data: { productos: productoId },
+            success: function(data) {
+                let producto = data.productos[productoId];
+                let precio = producto ? producto.precio : 0;
+                if (catalogoPrecios) catalogoPrecios[productoId] = precio;
+                callback(precio);
+            }
+        });
+    }
+
+    // --- C. FUNCIÓN PARA CALCULAR EL TOTAL EN TIEMPO REAL ---
     function calcularTotalGeneral() {
         let totalAcumulado = 0;
 
         // Recorremos todas las filas visibles de detalles (productos)
-        $('.dynamic-detalleguia_set').each(function() {
+        $(FILAS_DETALLE).each(function() {
             const fila = $(this);
             
             // Si la fila está marcada para borrar, no la sumamos
@@ -107,27 +147,22 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     }
 
-    // --- C. ASIGNAR LOGICA A CADA FILA (PRECIO + LISTENERS) ---
+    // --- D. ASIGNAR LOGICA A CADA FILA (PRECIO + LISTENERS) ---
     function conectarEventosFila(fila) {
         let selectProducto = fila.find('select[name$="-producto"]');
         let inputCantidad = fila.find('input[name$="-cantidad"]');
         let deleteBox = fila.find('input[name$="-DELETE"]');
         
-        // 1. Cuando cambia el producto -> Traer Precio de la API
+        // 1. Cuando cambia el producto -> Precio del catálogo
         selectProducto.on('change', function() {
             let productoId = $(this).val();
             if (productoId) {
-                $.ajax({
-                    url: `/api/producto/${productoId}/`,
-                    success: function(data) {
-                        let precio = data.precio || 0;
-                        
-                        // Guardamos el precio en el elemento select para cálculos rápidos
-                        selectProducto.attr('data-precio', precio);
-                        
-                        // Recalculamos el total general
-                        calcularTotalGeneral();
-                    }
+                conPrecio(productoId, function(precio) {
+                    // Guardamos el precio en el elemento select para cálculos rápidos
+                    selectProducto.attr('data-precio', precio || 0);
+
+                    // Recalculamos el total general
+                    calcularTotalGeneral();
                 });
             } else {
                 selectProducto.attr('data-precio', 0);
@@ -145,24 +180,31 @@ document.addEventListener("DOMContentLoaded", function () {
             calcularTotalGeneral();
         });
 
-        // 4. Inicialización para filas existentes (Edición)
-        // Si ya hay un producto seleccionado, forzamos la carga del precio
-        if (selectProducto.val() && !selectProducto.attr('data-precio')) {
-            selectProducto.trigger('change');
+        // 4. Inicialización para filas existentes (Edición): el precio sale
+        // del catálogo ya cargado, sin ninguna petición por fila
+        let productoId = selectProducto.val();
+        if (productoId && !selectProducto.attr('data-precio') && catalogoPrecios && productoId in catalogoPrecios) {
+            selectProducto.attr('data-precio', catalogoPrecios[productoId]);
         }
     }
 
-    // --- D. INICIALIZACIÓN ---
-    
-    // 1. Conectar eventos a filas existentes al cargar la página
-    $('.dynamic-detalleguia_set').each(function() {
-        conectarEventosFila($(this));
-    });
+    // --- E. INICIALIZACIÓN ---
+    if ($('#detalles-group').length) {
+        cargarCatalogo().always(function() {
+            // 1. Conectar eventos a filas existentes al cargar la página
+            $(FILAS_DETALLE).each(function() {
+                conectarEventosFila($(this));
+            });
+        });
 
-    // 2. Conectar eventos a nuevas filas cuando se presiona "Agregar otro"
-    $(document).on('formset:added', function(event, $row, formsetName) {
-        conectarEventosFila($row);
-    });
+        // 2. Conectar eventos a nuevas filas cuando se presiona "Agregar otro"
+        // (desde Django 4.1 es un evento nativo: la fila nueva es event.target)
+        document.addEventListener('formset:added', function(event) {
+            if (event.detail && event.detail.formsetName === 'detalles') {
+                conectarEventosFila($(event.target));
+            }
+        });
+    }
 
 
     // =======================================================
@@ -1,3 +1,1602 @@
-from django.test import TestCase
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from zipfile import ZipFile
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from pypdf import PdfReader
+
+from django.contrib.admin import ModelAdmin, site
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+
+from .models import (
+    Cliente, Producto, GuiaEntrega, DetalleGuia, Pago, MovimientoStock, SecuenciaGuia, Proveedor, Gasto,
+    ResumenDiario, ResumenAsesorDiario, TrabajoReporte, Asistencia, PerfilColaborador, PeriodoNomina,
+)
+from .reportes import (
+    calcular_kpis, gastos_por_categoria, verificar_resumenes, rendimiento_asesores,
+    antiguedad_por_cobrar, cartera_por_cobrar, por_pagar,
+)
+from . import busqueda, cobranza, conciliacion, importar_asistencia, nomina, pdf_guias, trabajos, views
+from .admin import GuiaEntregaAdmin
+from .paginacion import PaginadorEstimado
+
+
+class DatosBaseMixin:
+    """Cliente, producto y superusuario mínimos para las pruebas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('jefe', 'jefe@mym.pe', 'clave123')
+        cls.cliente = Cliente.objects.create(nombre_contacto='Ana', celular='999888777', direccion_principal='Av. Lima 123')
+        cls.producto = Producto.objects.create(nombre='Plancha', precio_unitario=Decimal('10.00'), stock_actual=10000)
+
+
+# --- 1. TOTALES DE LA GUÍA ---
+class TotalesGuiaTests(DatosBaseMixin, TestCase):
+
+    def datos_formulario(self, lineas, pagos=()):
+        data = {
+            'cliente': self.cliente.pk,
+            'asesor': self.admin.pk,
+            'numero_guia': '',  # lo asigna SecuenciaGuia
+            'fecha_emision': '2026-03-10',
+            'direccion_entrega': 'Av. Lima 123',
+            'estado_pago': 'PENDIENTE',
+            'observaciones': '',
+            'detalles-TOTAL_FORMS': str(lineas),
+            'detalles-INITIAL_FORMS': '0',
+            'detalles-MIN_NUM_FORMS': '0',
+            'detalles-MAX_NUM_FORMS': '1000',
+            'pagos-TOTAL_FORMS': str(len(pagos)),
+            'pagos-INITIAL_FORMS': '0',
+            'pagos-MIN_NUM_FORMS': '0',
+            'pagos-MAX_NUM_FORMS': '1000',
+        }
+        for i in range(lineas):
+            data[f'detalles-{i}-producto'] = self.producto.pk
+            data[f'detalles-{i}-cantidad'] = '2'
+            data[f'detalles-{i}-precio_aplicado'] = '5.50'
+        for i, monto in enumerate(pagos):
+            data[f'pagos-{i}-fecha'] = '2026-03-10'
+            data[f'pagos-{i}-monto'] = monto
+            data[f'pagos-{i}-comprobante_banco'] = ''
+        return data
+
+    def guardar_por_admin(self, lineas, pagos=()):
+        self.client.force_login(self.admin)
+        url = reverse('admin:gestion_guiaentrega_add')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.post(url, self.datos_formulario(lineas, pagos))
+        self.assertEqual(respuesta.status_code, 302)
+        return consultas
+
+    def verificar_un_solo_recalculo(self, lineas):
+        consultas = self.guardar_por_admin(lineas, pagos=['1.00'])
+        updates_guia = [q for q in consultas.captured_queries if q['sql'].startswith('UPDATE "gestion_guiaentrega"')]
+        self.assertEqual(len(updates_guia), 1)
+
+        guia = GuiaEntrega.objects.get()
+        self.assertEqual(guia.numero_guia, '000001')
+        self.assertEqual(guia.total_venta, Decimal('11.00') * lineas)
+        self.assertEqual(guia.monto_cobrado, Decimal('1.00'))
+        self.assertEqual(guia.estado_pago, 'PARCIAL')
+        return len(consultas)
+
+    def test_guia_1_linea(self):
+        self.verificar_un_solo_recalculo(1)
+
+    def test_guia_20_lineas(self):
+        self.verificar_un_solo_recalculo(20)
+
+    def test_guia_200_lineas(self):
+        self.verificar_un_solo_recalculo(200)
+
+    def test_costo_lineal_por_linea(self):
+        # Costo por línea constante: validar producto (2) e INSERT (1); el stock
+        # se mueve en bloque y no se recargan las líneas hermanas en cada fila.
+        con_20 = self.verificar_un_solo_recalculo(20)
+        GuiaEntrega.objects.all().delete()
+        SecuenciaGuia.objects.all().delete()
+        con_200 = self.verificar_un_solo_recalculo(200)
+        self.assertLessEqual(con_200 - con_20, 180 * 3)
+
+    def test_recalculo_es_una_consulta_y_un_update(self):
+        guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x')
+        for _ in range(5):
+            DetalleGuia(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=Decimal('3.00')).save(recalcular=False)
+        Pago(guia=guia, monto=Decimal('15.00')).save(recalcular=False)
+
+        with self.assertNumQueries(2):
+            GuiaEntrega.objects.filter(pk=guia.pk).recalcular_totales()
+        # Sin cambios no se escribe nada
+        with self.assertNumQueries(1):
+            GuiaEntrega.objects.filter(pk=guia.pk).recalcular_totales()
+
+        guia.refresh_from_db()
+        self.assertEqual(guia.total_venta, Decimal('15.00'))
+        self.assertEqual(guia.estado_pago, 'PAGADO')
+
+    def test_borrar_linea_y_pago_recalcula(self):
+        guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x')
+        detalle = DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=2, precio_aplicado=Decimal('4.00'))
+        DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=Decimal('4.00'))
+        pago = Pago.objects.create(guia=guia, monto=Decimal('4.00'))
+        guia.refresh_from_db()
+        self.assertEqual((guia.total_venta, guia.estado_pago), (Decimal('12.00'), 'PARCIAL'))
+
+        detalle.delete()
+        guia.refresh_from_db()
+        self.assertEqual((guia.total_venta, guia.estado_pago), (Decimal('4.00'), 'PAGADO'))
+
+        pago.delete()
+        guia.refresh_from_db()
+        self.assertEqual((guia.monto_cobrado, guia.estado_pago), (Decimal('0.00'), 'PENDIENTE'))
+
+
+# --- 2. KARDEX / STOCK ---
+class KardexTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x')
+
+    def stock(self):
+        return Producto.objects.values_list('stock_actual', flat=True).get(pk=self.producto.pk)
+
+    def test_venta_no_pisa_stock_concurrente(self):
+        # Otra venta modifica el stock después de que leímos el producto
+        producto_viejo = Producto.objects.get(pk=self.producto.pk)
+        Producto.objects.filter(pk=self.producto.pk).update(stock_actual=500)
+        DetalleGuia.objects.create(guia=self.guia, producto=producto_viejo, cantidad=3, precio_aplicado=1)
+        self.assertEqual(self.stock(), 497)
+
+    def test_editar_y_borrar_linea_devuelve_stock(self):
+        detalle = DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=5, precio_aplicado=1)
+        self.assertEqual(self.stock(), 9995)
+
+        detalle = DetalleGuia.objects.get(pk=detalle.pk)
+        detalle.cantidad = 2
+        detalle.save()
+        self.assertEqual(self.stock(), 9998)
+
+        detalle.delete()
+        self.assertEqual(self.stock(), 10000)
+        self.assertEqual(
+            list(MovimientoStock.objects.order_by('id').values_list('tipo', 'cantidad')),
+            [('VENTA', Decimal('-5.00')), ('DEVOLUCION', Decimal('3.00')), ('DEVOLUCION', Decimal('2.00'))],
+        )
+
+    def test_guia_completa_en_un_solo_update(self):
+        otro = Producto.objects.create(nombre='Cartulina', precio_unitario=2, stock_actual=50)
+        detalles = [DetalleGuia(guia=self.guia, producto=p, cantidad=1) for p in [self.producto, otro] * 10]
+        movimientos = [m for d in detalles for m in d.movimientos_stock()]
+        with CaptureQueriesContext(connection) as consultas:
+            MovimientoStock.aplicar(movimientos)
+        updates = [q for q in consultas.captured_queries if q['sql'].startswith('UPDATE "gestion_producto"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.stock(), 9990)
+        self.assertEqual(Producto.objects.get(pk=otro.pk).stock_actual, 40)
+
+    def test_borrar_guia_devuelve_stock(self):
+        DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=4, precio_aplicado=1)
+        self.guia.delete()
+        self.assertEqual(self.stock(), 10000)
+
+    def test_ajuste_en_cero_se_rechaza(self):
+        self.client.force_login(self.admin)
+        respuesta = self.client.post(reverse('admin:gestion_movimientostock_add'), {
+            'producto': self.producto.pk, 'tipo': 'AJUSTE', 'cantidad': '0', 'referencia': '',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, "La cantidad no puede ser cero.")
+        self.assertFalse(MovimientoStock.objects.exists())
+        with self.assertRaises(ValueError):
+            MovimientoStock(producto=self.producto, cantidad=0).save()
+
+    def test_cantidad_fraccionaria_se_rechaza(self):
+        detalle = DetalleGuia(guia=self.guia, producto=self.producto, cantidad=Decimal('0.5'), precio_aplicado=1)
+        with self.assertRaisesMessage(ValidationError, 'número entero de unidades'):
+            detalle.full_clean()
+        with self.assertRaises(ValueError):
+            detalle.save()
+        with self.assertRaises(ValueError):
+            MovimientoStock.aplicar([MovimientoStock(producto=self.producto, cantidad=Decimal('-0.5'))])
+        self.assertFalse(DetalleGuia.objects.exists())  # la línea se revirtió junto con el stock
+        self.assertEqual(self.stock(), 10000)
+
+        # 2.00 es entero aunque venga como decimal
+        DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=Decimal('2.00'), precio_aplicado=1)
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.assertEqual((producto.stock_actual, type(producto.stock_actual)), (9998, int))
+
+    def test_reconciliar_stock(self):
+        DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=4, precio_aplicado=1)
+        # El producto de prueba no tiene saldo inicial en el kardex: el saldo real es -4
+        salida = StringIO()
+        call_command('reconciliar_stock', '--solo-revisar', stdout=salida)
+        self.assertEqual(self.stock(), 9996)
+        call_command('reconciliar_stock', '--lote', '1', stdout=salida)
+        self.assertEqual(self.stock(), -4)
+        self.assertIn('1 corregidos', salida.getvalue())
+
+
+# --- 3. NUMERACIÓN DE GUÍAS ---
+class SecuenciaGuiaTests(DatosBaseMixin, TestCase):
+
+    def crear_guia(self, fecha, numero=''):
+        return GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=fecha, numero_guia=numero)
+
+    def test_numeracion_por_anio(self):
+        self.assertEqual(self.crear_guia(date(2025, 12, 31)).numero_guia, '000001')
+        self.assertEqual(self.crear_guia(date(2025, 6, 1)).numero_guia, '000002')
+        self.assertEqual(self.crear_guia(date(2026, 1, 1)).numero_guia, '000001')
+
+    def test_numero_manual_avanza_el_contador(self):
+        self.crear_guia(date(2026, 2, 1), numero='000050')
+        self.assertEqual(SecuenciaGuia.proximo(2026), '000051')
+        self.assertEqual(self.crear_guia(date(2026, 2, 2)).numero_guia, '000051')
+
+    def test_contador_parte_de_guias_existentes(self):
+        self.crear_guia(date(2024, 5, 5), numero='000120')
+        SecuenciaGuia.objects.all().delete()
+        self.assertEqual(self.crear_guia(date(2024, 5, 6)).numero_guia, '000121')
+
+    def test_siguiente_es_tiempo_constante(self):
+        for _ in range(30):
+            self.crear_guia(date(2026, 3, 1))
+        with self.assertNumQueries(4):  # savepoint + UPDATE + SELECT + release
+            SecuenciaGuia.siguiente(2026)
+
+
+class SecuenciaGuiaConcurrenciaTests(TransactionTestCase):
+    HILOS = 8
+    GUIAS_POR_HILO = 25
+
+    def crear_guias(self, cliente_id):
+        creadas = 0
+        try:
+            while creadas < self.GUIAS_POR_HILO:
+                try:
+                    GuiaEntrega.objects.create(cliente_id=cliente_id, direccion_entrega='x', fecha_emision=date(2026, 5, 5))
+                    creadas += 1
+                except OperationalError:
+                    # SQLite no tiene bloqueo por fila: reintentamos si la BD está ocupada
+                    continue
+        finally:
+            connections.close_all()
+
+    def test_creacion_concurrente_sin_huecos_ni_duplicados(self):
+        # Los bloqueos de SQLite al refrescar resúmenes solo se registran en el log
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        cliente = Cliente.objects.create(nombre_contacto='Ana')
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            list(pool.map(lambda _: self.crear_guias(cliente.pk), range(self.HILOS)))
+
+        total = self.HILOS * self.GUIAS_POR_HILO
+        numeros = sorted(int(n) for n in GuiaEntrega.objects.values_list('numero_guia', flat=True))
+        self.assertEqual(numeros, list(range(1, total + 1)))
+        self.assertEqual(SecuenciaGuia.objects.get(anio=2026).ultimo_numero, total)
+
+
+# --- 4. LISTADO DE CLIENTES CON DEUDA ---
+class ClienteAdminDeudaTests(DatosBaseMixin, TestCase):
+
+    def crear_clientes(self, cantidad):
+        for i in range(cantidad):
+            cliente = Cliente.objects.create(nombre_contacto=f'Cliente {i:02d}', celular='999')
+            guia = GuiaEntrega.objects.create(cliente=cliente, direccion_entrega='x', fecha_emision=date(2026, 1, 1))
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=Decimal(10 * (i + 1)))
+            GuiaEntrega.objects.create(cliente=cliente, direccion_entrega='x', fecha_emision=date(2026, 1, 2))
+
+    def consultas_listado(self, params=None):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('admin:gestion_cliente_changelist'), params or {})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(consultas)
+
+    def test_consultas_no_dependen_de_las_filas(self):
+        self.crear_clientes(2)
+        _, con_pocos = self.consultas_listado()
+        self.crear_clientes(18)
+        _, con_pagina_llena = self.consultas_listado()
+        self.assertEqual(con_pocos, con_pagina_llena)
+
+    def test_ordenar_y_filtrar_por_deuda(self):
+        self.crear_clientes(3)
+        respuesta, _ = self.consultas_listado({'o': '-4', 'deuda': 'con_deuda'})
+        clientes = list(respuesta.context['cl'].result_list)
+        self.assertEqual([c.nombre_contacto for c in clientes], ['Cliente 02', 'Cliente 01', 'Cliente 00'])
+        self.assertEqual(clientes[0]._deuda, Decimal('30.00'))
+        self.assertEqual(clientes[0]._guias_abiertas, 2)
+
+
+# --- 5. KPIs DEL DASHBOARD ---
+class KpisDashboardTests(DatosBaseMixin, TestCase):
+
+    def test_kpis_en_dos_consultas(self):
+        # Los resúmenes diarios se refrescan al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            proveedor = Proveedor.objects.create(razon_social='Luz del Sur')
+            Gasto.objects.create(proveedor=proveedor, descripcion='Luz', monto=Decimal('30.00'), fecha_emision=date(2026, 3, 5))
+            Gasto.objects.create(proveedor=proveedor, descripcion='Fuera', monto=Decimal('99.00'), fecha_emision=date(2026, 2, 5))
+
+            en_rango = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 3, 10))
+            DetalleGuia.objects.create(guia=en_rango, producto=self.producto, cantidad=10, precio_aplicado=10)
+            Pago.objects.create(guia=en_rango, monto=Decimal('40.00'))
+            antigua = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2025, 1, 10))
+            DetalleGuia.objects.create(guia=antigua, producto=self.producto, cantidad=5, precio_aplicado=10)
+
+        with self.assertNumQueries(2):
+            kpis = calcular_kpis('2026-03-01', '2026-03-31')
+        self.assertEqual(kpis, {
+            'total_ventas': Decimal('100.00'),
+            'total_cobrado': Decimal('40.00'),
+            'deuda_calle': Decimal('110.00'),
+            'total_gastos': Decimal('30.00'),
+            'ganancia_neta': Decimal('70.00'),
+        })
+
+    def test_dashboard_responde(self):
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('home'), {'fecha_inicio': '2026-03-01', 'fecha_fin': '2026-03-31'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['deuda_calle'], Decimal('0.00'))
+
+
+# --- 6. RESÚMENES DIARIOS ---
+class ResumenesDiariosTests(DatosBaseMixin, TestCase):
+
+    def crear_venta(self, fecha, monto, asesor=None):
+        guia = GuiaEntrega.objects.create(cliente=self.cliente, asesor=asesor, direccion_entrega='x', fecha_emision=fecha)
+        DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=monto)
+        return guia
+
+    def test_se_actualizan_al_guardar_y_borrar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            guia = self.crear_venta(date(2026, 4, 1), 50, asesor=self.admin)
+            Pago.objects.create(guia=guia, monto=Decimal('20.00'))
+        dia = ResumenDiario.objects.get(fecha=date(2026, 4, 1))
+        self.assertEqual((dia.total_ventas, dia.total_cobrado, dia.cantidad_guias), (Decimal('50.00'), Decimal('20.00'), 1))
+
+        # Cambiar la fecha mueve la venta de un día a otro
+        with self.captureOnCommitCallbacks(execute=True):
+            guia = GuiaEntrega.objects.get(pk=guia.pk)
+            guia.fecha_emision = date(2026, 4, 2)
+            guia.save()
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2026, 4, 1)).cantidad_guias, 0)
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2026, 4, 2)).total_ventas, Decimal('50.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            guia.delete()
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2026, 4, 2)).total_ventas, Decimal('0.00'))
+        self.assertFalse(ResumenAsesorDiario.objects.exists())
+
+    def test_un_solo_refresco_por_transaccion(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            for monto in (10, 20, 30):
+                self.crear_venta(date(2026, 4, 1), monto)
+        with CaptureQueriesContext(connection) as consultas:
+            for callback in callbacks:
+                callback()
+        upserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "gestion_resumendiario"')]
+        self.assertEqual(len(upserts), 2)  # el candado del día y los totales
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2026, 4, 1)).total_ventas, Decimal('60.00'))
+
+    def test_reconstruir_y_verificar(self):
+        proveedor = Proveedor.objects.create(razon_social='Papelera')
+        Gasto.objects.create(proveedor=proveedor, descripcion='Papel', monto=Decimal('15.00'), fecha_emision=date(2026, 4, 3), categoria='SUMINISTRO')
+        self.crear_venta(date(2026, 4, 3), 70, asesor=self.admin)
+        # Sin ejecutar los on_commit los resúmenes quedan desfasados
+        self.assertEqual(
+            [campo for _, campo, _, _ in verificar_resumenes(date(2026, 4, 1), date(2026, 4, 30))],
+            ['total_ventas', 'cantidad_guias', 'total_gastos',
+             f'asesor {self.admin.pk}: total_ventas', f'asesor {self.admin.pk}: cantidad_guias',
+             'gasto SUMINISTRO: total'],
+        )
+
+        salida = StringIO()
+        call_command('reconstruir_resumenes', '--lote', '7', stdout=salida)
+        self.assertEqual(verificar_resumenes(date(2026, 4, 1), date(2026, 4, 30)), [])
+        call_command('reconstruir_resumenes', '--solo-verificar', stdout=salida)
+        self.assertIn('0 diferencias', salida.getvalue())
+
+        self.assertEqual(gastos_por_categoria('2026-04-01', '2026-04-30'), {'SUMINISTRO': Decimal('15.00')})
+        fila, = rendimiento_asesores(date(2026, 4, 1), date(2026, 4, 30))
+        self.assertEqual((fila['asesor'], fila['cantidad'], fila['total']), ('jefe', 1, Decimal('70.00')))
+
+    def test_borrar_asesor_conserva_sus_resumenes(self):
+        vendedor = User.objects.create_user('vendedor')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_venta(date(2026, 4, 5), 80, asesor=vendedor)
+            self.crear_venta(date(2026, 4, 5), 20)
+        vendedor.delete()
+        # Sus guías y su resumen pasan a "sin asesor": los reportes siguen cuadrando
+        self.assertEqual(sum(ResumenAsesorDiario.objects.values_list('total_ventas', flat=True)), Decimal('100.00'))
+        self.assertEqual(verificar_resumenes(date(2026, 4, 1), date(2026, 4, 30)), [])
+
+        ResumenAsesorDiario.objects.filter(asesor__isnull=True).update(cantidad_guias=5)
+        self.assertEqual(
+            verificar_resumenes(date(2026, 4, 1), date(2026, 4, 30)),
+            [(date(2026, 4, 5), 'asesor None: cantidad_guias', 2, 10)],
+        )
+
+
+# --- 7. CACHÉ DEL DASHBOARD ---
+class CacheDashboardTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def ver_dashboard(self):
+        respuesta = self.client.get(reverse('home'), {'fecha_inicio': '2026-03-01', 'fecha_fin': '2026-03-31'})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_acierto_y_invalidacion_por_cambios(self):
+        self.ver_dashboard()
+        with CaptureQueriesContext(connection) as consultas:
+            self.ver_dashboard()
+        # Solo sesión, usuario y menú: los KPIs salen de la caché
+        self.assertFalse([q for q in consultas.captured_queries if '"gestion_' in q['sql']])
+
+        proveedor = Proveedor.objects.create(razon_social='Luz del Sur')
+        with self.captureOnCommitCallbacks(execute=True):
+            Gasto.objects.create(proveedor=proveedor, descripcion='Luz', monto=Decimal('30.00'), fecha_emision=date(2026, 3, 5))
+        self.assertEqual(self.ver_dashboard().context['total_gastos'], Decimal('30.00'))
+
+        estadisticas = self.client.get(reverse('estadisticas_cache')).json()
+        # Dos entradas por vista: KPIs del rango y cuentas por pagar del día
+        self.assertEqual((estadisticas['aciertos'], estadisticas['fallos']), (2, 4))
+        self.assertGreater(estadisticas['generacion'], 1)
+
+    def test_cambio_de_stock_invalida(self):
+        self.ver_dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(nombre='Tijeras', precio_unitario=1, stock_actual=3)
+        nombres = [p.nombre for p in self.ver_dashboard().context['productos_bajo_stock']]
+        self.assertEqual(nombres, ['Tijeras'])
+
+    def test_una_generacion_por_transaccion(self):
+        generacion = lambda: cache.get('mym:reportes:generacion', 1)
+        antes = generacion()
+        with self.captureOnCommitCallbacks(execute=True):
+            guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x')
+            for _ in range(20):
+                DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=1)
+        self.assertEqual(generacion(), antes + 1)
+
+
+# --- 8. EXPORTACIÓN A EXCEL ---
+class ExportarExcelTests(DatosBaseMixin, TestCase):
+
+    def test_mismo_contenido_y_formato(self):
+        proveedor = Proveedor.objects.create(razon_social='Papelera')
+        Gasto.objects.create(proveedor=proveedor, descripcion='Papel', monto=Decimal('15.00'), fecha_emision=date(2026, 4, 3))
+        for i in range(3):
+            guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 4, 1 + i))
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=10)
+
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('exportar_excel'), {'fecha_inicio': '2026-04-01', 'fecha_fin': '2026-04-30'})
+            contenido = b''.join(respuesta.streaming_content)
+        # Sin consultas por fila para cliente/proveedor
+        self.assertLessEqual(len([q for q in consultas.captured_queries if '"gestion_' in q['sql']]), 2)
+        self.assertIn('Reporte_MyM_2026-04-01_2026-04-30.xlsx', respuesta['Content-Disposition'])
+
+        wb = openpyxl.load_workbook(BytesIO(contenido))
+        ws, ws2 = wb['Reporte Ventas'], wb['Gastos']
+        self.assertEqual(ws['A1'].value, 'REPORTE DE MOVIMIENTOS: 2026-04-01 al 2026-04-30')
+        self.assertIn('A1:E1', [str(r) for r in ws.merged_cells.ranges])
+        self.assertEqual([c.value for c in ws[3]], ["Fecha", "Guía N°", "Cliente", "Estado", "Total (S/.)"])
+        self.assertEqual(ws['A3'].fill.start_color.rgb, '002c3e50')
+        self.assertEqual([c.value for c in ws[4]][1:4], ['000001', 'Ana', 'Pendiente de Pago'])
+        self.assertEqual((ws['D7'].value, ws['E7'].value, ws['E7'].font.b), ('TOTAL VENTAS:', 30, True))
+        self.assertEqual([c.value for c in ws2[4]][1:], ['Papelera', 'Papel', 'Compra de Material/Insumos', '⛔ Por Pagar (Deuda)', 15])
+        self.assertEqual((ws2['E5'].value, ws2['F5'].value), ('TOTAL GASTOS:', 15))
+
+
+class TrabajosReporteTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def test_encolar_procesar_y_descargar(self):
+        for i in range(3):
+            guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 4, 1 + i))
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=10)
+
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('encolar_excel'), {'fecha_inicio': '2026-04-01', 'fecha_fin': '2026-04-30'})
+        trabajo = TrabajoReporte.objects.get()
+        self.assertRedirects(respuesta, reverse('trabajo_reporte', args=[trabajo.pk]))
+        self.assertEqual(trabajo.estado, 'PENDIENTE')
+        self.assertEqual(self.client.get(reverse('api_trabajo_reporte', args=[trabajo.pk])).json()['descarga'], None)
+
+        call_command('procesar_reportes', '--una-vez', stdout=StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.progreso), ('TERMINADO', 100))
+        self.assertTrue(trabajo.archivo.name.startswith('reportes/Reporte_MyM_2026-04-01_2026-04-30'))
+
+        estado = self.client.get(reverse('api_trabajo_reporte', args=[trabajo.pk])).json()
+        respuesta = self.client.get(estado['descarga'])
+        wb = openpyxl.load_workbook(BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(wb['Reporte Ventas']['E7'].value, 30)
+
+    def test_un_trabajo_no_se_toma_dos_veces(self):
+        primero = trabajos.encolar('EXCEL', {'fecha_inicio': '2026-04-01', 'fecha_fin': '2026-04-30'})
+        segundo = trabajos.encolar('EXCEL', {'fecha_inicio': '2026-05-01', 'fecha_fin': '2026-05-31'})
+        self.assertEqual(trabajos.tomar_siguiente().pk, primero.pk)
+        self.assertEqual(trabajos.tomar_siguiente().pk, segundo.pk)
+        self.assertIsNone(trabajos.tomar_siguiente())
+
+    def test_error_y_limpieza_de_vencidos(self):
+        trabajo = trabajos.encolar('EXCEL', {'fecha_inicio': 'no-es-fecha', 'fecha_fin': '2026-04-30'})
+        with self.assertLogs('gestion.trabajos', 'ERROR'):
+            trabajos.ejecutar(trabajos.tomar_siguiente())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'ERROR')
+        self.assertTrue(trabajo.mensaje)
+        self.assertIsNotNone(trabajo.expira)
+
+        trabajos.encolar('EXCEL', {'fecha_inicio': '2026-04-01', 'fecha_fin': '2026-04-30'})
+        listo = trabajos.ejecutar(trabajos.tomar_siguiente())
+        ruta = listo.archivo.path
+        TrabajoReporte.objects.update(expira=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(trabajos.limpiar_vencidos(), (2, 0))
+        self.assertFalse(TrabajoReporte.objects.exists())
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_otro_usuario_no_ve_el_reporte(self):
+        trabajo = trabajos.encolar('EXCEL', {'fecha_inicio': '2026-04-01', 'fecha_fin': '2026-04-30'}, self.admin)
+        colaborador = User.objects.create_user('vendedor', password='clave123', is_staff=True)
+        self.client.force_login(colaborador)
+        self.assertEqual(self.client.get(reverse('api_trabajo_reporte', args=[trabajo.pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('descargar_trabajo_reporte', args=[trabajo.pk])).status_code, 404)
+
+
+class PdfGuiaCacheTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(PDF_CACHE_DIR=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        # La plantilla trae logos remotos; sin red xhtml2pdf llena el log de avisos
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 4, 1))
+        DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=2, precio_aplicado=10)
+        self.url = reverse('imprimir_guia', args=[self.guia.pk])
+
+    def test_renderiza_una_vez_y_responde_304(self):
+        with mock.patch.object(pdf_guias, 'renderizar', wraps=pdf_guias.renderizar) as render:
+            primera = self.client.get(self.url, {'ver': 'true'})
+            pdf = b''.join(primera.streaming_content)
+            segunda = self.client.get(self.url)
+            self.assertEqual(b''.join(segunda.streaming_content), pdf)
+            self.assertEqual(render.call_count, 1)
+
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(primera['Content-Disposition'], 'inline; filename="Guia-000001.pdf"')
+        self.assertEqual(primera['ETag'], segunda['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+    def test_cambio_en_la_guia_genera_otra_version(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Pago.objects.create(guia=self.guia, monto=Decimal('5.00'))
+        self.assertEqual(os.listdir(self.directorio), [])  # la versión vieja se borró al confirmar
+
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(len(os.listdir(self.directorio)), 1)
+
+    def test_guia_inexistente(self):
+        self.assertEqual(self.client.get(reverse('imprimir_guia', args=[999])).status_code, 404)
+
+    def test_pdf_borrado_justo_antes_de_abrirlo(self):
+        obtener_pdf = pdf_guias.obtener_pdf
+
+        def invalidado_en_el_medio(*args):
+            ruta, version = obtener_pdf(*args)
+            os.remove(ruta)  # otra petición invalidó la guía entre el exists() y el open()
+            return ruta, version
+
+        with mock.patch.object(pdf_guias, 'obtener_pdf', side_effect=invalidado_en_el_medio):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+
+    @override_settings(PDF_PRERENDER=True)
+    def test_prerender_en_segundo_plano(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=1, precio_aplicado=10)
+            DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=1, precio_aplicado=10)
+        self.assertEqual(TrabajoReporte.objects.filter(tipo='PDF_GUIA').count(), 1)
+
+        call_command('procesar_reportes', '--una-vez', stdout=StringIO())
+        with mock.patch.object(pdf_guias, 'renderizar') as render:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            render.assert_not_called()
+
+    @override_settings(PDF_MOTOR='reportlab')
+    def test_prerender_usa_el_motor_configurado(self):
+        trabajo = trabajos.encolar('PDF_GUIA', {'guia_id': self.guia.pk})
+        with mock.patch.dict(pdf_guias.CONVERTIR, {'reportlab': mock.Mock(return_value=None), 'xhtml2pdf': mock.Mock()}):
+            with self.assertLogs('gestion.trabajos', 'ERROR'):
+                trabajos.ejecutar(trabajos.tomar_siguiente())
+            pdf_guias.CONVERTIR['reportlab'].assert_called_once()
+            pdf_guias.CONVERTIR['xhtml2pdf'].assert_not_called()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.mensaje, f"no se pudo generar el PDF de la guía {self.guia.pk} (reportlab)")
+
+
+class PdfGuiasLoteTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(PDF_CACHE_DIR=self.directorio, MEDIA_ROOT=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.guias = []
+        for i in range(3):
+            guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 4, 3 - i))
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1 + i, precio_aplicado=10)
+            Pago.objects.create(guia=guia, monto=Decimal('5.00'))
+            self.guias.append(guia)
+        self.client.force_login(self.admin)
+
+    def accion(self, accion):
+        # Con filtro en la URL, para no caer en la redirección al año actual del changelist
+        url = reverse('admin:gestion_guiaentrega_changelist') + '?fecha_emision__year=2026'
+        return self.client.post(url, {
+            'action': accion, '_selected_action': [g.pk for g in self.guias],
+        }, follow=True)
+
+    def test_version_precargada_igual_a_la_consultada(self):
+        guia = GuiaEntrega.objects.select_related('cliente').prefetch_related('detalles__producto', 'pagos').get(pk=self.guias[0].pk)
+        self.assertEqual(pdf_guias.version_de(guia), pdf_guias.version_guia(guia.pk))
+
+    def test_consultas_constantes_y_pool(self):
+        with self.assertNumQueries(3):
+            pdfs = pdf_guias.pdfs_lote([g.pk for g in self.guias], procesos=2)
+        # Orden de impresión: por fecha
+        self.assertEqual([g.pk for g, _ in pdfs], [g.pk for g in reversed(self.guias)])
+        self.assertEqual(len(os.listdir(self.directorio)), 3)  # quedan en la caché de guia individual
+
+        render = mock.Mock()
+        with mock.patch.dict(pdf_guias.CONVERTIR, {'xhtml2pdf': render}):
+            pdf_guias.pdfs_lote([g.pk for g in self.guias])
+        render.assert_not_called()
+
+    def test_accion_un_solo_pdf(self):
+        respuesta = self.accion('imprimir_guias_pdf')
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(len(PdfReader(BytesIO(respuesta.content)).pages), 3)
+
+    def test_accion_zip(self):
+        respuesta = self.accion('descargar_guias_zip')
+        nombres = ZipFile(BytesIO(respuesta.content)).namelist()
+        self.assertEqual(nombres, ['Guia-000003.pdf', 'Guia-000002.pdf', 'Guia-000001.pdf'])
+
+    def test_lote_grande_va_a_la_cola(self):
+        with mock.patch.object(views, 'LOTE_MAXIMO_DIRECTO', 2):
+            self.accion('imprimir_guias_pdf')
+        trabajo = TrabajoReporte.objects.get(tipo='PDF_LOTE')
+        call_command('procesar_reportes', '--una-vez', stdout=StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'TERMINADO')
+        self.assertEqual(len(PdfReader(trabajo.archivo.path).pages), 3)
+
+    def test_limite_del_lote_directo(self):
+        url = reverse('imprimir_guias')
+        ids = [g.pk for g in self.guias] * 7  # 21 > LOTE_MAXIMO_DIRECTO
+        respuesta = self.client.get(url, {'ids': ','.join(map(str, ids))})
+        trabajo = TrabajoReporte.objects.get(tipo='PDF_LOTE')
+        self.assertRedirects(respuesta, reverse('trabajo_reporte', args=[trabajo.pk]), fetch_redirect_response=False)
+
+        with mock.patch.object(pdf_guias, 'pdfs_lote', wraps=pdf_guias.pdfs_lote) as lote:
+            respuesta = self.client.get(url, {'ids': ','.join(map(str, ids[:20]))})
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(lote.call_args.kwargs['procesos'], 1)
+        self.assertEqual(TrabajoReporte.objects.count(), 1)
+
+
+class ImportacionesLivianasTests(TestCase):
+
+    def test_urls_no_cargan_librerias_de_reportes(self):
+        # En un proceso limpio, como un worker de gunicorn recién arrancado
+        codigo = (
+            "import sys, django; django.setup(); import config.urls; "
+            "print(','.join(m for m in ('openpyxl', 'xhtml2pdf', 'reportlab', 'pypdf') if m in sys.modules))"
+        )
+        salida = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'},
+        )
+        self.assertEqual(salida.stdout.strip(), '')
+
+    def test_calentar_no_toca_la_bd(self):
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        with self.assertNumQueries(0):
+            self.assertTrue(pdf_guias.calentar())
+
+
+class MotorReportlabTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(PDF_CACHE_DIR=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        Cliente.objects.filter(pk=self.cliente.pk).update(nombre_empresa='Librería <Ana> & Hijos')
+        self.guia = GuiaEntrega.objects.create(cliente_id=self.cliente.pk, direccion_entrega='Jr. Puno 456', fecha_emision=date(2026, 4, 1))
+
+    def texto(self, motor):
+        respuesta = self.client.get(reverse('imprimir_guia', args=[self.guia.pk]), {'motor': motor})
+        lector = PdfReader(BytesIO(b''.join(respuesta.streaming_content)))
+        # Se compara el conjunto de palabras sin mayúsculas: según la versión, xhtml2pdf
+        # aplica o no `text-transform: uppercase` y repite o no la cabecera de la tabla
+        # al saltar de página
+        texto = ' '.join(pagina.extract_text() for pagina in lector.pages).casefold()
+        return set(texto.split()), respuesta['ETag']
+
+    def test_mismo_texto_que_xhtml2pdf(self):
+        # Con pocas líneas (fila de relleno) y con muchas (salta a otra página)
+        for lineas in (2, 23):
+            for i in range(lineas):
+                DetalleGuia.objects.create(guia=self.guia, producto=self.producto, cantidad=1 + i, precio_aplicado=Decimal('12.50'))
+            html, etag_html = self.texto('xhtml2pdf')
+            directo, etag_directo = self.texto('reportlab')
+            self.assertEqual(directo, html)
+            self.assertNotEqual(etag_directo, etag_html)  # cada motor cachea su propia versión
+        # Los datos de cada línea y el total salen en ambos
+        importes = {f"{Decimal('12.50') * (1 + i):.2f}".replace('.', ',') for i in range(23)} | {'3487,50'}
+        for campo in {'s/.', 'librería', self.guia.numero_guia} | importes:
+            self.assertIn(campo, directo)
+            self.assertIn(campo, html)
+
+    @override_settings(PDF_MOTOR='reportlab')
+    def test_motor_por_setting(self):
+        with mock.patch.dict(pdf_guias.CONVERTIR, {'xhtml2pdf': mock.Mock()}):
+            self.assertEqual(self.client.get(reverse('imprimir_guia', args=[self.guia.pk])).status_code, 200)
+            pdf_guias.CONVERTIR['xhtml2pdf'].assert_not_called()
+
+
+class GuiaAdminListadoTests(DatosBaseMixin, TestCase):
+    URL = reverse_lazy('admin:gestion_guiaentrega_changelist')
+
+    def crear_guias(self, cantidad):
+        for i in range(cantidad):
+            cliente = Cliente.objects.create(nombre_contacto=f'Cliente {i:02d}', celular='999')
+            GuiaEntrega.objects.create(cliente=cliente, direccion_entrega='x', fecha_emision=date(2026, 5, 1))
+
+    def consultas_listado(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self.URL, {'fecha_emision__year': 2026})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, [q['sql'] for q in consultas.captured_queries if '"gestion_' in q['sql']]
+
+    def test_consultas_fijas_por_pagina(self):
+        self.crear_guias(2)
+        _, con_pocas = self.consultas_listado()
+        self.crear_guias(40)
+        respuesta, con_pagina_llena = self.consultas_listado()
+        # COUNT del filtro + la página con el cliente en JOIN + el contador de guías del año
+        self.assertEqual(len(con_pagina_llena), 3, con_pagina_llena)
+        self.assertEqual(len(con_pocas), len(con_pagina_llena))
+        self.assertContains(respuesta, reverse('imprimir_guia', args=[GuiaEntrega.objects.latest('id').pk]))
+
+    def test_paginador_estimado(self):
+        guias = GuiaEntrega.objects.order_by('id')
+        self.crear_guias(3)
+        self.assertEqual(PaginadorEstimado(guias, 100).count, 3)  # SQLite: conteo exacto
+        with mock.patch('gestion.paginacion.estimar_filas', return_value=2_500_000):
+            self.assertEqual(PaginadorEstimado(guias, 100).count, 2_500_000)
+        with mock.patch('gestion.paginacion.estimar_filas', return_value=50):
+            self.assertEqual(PaginadorEstimado(guias, 100).count, 3)  # tabla chica: exacto
+
+
+class PaginacionKeysetTests(DatosBaseMixin, TestCase):
+    URL = reverse_lazy('admin:gestion_guiaentrega_changelist')
+
+    def setUp(self):
+        ajuste = mock.patch.object(GuiaEntregaAdmin, 'list_per_page', 10)
+        ajuste.start()
+        self.addCleanup(ajuste.stop)
+        self.client.force_login(self.admin)
+        # Varias guías por día, para que el desempate por número e id importe
+        for i in range(25):
+            GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 3, 1 + i // 4))
+        self.orden = list(GuiaEntrega.objects.order_by('-fecha_emision', '-numero_guia', 'id').values_list('pk', flat=True))
+
+    def pagina(self, url, params=None):
+        if url.startswith('?'):  # los enlaces del paginador son relativos al changelist
+            url = f"{self.URL}{url}"
+        respuesta = self.client.get(url, params)
+        self.assertEqual(respuesta.status_code, 200)
+        return [g.pk for g in respuesta.context['cl'].result_list], respuesta.context['cl']
+
+    def test_recorrer_adelante_y_atras(self):
+        vistos, cl = self.pagina(self.URL, {'fecha_emision__year': 2026})
+        paginas = [vistos]
+        while cl.url_siguiente:
+            ids, cl = self.pagina(cl.url_siguiente)
+            paginas.append(ids)
+        self.assertEqual(sum(paginas, []), self.orden)
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        self.assertContains(self.client.get(self.URL, {'fecha_emision__year': 2026}), 'Siguientes ›')
+
+        ids, cl = self.pagina(cl.url_anterior)
+        self.assertEqual(ids, paginas[1])
+        ids, cl = self.pagina(cl.url_anterior)
+        self.assertEqual(ids, paginas[0])
+        self.assertIsNone(cl.url_anterior)
+
+    def test_guias_nuevas_no_corren_la_pagina(self):
+        primera, cl = self.pagina(self.URL, {'fecha_emision__year': 2026})
+        GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=date(2026, 3, 30))
+        segunda, _ = self.pagina(cl.url_siguiente)
+        self.assertEqual(segunda, self.orden[10:20])
+
+    def test_filtros_y_date_hierarchy_se_mantienen(self):
+        GuiaEntrega.objects.filter(pk__in=self.orden[::2]).update(estado_pago='PAGADO')
+        params = {'fecha_emision__year': 2026, 'fecha_emision__month': 3, 'estado_pago__exact': 'PAGADO'}
+        ids, cl = self.pagina(self.URL, params)
+        self.assertIn('estado_pago__exact=PAGADO', cl.url_siguiente)
+        siguientes, _ = self.pagina(cl.url_siguiente)
+        self.assertEqual(ids + siguientes, self.orden[::2])
+
+    def test_orden_por_columna_usa_paginas_normales(self):
+        _, cl = self.pagina(self.URL, {'fecha_emision__year': 2026, 'o': '4'})
+        self.assertFalse(cl.es_keyset)
+        _, cl = self.pagina(self.URL, {'fecha_emision__year': 2026, 'cursor': 'basura'})
+        self.assertTrue(cl.es_keyset)  # cursor inválido: primera página
+        self.assertIsNone(cl.url_anterior)
+
+
+# --- BÚSQUEDA INDEXADA (FTS5 en SQLite) ---
+class BusquedaIndexadaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.garcia = Cliente.objects.create(nombre_contacto='Lucía García', nombre_empresa='Librería El Sol')
+        self.quispe = Cliente.objects.create(nombre_contacto='Pedro Quispe', nombre_empresa=None)
+        self.guia_garcia = GuiaEntrega.objects.create(cliente=self.garcia, direccion_entrega='x', fecha_emision=date(2026, 5, 1))
+        self.guia_quispe = GuiaEntrega.objects.create(cliente=self.quispe, direccion_entrega='x', fecha_emision=date(2026, 5, 2))
+        proveedor = Proveedor.objects.create(razon_social='Papelera Andina', ruc_dni='20123456789')
+        self.gasto = Gasto.objects.create(proveedor=proveedor, descripcion='Compra de planchas', monto=Decimal('50.00'), fecha_emision=date(2026, 5, 1))
+
+    def ids(self, queryset, termino):
+        return set(busqueda.buscar(queryset, termino).values_list('pk', flat=True))
+
+    def test_igual_que_icontains(self):
+        self.assertTrue(busqueda.usa_fts(Cliente))
+        cliente_admin = site._registry[Cliente]
+        for termino in ['garc', 'LIBRER', 'quispe', 'lucía sol', '"el sol"', 'ped', 'zz', 'inexistente']:
+            with self.subTest(termino=termino):
+                # Lo que hacía el admin antes: search_fields con icontains
+                antes, _ = ModelAdmin.get_search_results(cliente_admin, None, Cliente.objects.all(), termino)
+                self.assertEqual(self.ids(Cliente.objects.all(), termino), set(antes.values_list('pk', flat=True)))
+
+    def test_guia_por_cliente_y_gasto_por_proveedor(self):
+        self.assertEqual(self.ids(GuiaEntrega.objects.all(), 'garcía'), {self.guia_garcia.pk})
+        self.assertEqual(self.ids(GuiaEntrega.objects.all(), self.guia_quispe.numero_guia), {self.guia_quispe.pk})
+        self.assertEqual(self.ids(Gasto.objects.all(), 'andina'), {self.gasto.pk})
+        self.assertEqual(self.ids(Gasto.objects.all(), 'planchas'), {self.gasto.pk})
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('admin:gestion_guiaentrega_changelist'), {'q': 'garcía', 'fecha_emision__year': 2026})
+        self.assertEqual([g.pk for g in respuesta.context['cl'].result_list], [self.guia_garcia.pk])
+        self.assertTrue(any('MATCH' in q['sql'] for q in consultas.captured_queries))
+
+    def test_se_mantiene_al_guardar_y_borrar(self):
+        self.garcia.nombre_contacto = 'Lucía Mendoza'
+        self.garcia.save()
+        self.assertEqual(self.ids(Cliente.objects.all(), 'mendoza'), {self.garcia.pk})
+        self.assertEqual(self.ids(Cliente.objects.all(), 'garcía'), set())
+
+        # Guardar solo totales no toca el índice
+        with CaptureQueriesContext(connection) as consultas:
+            self.guia_quispe.save(update_fields=['total_venta'])
+        self.assertFalse(any('gestion_busqueda' in q['sql'] for q in consultas.captured_queries))
+
+        self.guia_quispe.delete()
+        self.quispe.delete()
+        self.assertEqual(self.ids(Cliente.objects.all(), 'quispe'), set())
+
+    def test_autocompletado_y_reconstruir(self):
+        Producto.objects.filter(pk=self.producto.pk).update(nombre='Plancha de melamina')  # sin señales
+        self.assertEqual(self.ids(Producto.objects.all(), 'melamina'), set())
+        call_command('reconstruir_busqueda', stdout=StringIO())
+        self.assertEqual(self.ids(Producto.objects.all(), 'melamina'), {self.producto.pk})
+
+        respuesta = self.client.get(reverse('admin:autocomplete'), {
+            'term': 'librer', 'app_label': 'gestion', 'model_name': 'guiaentrega', 'field_name': 'cliente',
+        })
+        self.assertEqual([r['id'] for r in respuesta.json()['results']], [str(self.garcia.pk)])
+
+
+# --- API EN LOTE Y CATÁLOGO DE PRECIOS (FORMULARIO DE GUÍAS) ---
+class ApiLoteCatalogoTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.otro = Producto.objects.create(nombre='Cartulina', precio_unitario=Decimal('2.50'), stock_actual=7)
+
+    def test_lote_una_consulta_por_modelo(self):
+        with self.assertNumQueries(2 + 2):  # sesión + usuario, productos, clientes
+            respuesta = self.client.get(reverse('api_info_lote'), {
+                'productos': f'{self.producto.pk},{self.otro.pk},999,x', 'clientes': str(self.cliente.pk),
+            })
+        self.assertEqual(respuesta.json(), {
+            'productos': {str(self.producto.pk): {'precio': 10.0, 'stock': 10000}, str(self.otro.pk): {'precio': 2.5, 'stock': 7}},
+            'clientes': {str(self.cliente.pk): {'direccion': 'Av. Lima 123'}},
+        })
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_info_lote'), {'productos': '1'}).status_code, 302)
+
+    def test_catalogo_revalida_con_etag(self):
+        url = reverse('api_catalogo_productos')
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.json()['precios'], {str(self.producto.pk): 10.0, str(self.otro.pk): 2.5})
+        etag = respuesta['ETag']
+        self.assertTrue(respuesta.has_header('Last-Modified'))
+
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(url, headers={'if-modified-since': respuesta['Last-Modified']}).status_code, 304)
+
+        # Cambio de precio desde el admin (save con update_fields): nueva versión
+        self.client.post(reverse('admin:gestion_producto_change', args=[self.otro.pk]), {
+            'nombre': 'Cartulina', 'precio_unitario': '3.00', 'stock_actual': '7',
+        })
+        cambiada = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertEqual(cambiada.json()['precios'][str(self.otro.pk)], 3.0)
+
+        # Y también al borrar un producto
+        etag = cambiada['ETag']
+        Producto.objects.create(nombre='Goma', precio_unitario=Decimal('1.00')).delete()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+        self.otro.delete()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+
+# --- NÓMINA (RECIBOS DE PAGO) ---
+class NominaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.ana = User.objects.create_user('ana', first_name='Ana', last_name='Ríos')
+        PerfilColaborador.objects.create(usuario=self.ana, tarifa_por_hora=Decimal('12.50'))
+        self.luis = User.objects.create_user('luis')  # sin perfil: tarifa 0
+        for usuario, dia, entrada, salida in [
+            (self.ana, 2, time(8, 0), time(17, 30)),
+            (self.ana, 3, time(8, 0), time(12, 20)),
+            (self.ana, 4, time(8, 0), None),
+            (self.luis, 2, time(9, 0), time(13, 0)),
+        ]:
+            Asistencia.objects.create(usuario=usuario, fecha=date(2026, 3, dia), hora_entrada=entrada, hora_salida=salida)
+
+    def test_calculo_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            ana, luis = nomina.calcular_recibos(Asistencia.objects.all())
+        self.assertEqual([d['horas'] for d in ana['dias']], [Decimal('9.50'), Decimal('4.33'), Decimal('0.00')])
+        self.assertEqual([d['pago'] for d in ana['dias']], [Decimal('118.75'), Decimal('54.13'), Decimal('0.00')])
+        self.assertEqual((ana['colaborador'], ana['total_horas'], ana['total_pago']), ('Ana Ríos', Decimal('13.83'), Decimal('172.88')))
+        self.assertEqual((luis['colaborador'], luis['tarifa'], luis['total_horas'], luis['total_pago']), ('luis', Decimal('0'), Decimal('4.00'), Decimal('0.00')))
+        # Mismas horas que el cálculo por fila de siempre
+        for asistencia in Asistencia.objects.filter(usuario=self.ana).order_by('fecha'):
+            self.assertEqual(float(ana['dias'][asistencia.fecha.day - 2]['horas']), asistencia.horas_trabajadas())
+
+    def accion_recibo(self, asistencias):
+        return self.client.post(reverse('admin:gestion_asistencia_changelist'), {
+            'action': 'generar_recibo_pago', '_selected_action': [a.pk for a in asistencias],
+        })
+
+    def test_accion_recibo(self):
+        respuesta = self.accion_recibo(Asistencia.objects.all())
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTemplateUsed(respuesta, 'gestion/recibo_pago.html')
+        self.assertContains(respuesta, 'Recibí Conforme<br>Ana Ríos')
+        self.assertContains(respuesta, 'RECIBO DE PAGO', count=2)
+        self.assertEqual(respuesta.context['recibos'][0]['total_pago'], Decimal('172.88'))
+
+    def test_periodo_cerrado_no_se_recalcula(self):
+        self.client.post(reverse('admin:gestion_periodonomina_add'), {'desde': '2026-03-01', 'hasta': '2026-03-03'})
+        periodo = PeriodoNomina.objects.get()
+        self.assertEqual(periodo.cerrado_por, self.admin)
+        self.assertEqual(periodo.recibos.count(), 2)
+
+        # Suben la tarifa y corrigen una hora: el recibo cerrado no cambia
+        PerfilColaborador.objects.filter(usuario=self.ana).update(tarifa_por_hora=Decimal('20.00'))
+        Asistencia.objects.filter(usuario=self.ana, fecha=date(2026, 3, 2)).update(hora_salida=time(18, 0))
+        respuesta = self.client.get(reverse('recibos_periodo_nomina', args=[periodo.pk]))
+        ana = next(r for r in respuesta.context['recibos'] if r['usuario_id'] == self.ana.pk)
+        self.assertEqual((ana['tarifa'], ana['total_pago']), (Decimal('12.50'), Decimal('172.88')))
+        self.assertEqual(ana['dias'][1], {
+            'fecha': date(2026, 3, 3), 'entrada': time(8, 0), 'salida': time(12, 20),
+            'horas': Decimal('4.33'), 'pago': Decimal('54.13'),
+        })
+
+        # La acción deja fuera los días cerrados y enlaza a sus recibos guardados
+        respuesta = self.accion_recibo(Asistencia.objects.filter(usuario=self.ana))
+        self.assertEqual([len(r['dias']) for r in respuesta.context['recibos']], [1])  # solo el día 4
+        self.assertContains(respuesta, reverse('recibos_periodo_nomina', args=[periodo.pk]))
+
+        # No se puede cerrar dos veces el mismo rango
+        respuesta = self.client.post(reverse('admin:gestion_periodonomina_add'), {'desde': '2026-03-03', 'hasta': '2026-03-31'})
+        self.assertContains(respuesta, 'Se cruza con el periodo')
+        self.assertEqual(PeriodoNomina.objects.count(), 1)
+
+    # --- Listado de asistencias con horas y pago anotados ---
+    def test_listado_anotado_sin_consulta_por_fila(self):
+        url = reverse('admin:gestion_asistencia_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        filas = {a.pk: a for a in respuesta.context['cl'].result_list}
+        # COUNT + página + totales, con el perfil en JOIN: nada por fila
+        self.assertEqual(len([q for q in consultas.captured_queries if 'gestion_perfilcolaborador' in q['sql']]), 3)
+        for asistencia in Asistencia.objects.all():
+            self.assertEqual(float(filas[asistencia.pk]._horas), asistencia.horas_trabajadas())
+        self.assertContains(respuesta, 'S/. 118.75')
+        self.assertContains(respuesta, '<b style="color:orange">4.33 hrs</b>', html=True)
+
+        # Totales del filtro y orden por pago
+        respuesta = self.client.get(url, {'fecha__gte': '2026-03-02', 'fecha__lt': '2026-03-03'})
+        self.assertEqual(respuesta.context['totales'], {'dias': 2, 'horas': Decimal('13.50'), 'pago': Decimal('118.75')})
+        self.assertContains(respuesta, 'id="totales-asistencia"')
+        respuesta = self.client.get(url, {'o': '-6'})
+        self.assertEqual(respuesta.context['cl'].result_list[0]._pago, Decimal('118.75'))
+
+
+class ImportarAsistenciaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.ana = User.objects.create_user('ana')
+        self.luis = User.objects.create_user('Luis')
+        # Ya marcó entrada el lunes desde el admin: el reloj lo completa
+        Asistencia.objects.create(usuario=self.ana, fecha=date(2026, 3, 2), hora_entrada=time(8, 5))
+
+    def csv(self, texto):
+        return BytesIO(texto.encode('utf-8-sig'))
+
+    def test_csv_empareja_y_completa(self):
+        archivo = self.csv(
+            "Usuario;Fecha y hora\n"
+            "ana;2026-03-02 07:58:10\n"
+            "ana;02/03/2026 17:02\n"
+            "LUIS;2026-03-02 09:00\n"
+            "luis;2026-03-02 13:30:00\n"
+            "luis;2026-03-02 12:00\n"    # marcación intermedia: se ignora
+            "ana;2026-03-03 08:00\n"     # una sola marcación: sin salida
+            "pedro;2026-03-02 08:00\n"   # no existe
+            "ana;ayer\n"
+            "\n"
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            resumen = importar_asistencia.importar_marcaciones(archivo, 'reloj.csv')
+        # usuarios + lectura de existentes + insert + update (más el savepoint)
+        self.assertLessEqual(len(consultas), 6)
+        self.assertEqual((resumen['filas'], resumen['rechazadas']), (8, 2))
+        self.assertEqual((resumen['creadas'], resumen['actualizadas'], resumen['sin_cambios']), (2, 1, 0))
+        self.assertEqual([numero for numero, _ in resumen['motivos']], [8, 9])
+        self.assertIn("'pedro' no existe", resumen['motivos'][0][1])
+
+        dias = {(a.usuario.username, a.fecha.day): (a.hora_entrada, a.hora_salida) for a in Asistencia.objects.all()}
+        self.assertEqual(dias, {
+            ('ana', 2): (time(7, 58, 10), time(17, 2)),
+            ('ana', 3): (time(8, 0), None),
+            ('Luis', 2): (time(9, 0), time(13, 30)),
+        })
+
+        # Volver a cargar el mismo archivo no duplica nada
+        archivo.seek(0)
+        resumen = importar_asistencia.importar_marcaciones(archivo, 'reloj.csv')
+        self.assertEqual((resumen['creadas'], resumen['actualizadas'], resumen['sin_cambios']), (0, 0, 3))
+        self.assertEqual(Asistencia.objects.count(), 3)
+
+    def test_xlsx_con_fecha_y_hora_separadas(self):
+        libro = openpyxl.Workbook()
+        hoja = libro.active
+        hoja.append(['Código', 'Nombre', 'Fecha', 'Hora'])
+        hoja.append(['luis', 'Luis', date(2026, 3, 4), time(8, 30)])
+        hoja.append(['luis', 'Luis', '2026-03-04', '18:00'])
+        archivo = BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+        resumen = importar_asistencia.importar_marcaciones(archivo, 'reloj.xlsx', simular=True)
+        self.assertEqual((resumen['filas'], resumen['creadas']), (2, 1))
+        self.assertFalse(Asistencia.objects.filter(usuario=self.luis).exists())  # simulación
+
+    def test_archivo_sin_columnas(self):
+        with self.assertRaisesMessage(importar_asistencia.ErrorImportacion, 'Faltan columnas'):
+            importar_asistencia.importar_marcaciones(self.csv("nombre,dia\nana,lunes\n"), 'reloj.csv')
+
+    def test_csv_en_windows_1252(self):
+        User.objects.create_user('peña')
+        archivo = BytesIO("Código;Marcación\npeña;2026-03-06 08:00\npeña;2026-03-06 17:00\n".encode('cp1252'))
+        resumen = importar_asistencia.importar_marcaciones(archivo, 'reloj.csv')
+        self.assertEqual((resumen['filas'], resumen['creadas'], resumen['rechazadas']), (2, 1, 0))
+
+        # UTF-8 al inicio y un byte suelto mucho más abajo: error claro, no un 500
+        texto = "usuario;fecha_hora\n" + "ana;2026-03-07 08:00\n" * 4000
+        archivo = BytesIO(texto.encode('utf-8') + "peña;2026-03-07 09:00\n".encode('cp1252'))
+        with self.assertRaisesMessage(importar_asistencia.ErrorImportacion, "guárdalo como 'CSV UTF-8'"):
+            importar_asistencia.importar_marcaciones(archivo, 'reloj.csv')
+
+    def test_comando_y_subida_en_admin(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write("usuario,fecha_hora\nluis,2026-03-05 08:00\nluis,2026-03-05 16:00\nx,2026-03-05 08:00\n")
+        self.addCleanup(os.remove, archivo.name)
+        salida = StringIO()
+        call_command('importar_asistencia', archivo.name, stdout=salida)
+        self.assertIn('1 rechazadas', salida.getvalue())
+        self.assertIn('1 días nuevos', salida.getvalue())
+        self.assertEqual(Asistencia.objects.get(usuario=self.luis).hora_salida, time(16, 0))
+
+        self.client.force_login(self.admin)
+        url = reverse('admin:gestion_asistencia_importar')
+        self.assertContains(self.client.get(reverse('admin:gestion_asistencia_changelist')), url)
+        with open(archivo.name, 'rb') as subida:
+            respuesta = self.client.post(url, {'archivo': subida})
+        self.assertContains(respuesta, 'id="resumen-importacion"')
+        self.assertEqual(respuesta.context['resumen']['sin_cambios'], 1)
+
+        # Solo el superusuario importa
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.client.force_login(User.objects.create_user('mozo', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_segunda_entrada_del_dia_va_al_registro(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('admin:gestion_asistencia_add'), {})
+        registro = Asistencia.objects.get(usuario=self.admin)
+        respuesta = self.client.get(reverse('admin:gestion_asistencia_add'))
+        self.assertRedirects(respuesta, reverse('admin:gestion_asistencia_change', args=[registro.pk]))
+        self.assertEqual(Asistencia.objects.filter(usuario=self.admin).count(), 1)
+
+
+class ReporteAsesoresTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.ana = User.objects.create_user('ana', first_name='Ana', last_name='Ríos')
+        self.luis = User.objects.create_user('luis')
+        pedro = User.objects.create_user('pedro')
+        with self.captureOnCommitCallbacks(execute=True):
+            for asesor, dia, monto in [
+                (self.ana, 5, 100), (self.ana, 12, 100), (self.ana, 20, 200),
+                (self.luis, 1, 150), (self.luis, 15, 150),
+                (self.admin, 11, 50),
+                (pedro, 10, 80),        # solo en el periodo anterior
+                (self.luis, 21, 999),   # fuera del rango
+            ]:
+                guia = GuiaEntrega.objects.create(cliente=self.cliente, asesor=asesor, direccion_entrega='x', fecha_emision=date(2026, 4, dia))
+                DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=monto)
+            Pago.objects.create(guia=guia, monto=Decimal('1.00'))  # cobro fuera del rango: no cuenta
+            Pago.objects.create(guia=GuiaEntrega.objects.get(asesor=self.ana, fecha_emision=date(2026, 4, 20)), monto=Decimal('120.00'))
+
+    def test_ranking_y_variacion_en_una_consulta(self):
+        # Del 11 al 20 de abril; el anterior es del 1 al 10
+        with self.assertNumQueries(1):
+            ana, luis, jefe = rendimiento_asesores(date(2026, 4, 11), date(2026, 4, 20))
+        self.assertEqual(
+            (ana['asesor'], ana['puesto'], ana['puesto_anterior'], ana['cantidad'], ana['total'], ana['cobrado'], ana['ticket_promedio']),
+            ('Ana Ríos', 1, 2, 2, Decimal('300.00'), Decimal('120.00'), Decimal('150.00')),
+        )
+        self.assertEqual((ana['total_anterior'], ana['variacion'], ana['variacion_pct']), (Decimal('100.00'), Decimal('200.00'), Decimal('200.0')))
+        self.assertEqual((luis['asesor'], luis['puesto'], luis['puesto_anterior'], luis['variacion'], luis['variacion_pct']), ('luis', 2, 1, Decimal('0.00'), Decimal('0.0')))
+        self.assertEqual((jefe['puesto'], jefe['puesto_anterior'], jefe['cantidad_anterior'], jefe['variacion_pct']), (3, None, 0, None))
+
+    def test_pagina_json_y_detalle(self):
+        parametros = {'fecha_inicio': '2026-04-11', 'fecha_fin': '2026-04-20'}
+        respuesta = self.client.get(reverse('reporte_asesores'), parametros)
+        self.assertTemplateUsed(respuesta, 'gestion/reporte_asesores.html')
+        self.assertContains(respuesta, 'Ana Ríos')
+        self.assertEqual(respuesta.context['total_vendido'], Decimal('500.00'))
+
+        datos = self.client.get(reverse('api_reporte_asesores'), parametros).json()
+        self.assertEqual(datos['anterior'], {'desde': '2026-04-01', 'hasta': '2026-04-10'})
+        self.assertEqual([(a['asesor'], a['total'], a['total_anterior']) for a in datos['asesores']],
+                         [('Ana Ríos', 300.0, 100.0), ('luis', 150.0, 150.0), ('jefe', 50.0, 0.0)])
+
+        # El nombre del asesor lleva a sus guías del rango
+        respuesta = self.client.get(reverse('admin:gestion_guiaentrega_changelist'), {
+            'asesor__id__exact': self.ana.pk, 'fecha_emision__gte': '2026-04-11', 'fecha_emision__lte': '2026-04-20',
+        })
+        self.assertEqual(len(respuesta.context['cl'].result_list), 2)
+
+        # Fechas inválidas: mes en curso, sin error
+        self.assertEqual(self.client.get(reverse('reporte_asesores'), {'fecha_inicio': 'x'}).status_code, 200)
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.client.force_login(self.luis)
+        self.assertEqual(self.client.get(reverse('api_reporte_asesores')).status_code, 403)
+
+
+class CuentasPorCobrarTests(DatosBaseMixin, TestCase):
+    CORTE = date(2026, 6, 30)
+
+    def venta(self, cliente, fecha, monto, pagado=0):
+        guia = GuiaEntrega.objects.create(cliente=cliente, direccion_entrega='x', fecha_emision=fecha)
+        if monto:
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=monto)
+        if pagado:
+            Pago.objects.create(guia=guia, monto=pagado)
+        return guia
+
+    def setUp(self):
+        self.beto = Cliente.objects.create(nombre_contacto='Beto', celular='988', direccion_principal='x')
+        self.caro = Cliente.objects.create(nombre_contacto='Caro', celular='977', direccion_principal='x')
+        self.venta(self.cliente, date(2026, 6, 20), 100, pagado=40)   # 10 días, saldo 60
+        self.venta(self.cliente, date(2026, 5, 15), 200)              # 46 días
+        self.venta(self.cliente, date(2026, 1, 10), 50)               # 171 días
+        self.venta(self.cliente, date(2026, 6, 1), 30, pagado=30)     # pagada: no cuenta
+        self.venta(self.beto, date(2026, 4, 15), 500)                 # 76 días
+        self.venta(self.beto, date(2026, 7, 5), 20)                   # fecha futura: primer tramo
+        self.venta(self.caro, date(2026, 5, 31), 10)                  # justo 30 días
+        self.venta(self.caro, date(2026, 5, 30), 10)                  # 31 días
+        self.venta(self.caro, date(2026, 6, 25), 0)                   # sin detalle: total 0, no cuenta
+
+    def test_tramos_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            beto, ana, caro = antiguedad_por_cobrar(self.CORTE)
+        tramos = ('tramo_0_30', 'tramo_31_60', 'tramo_61_90', 'tramo_mas_90', 'total', 'guias')
+        self.assertEqual([ana[c] for c in tramos], [Decimal('60.00'), Decimal('200.00'), 0, Decimal('50.00'), Decimal('310.00'), 3])
+        self.assertEqual([beto[c] for c in tramos], [Decimal('20.00'), 0, Decimal('500.00'), 0, Decimal('520.00'), 2])
+        self.assertEqual([caro[c] for c in tramos], [Decimal('10.00'), Decimal('10.00'), 0, 0, Decimal('20.00'), 2])
+        self.assertEqual((ana['cliente__nombre_contacto'], ana['mas_antigua']), ('Ana', date(2026, 1, 10)))
+
+        with self.assertNumQueries(1):
+            cartera = cartera_por_cobrar(self.CORTE)
+        self.assertEqual(cartera, {
+            'tramo_0_30': Decimal('90.00'), 'tramo_31_60': Decimal('210.00'), 'tramo_61_90': Decimal('500.00'),
+            'tramo_mas_90': Decimal('50.00'), 'total': Decimal('850.00'), 'guias': 7, 'clientes': 3,
+        })
+
+    def test_pagina_detalle_y_excel(self):
+        self.client.force_login(self.admin)
+        url = reverse('reporte_cobranza')
+        with mock.patch.object(views, 'CLIENTES_POR_PAGINA', 2):
+            respuesta = self.client.get(url, {'fecha_corte': '2026-06-30'})
+            self.assertEqual([f['cliente__nombre_contacto'] for f in respuesta.context['filas']], ['Beto', 'Ana'])
+            self.assertEqual(respuesta.context['pagina'].paginator.num_pages, 2)
+            siguiente = self.client.get(url, {'fecha_corte': '2026-06-30', 'page': 2})
+            self.assertEqual([f['cliente__nombre_contacto'] for f in siguiente.context['filas']], ['Caro'])
+        self.assertContains(respuesta, 'id="tramos-cartera"')
+
+        # Del tramo 31-60 de Ana al listado de sus guías abiertas de ese rango
+        ana = respuesta.context['filas'][1]
+        self.assertEqual(ana['celdas'][1]['monto'], Decimal('200.00'))
+        detalle = self.client.get(ana['celdas'][1]['url'])
+        self.assertEqual([g.fecha_emision for g in detalle.context['cl'].result_list], [date(2026, 5, 15)])
+        self.assertEqual(len(self.client.get(ana['url']).context['cl'].result_list), 3)
+
+        # El Excel se encola y lo genera el worker de reportes (que al arrancar precalienta los PDFs)
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=directorio):
+            respuesta = self.client.get(reverse('exportar_cobranza_excel'), {'fecha_corte': '2026-06-30'})
+            trabajo = TrabajoReporte.objects.get(tipo='EXCEL_COBRANZA', solicitado_por=self.admin)
+            self.assertRedirects(respuesta, reverse('trabajo_reporte', args=[trabajo.pk]))
+            call_command('procesar_reportes', '--una-vez', stdout=StringIO())
+            descarga = self.client.get(reverse('descargar_trabajo_reporte', args=[trabajo.pk]))
+            ws = openpyxl.load_workbook(BytesIO(b''.join(descarga.streaming_content))).active
+        self.assertIn('Cuentas_por_cobrar_2026-06-30', descarga['Content-Disposition'])
+        self.assertEqual(ws['A1'].value, 'CUENTAS POR COBRAR AL 30/06/2026')
+        self.assertEqual([c.value for c in ws[4]], ['Beto', None, '988', 2, datetime(2026, 4, 15), 20, 0, 500, 0, 520])
+        self.assertEqual((ws['E7'].value, ws['J7'].value), ('TOTALES:', 850))
+
+
+class CuentasPorPagarTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.hoy = timezone.now().date()
+        self.luz = Proveedor.objects.create(razon_social='Luz del Sur', tipo='SERVICIOS')
+        self.papelera = Proveedor.objects.create(razon_social='Papelera Andina')
+
+        def gasto(proveedor, monto, dias, categoria='SUMINISTRO', estado='PENDIENTE'):
+            vence = self.hoy + timedelta(days=dias) if dias is not None else None
+            return Gasto.objects.create(
+                proveedor=proveedor, descripcion='x', monto=Decimal(monto), categoria=categoria,
+                fecha_vencimiento=vence, estado=estado,
+            )
+
+        self.gastos = [
+            gasto(self.luz, '80.00', -1, 'OPERATIVO'),          # venció ayer
+            gasto(self.luz, '20.00', 0, 'OPERATIVO'),           # vence hoy: todavía no está vencido
+            gasto(self.papelera, '300.00', -40),
+            gasto(self.papelera, '150.00', 6),                  # último día de la semana
+            gasto(self.papelera, '50.00', 7),
+            gasto(self.papelera, '10.00', None),
+            gasto(self.papelera, '999.00', -10, estado='PAGADO'),
+        ]
+
+    def test_plazos_por_proveedor_y_categoria(self):
+        with self.assertNumQueries(1):
+            totales = por_pagar(self.hoy)
+        self.assertEqual(totales, {
+            'vencido': Decimal('380.00'), 'esta_semana': Decimal('170.00'), 'mas_adelante': Decimal('50.00'),
+            'sin_fecha': Decimal('10.00'), 'total': Decimal('610.00'), 'gastos': 6,
+        })
+        # El mismo criterio que Gasto.esta_vencido()
+        self.assertEqual(totales['vencido'], sum(g.monto for g in self.gastos if g.esta_vencido()))
+
+        with self.assertNumQueries(1):
+            papelera, luz = por_pagar(self.hoy, ['proveedor_id'])
+        self.assertEqual((papelera['proveedor_id'], papelera['vencido'], papelera['total']), (self.papelera.pk, Decimal('300.00'), Decimal('510.00')))
+        self.assertEqual((luz['vencido'], luz['esta_semana'], luz['gastos']), (Decimal('80.00'), Decimal('20.00'), 2))
+
+        categorias = {f['categoria']: f['total'] for f in por_pagar(self.hoy, ['categoria'])}
+        self.assertEqual(categorias, {'SUMINISTRO': Decimal('510.00'), 'OPERATIVO': Decimal('100.00')})
+
+    def test_filtro_del_admin_y_widget_del_dashboard(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        url = reverse('admin:gestion_gasto_changelist')
+        vencidos = self.client.get(url, {'vencimiento': 'vencido'}).context['cl'].result_list
+        self.assertEqual({g.pk for g in vencidos}, {self.gastos[0].pk, self.gastos[2].pk})
+        semana = self.client.get(url, {'vencimiento': 'esta_semana'}).context['cl'].result_list
+        self.assertEqual({g.pk for g in semana}, {self.gastos[1].pk, self.gastos[3].pk})
+
+        respuesta = self.client.get(reverse('home'))
+        self.assertContains(respuesta, 'id="cuentas-por-pagar"')
+        self.assertEqual(respuesta.context['por_pagar']['totales']['vencido'], Decimal('380.00'))
+        self.assertEqual([f['proveedor__razon_social'] for f in respuesta.context['por_pagar']['proveedores']], ['Papelera Andina', 'Luz del Sur'])
+
+        # Segunda vez sale de la caché
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('home'))
+        self.assertFalse([q for q in consultas.captured_queries if '"gestion_gasto"' in q['sql']])
+
+
+class PagoClienteTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        def venta(fecha, monto, pagado=0):
+            guia = GuiaEntrega.objects.create(cliente=self.cliente, direccion_entrega='x', fecha_emision=fecha)
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=monto)
+            if pagado:
+                Pago.objects.create(guia=guia, monto=pagado)
+            return guia
+
+        self.vieja = venta(date(2026, 3, 1), 100, pagado=40)
+        self.media = venta(date(2026, 3, 10), 200)
+        self.nueva = venta(date(2026, 3, 20), 50)
+        self.pagada = venta(date(2026, 2, 1), 30, pagado=30)
+
+    def estados(self):
+        return [
+            (g.monto_cobrado, g.estado_pago)
+            for g in GuiaEntrega.objects.filter(pk__in=[self.vieja.pk, self.media.pk, self.nueva.pk]).order_by('fecha_emision')
+        ]
+
+    def test_reparto_fifo_en_una_transaccion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # SELECT guías, INSERT de los pagos, agregados + UPDATE, estados (+ savepoint)
+            with self.assertNumQueries(7):
+                resultado = cobranza.registrar_pago_cliente(self.cliente.pk, '150', comprobante_banco='OP-123')
+
+        self.assertEqual(
+            [(p['numero_guia'], p['monto'], p['estado_pago']) for p in resultado['pagos']],
+            [(self.vieja.numero_guia, Decimal('60.00'), 'PAGADO'), (self.media.numero_guia, Decimal('90.00'), 'PARCIAL')],
+        )
+        self.assertEqual((resultado['deuda_anterior'], resultado['deuda_restante']), (Decimal('310.00'), Decimal('160.00')))
+        self.assertEqual(self.estados(), [
+            (Decimal('100.00'), 'PAGADO'), (Decimal('90.00'), 'PARCIAL'), (Decimal('0.00'), 'PENDIENTE'),
+        ])
+        self.assertEqual(Pago.objects.filter(comprobante_banco='OP-123').count(), 2)
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2026, 3, 10)).total_cobrado, Decimal('90.00'))
+
+        # Pagar justo lo que falta deja todo al día; un centavo más no registra nada
+        with self.assertRaises(cobranza.ErrorPago):
+            cobranza.registrar_pago_cliente(self.cliente.pk, '160.01')
+        cobranza.registrar_pago_cliente(self.cliente.pk, '160')
+        self.assertEqual([estado for _, estado in self.estados()], ['PAGADO', 'PAGADO', 'PAGADO'])
+        with self.assertRaises(cobranza.ErrorPago):
+            cobranza.registrar_pago_cliente(self.cliente.pk, '1')
+
+    def test_admin_y_api(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:gestion_cliente_registrar_pago', args=[self.cliente.pk])
+        respuesta = self.client.get(url)
+        self.assertEqual([numero for _, numero, _, _ in respuesta.context['guias']], [self.vieja.numero_guia, self.media.numero_guia, self.nueva.numero_guia])
+        self.assertEqual(respuesta.context['deuda'], Decimal('310.00'))
+
+        respuesta = self.client.post(url, {'monto': '60', 'comprobante_banco': 'YAPE-1'})
+        self.assertRedirects(respuesta, reverse('admin:gestion_guiaentrega_changelist') + f'?cliente__id__exact={self.cliente.pk}', fetch_redirect_response=False)
+        self.assertEqual(self.estados()[0], (Decimal('100.00'), 'PAGADO'))
+
+        api = reverse('api_registrar_pago', args=[self.cliente.pk])
+        respuesta = self.client.post(api, {'monto': '210', 'comprobante_banco': 'OP-9'}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([p['estado_pago'] for p in respuesta.json()['pagos']], ['PAGADO', 'PARCIAL'])
+
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        respuesta = self.client.post(api, {'monto': '999'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('supera la deuda', respuesta.json()['error'])
+        for cuerpo in ([1], 5, 'monto'):
+            respuesta = self.client.post(api, cuerpo, content_type='application/json')
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('JSON inválido', respuesta.json()['error'])
+        respuesta = self.client.post(api, {'monto': '1', 'comprobante_banco': 'X' * 101})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('100 caracteres', respuesta.json()['error'])
+
+        # Mismo formulario en el admin; y la fecha del pago es la de Lima, no la UTC
+        respuesta = self.client.post(url, {'monto': '1', 'comprobante_banco': 'X' * 101}, follow=True)
+        self.assertContains(respuesta, '100 caracteres')
+        noche = datetime(2026, 3, 21, 2, 30, tzinfo=timezone.UTC)  # 21:30 del 20/03 en Lima
+        with mock.patch('django.utils.timezone.now', return_value=noche):
+            self.client.post(url, {'monto': '1', 'comprobante_banco': 'NOCHE'})
+        self.assertEqual(Pago.objects.get(comprobante_banco='NOCHE').fecha, date(2026, 3, 20))
+
+        vendedor = User.objects.create_user('vendedor', password='x', is_staff=True)
+        self.client.force_login(vendedor)
+        self.assertEqual(self.client.post(api, {'monto': '1'}).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ConciliacionBancariaTests(DatosBaseMixin, TestCase):
+
+    def setUp(self):
+        beto = Cliente.objects.create(nombre_contacto='Beto', celular='988777666', direccion_principal='x')
+        caro = Cliente.objects.create(nombre_contacto='Caro', direccion_principal='x')
+
+        def venta(cliente, dia, monto):
+            guia = GuiaEntrega.objects.create(cliente=cliente, direccion_entrega='x', fecha_emision=date(2026, 3, dia))
+            DetalleGuia.objects.create(guia=guia, producto=self.producto, cantidad=1, precio_aplicado=monto)
+            return guia
+
+        self.ana_1 = venta(self.cliente, 1, 100)
+        Pago.objects.create(guia=self.ana_1, monto=40, comprobante_banco='OP-1')
+        self.ana_2 = venta(self.cliente, 10, 200)
+        self.beto = venta(beto, 5, 75)
+        self.caro_75 = venta(caro, 12, 75)
+        self.caro_33 = venta(caro, 15, 33)
+
+    def extracto(self):
+        return BytesIO((
+            "Fecha;Descripción;Monto;N° Operación;Celular\n"
+            "02/03/2026;ABONO;40,00;OP-1;\n"                      # ya registrado
+            "20/03/2026;YAPE DE +51 999 888 777;260;OP-2;\n"      # Ana: se reparte en sus 2 guías
+            "20/03/2026;TRANSF;75.00;OP-3;\n"                     # dos guías con saldo 75
+            "20/03/2026;TRANSF;33;OP-4;\n"                        # una sola guía con saldo 33
+            "21/03/2026;TRANSF;33;OP-4;\n"                        # N° repetido
+            "21/03/2026;TRANSF;999;OP-5;\n"                       # no calza con nada
+            "22/03/2026;COMISION;-5.00;OP-6;\n"                   # cargo: se ignora
+            "ayer;TRANSF;10;OP-7;\n"
+            "25/03/2026;YAPE;75;OP-9;988 777 666\n"               # Beto, por la columna celular
+            "\n"
+            "26/03/2026;TRANSF;1.234,50;;\n"                      # sin N° de operación
+        ).encode('utf-8-sig'))
+
+    def estados(self):
+        return {g.pk: g.estado_pago for g in GuiaEntrega.objects.all()}
+
+    def test_propuesta_creacion_y_segunda_corrida(self):
+        conteos = ('filas', 'rechazadas', 'ignoradas', 'registradas', 'conciliadas', 'ambiguas', 'sin_coincidencia', 'pagos')
+        antes = self.estados()
+        with CaptureQueriesContext(connection) as consultas:
+            resumen = conciliacion.conciliar_extracto(self.extracto(), 'banco.csv')
+        # pagos registrados, clientes por celular, sus guías, guías por monto (+ savepoint)
+        self.assertLessEqual(len(consultas), 6)
+        self.assertEqual([resumen[c] for c in conteos], [10, 1, 1, 1, 3, 3, 1, 4])
+        self.assertEqual(resumen['monto_conciliado'], Decimal('368.00'))
+        self.assertEqual(
+            [(f['operacion'], f['detalle']) for f in resumen['listado']['conciliadas']],
+            [
+                ('OP-2', f"N° {self.ana_1.numero_guia} (S/ 60.00), N° {self.ana_2.numero_guia} (S/ 200.00)"),
+                ('OP-4', f"N° {self.caro_33.numero_guia} (S/ 33.00)"),
+                ('OP-9', f"N° {self.beto.numero_guia} (S/ 75.00)"),
+            ],
+        )
+        self.assertEqual([f['fila'] for f in resumen['listado']['ambiguas']], [4, 6, 12])
+        self.assertIn('2 guías con saldo S/ 75.00', resumen['listado']['ambiguas'][0]['detalle'])
+        self.assertEqual(self.estados(), antes)  # solo propuesta
+        self.assertEqual(Pago.objects.count(), 1)
+
+        # Por bloques chicos sale lo mismo (el N° repetido y lo asignado se recuerdan entre bloques)
+        resumen = conciliacion.conciliar_extracto(self.extracto(), 'banco.csv', lote=2)
+        self.assertEqual([resumen[c] for c in conteos], [10, 1, 1, 1, 3, 3, 1, 4])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resumen = conciliacion.conciliar_extracto(self.extracto(), 'banco.csv', crear=True)
+        self.assertEqual((resumen['creado'], resumen['pagos']), (True, 4))
+        self.assertEqual(Pago.objects.filter(comprobante_banco='OP-2').count(), 2)
+        estados = self.estados()
+        self.assertEqual(
+            [estados[g.pk] for g in (self.ana_1, self.ana_2, self.beto, self.caro_75, self.caro_33)],
+            ['PAGADO', 'PAGADO', 'PAGADO', 'PENDIENTE', 'PAGADO'],
+        )
+        self.assertEqual(GuiaEntrega.objects.get(pk=self.ana_1.pk).monto_cobrado, Decimal('100.00'))
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2026, 3, 10)).total_cobrado, Decimal('200.00'))
+
+        # Otra vez el mismo extracto: lo ya cargado sale como registrado; OP-3 ya solo calza con la guía de Caro
+        resumen = conciliacion.conciliar_extracto(self.extracto(), 'banco.csv')
+        self.assertEqual((resumen['registradas'], resumen['conciliadas'], resumen['pagos']), (5, 1, 1))
+        self.assertEqual(resumen['listado']['conciliadas'][0]['operacion'], 'OP-3')
+
+    def test_celular_en_la_descripcion(self):
+        casos = {
+            'YAPE DE 987654321 150.00': '987654321',
+            'YAPE 987654321 2026': '987654321',
+            'YAPE DE +51 999 888 777': '999888777',
+            'PLIN 51-987-654-321 OK': '987654321',
+            'TRANSF 20/03 987654321': '987654321',
+            'OPERACION 1987654321': None,
+            'ABONO 150 20260320': None,
+        }
+        self.assertEqual({texto: conciliacion._celular(texto) for texto in casos}, casos)
+        self.assertEqual(conciliacion._celular(None, 988777666), '988777666')  # celda numérica del XLSX
+
+    def test_xlsx_admin_y_comando(self):
+        libro = openpyxl.Workbook()
+        hoja = libro.active
+        hoja.append(['Fecha de operación', 'Glosa', 'Importe', 'Nro. Operación'])
+        hoja.append([datetime(2026, 3, 20, 10, 30), 'TRANSF', 33, 'OP-4'])
+        hoja.append([date(2026, 3, 21), 'YAPE DE 999888777', 60.0, 'OP-8'])
+        archivo = BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+        archivo.name = 'extracto.xlsx'
+
+        self.client.force_login(self.admin)
+        respuesta = self.client.post(reverse('admin:gestion_guiaentrega_conciliar'), {'archivo': archivo, 'crear': 'on'})
+        self.assertContains(respuesta, 'id="resumen-conciliacion"')
+        self.assertEqual((respuesta.context['resumen']['conciliadas'], respuesta.context['resumen']['pagos']), (2, 2))
+        self.assertEqual(GuiaEntrega.objects.get(pk=self.ana_1.pk).estado_pago, 'PAGADO')
+
+        with self.assertRaisesMessage(conciliacion.ErrorImportacion, 'Faltan columnas: operacion'):
+            conciliacion.conciliar_extracto(BytesIO(b"fecha;monto\n01/03/2026;10\n"), 'banco.csv')
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as extracto:
+            extracto.write(self.extracto().getvalue())
+            extracto.flush()
+            salida = StringIO()
+            call_command('conciliar_banco', extracto.name, stdout=salida)
+        self.assertIn('Propuesta (usa --crear para guardar)', salida.getvalue())
+        self.assertIn('Fila 12 (sin N°): Sin N° de operación', salida.getvalue())
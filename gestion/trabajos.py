@@ -0,0 +1,147 @@
+"""
+Cola de trabajos de reportes usando solo la base de datos (sin Redis ni
+servicios externos). La vista encola un TrabajoReporte y responde al toque;
+`manage.py procesar_reportes` toma los pendientes uno por uno, guarda el
+archivo en MEDIA_ROOT/reportes/ y actualiza el progreso para que la página
+de estado lo vaya mostrando.
+"""
+import logging
+import tempfile
+from datetime import date, timedelta
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import GuiaEntrega, TrabajoReporte
+from .pdf_guias import motor_elegido, obtener_pdf, pdfs_lote, unir_pdfs, zip_pdfs
+from .reportes import escribir_excel_antiguedad, escribir_excel_reporte
+
+logger = logging.getLogger(__name__)
+
+HORAS_VIGENCIA = 24
+# Un trabajo "procesando" por más tiempo que esto quedó huérfano (worker caído)
+MINUTOS_MAXIMO_PROCESANDO = 60
+
+
+def encolar(tipo, parametros, usuario=None):
+    return TrabajoReporte.objects.create(tipo=tipo, parametros=parametros, solicitado_por=usuario)
+
+
+def encolar_pdf_guias(guias_ids):
+    """Encola el pre-render de PDF de las guías que existan y no tengan ya uno en cola."""
+    en_cola = {
+        p['guia_id'] for p in TrabajoReporte.objects.filter(tipo='PDF_GUIA', estado='PENDIENTE').values_list('parametros', flat=True)
+    }
+    existentes = GuiaEntrega.objects.filter(pk__in=guias_ids).exclude(pk__in=en_cola).values_list('pk', flat=True)
+    TrabajoReporte.objects.bulk_create([
+        TrabajoReporte(tipo='PDF_GUIA', parametros={'guia_id': pk}) for pk in existentes
+    ])
+
+
+def tomar_siguiente():
+    """
+    Reserva el trabajo pendiente más antiguo. La reserva es un UPDATE
+    condicionado a estado='PENDIENTE': si otro worker lo tomó primero, el
+    UPDATE afecta 0 filas y probamos con el siguiente (funciona igual en
+    SQLite y Postgres, sin depender de SELECT ... FOR UPDATE).
+    """
+    while True:
+        pk = TrabajoReporte.objects.filter(estado='PENDIENTE').order_by('id').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        tomado = TrabajoReporte.objects.filter(pk=pk, estado='PENDIENTE').update(
+            estado='PROCESANDO', iniciado=timezone.now(), progreso=0,
+        )
+        if tomado:
+            return TrabajoReporte.objects.get(pk=pk)
+
+
+def _reportar_progreso(trabajo):
+    ultimo = {'valor': -1}
+
+    def progreso(fraccion):
+        valor = min(99, int(fraccion * 100))
+        if valor != ultimo['valor']:  # 1 UPDATE por punto porcentual como máximo
+            ultimo['valor'] = valor
+            TrabajoReporte.objects.filter(pk=trabajo.pk).update(progreso=valor)
+    return progreso
+
+
+# --- GENERADORES POR TIPO ---
+def _generar_excel(trabajo, progreso):
+    fecha_inicio = trabajo.parametros['fecha_inicio']
+    fecha_fin = trabajo.parametros['fecha_fin']
+    nombre = f"Reporte_MyM_{fecha_inicio}_{fecha_fin}.xlsx"
+    with tempfile.TemporaryFile() as temporal:
+        escribir_excel_reporte(fecha_inicio, fecha_fin, temporal, progreso=progreso)
+        temporal.seek(0)
+        trabajo.archivo.save(nombre, File(temporal), save=False)
+
+
+def _generar_excel_cobranza(trabajo, progreso):
+    fecha_corte = date.fromisoformat(trabajo.parametros['fecha_corte'])
+    with tempfile.TemporaryFile() as temporal:
+        escribir_excel_antiguedad(fecha_corte, temporal, progreso=progreso)
+        temporal.seek(0)
+        trabajo.archivo.save(f"Cuentas_por_cobrar_{fecha_corte}.xlsx", File(temporal), save=False)
+
+
+def _generar_pdf_guia(trabajo, progreso):
+    guia_id = trabajo.parametros['guia_id']
+    motor = motor_elegido(trabajo.parametros.get('motor'))  # el de PDF_MOTOR si no se pidió otro
+    if GuiaEntrega.objects.filter(pk=guia_id).exists():  # pudo borrarse mientras esperaba
+        ruta, _ = obtener_pdf(guia_id, motor=motor)
+        if ruta is None:
+            raise RuntimeError(f"no se pudo generar el PDF de la guía {guia_id} ({motor})")
+
+
+def _generar_pdf_lote(trabajo, progreso):
+    pdfs = pdfs_lote(trabajo.parametros['guias'], progreso=progreso, motor=trabajo.parametros.get('motor'))
+    if trabajo.parametros.get('formato') == 'zip':
+        trabajo.archivo.save(f"Guias_{trabajo.pk}.zip", ContentFile(zip_pdfs(pdfs)), save=False)
+    else:
+        trabajo.archivo.save(f"Guias_{trabajo.pk}.pdf", ContentFile(unir_pdfs(pdfs)), save=False)
+
+
+GENERADORES = {
+    'EXCEL': _generar_excel,
+    'PDF_GUIA': _generar_pdf_guia,
+    'PDF_LOTE': _generar_pdf_lote,
+    'EXCEL_COBRANZA': _generar_excel_cobranza,
+}
+
+
+def ejecutar(trabajo):
+    try:
+        GENERADORES[trabajo.tipo](trabajo, _reportar_progreso(trabajo))
+    except Exception as error:
+        logger.exception("Falló el trabajo de reporte %s", trabajo.pk)
+        trabajo.estado = 'ERROR'
+        trabajo.mensaje = str(error)
+    else:
+        trabajo.estado = 'TERMINADO'
+        trabajo.progreso = 100
+    # También los de ERROR vencen: si no, limpiar_vencidos nunca los borra
+    trabajo.terminado = timezone.now()
+    trabajo.expira = trabajo.terminado + timedelta(hours=HORAS_VIGENCIA)
+    trabajo.save(update_fields=['estado', 'mensaje', 'progreso', 'archivo', 'terminado', 'expira'])
+    return trabajo
+
+
+def limpiar_vencidos():
+    """Borra los archivos y registros vencidos y marca como error los trabajos huérfanos."""
+    ahora = timezone.now()
+    huerfanos = TrabajoReporte.objects.filter(
+        estado='PROCESANDO', iniciado__lt=ahora - timedelta(minutes=MINUTOS_MAXIMO_PROCESANDO),
+    ).update(
+        estado='ERROR', mensaje='Interrumpido: el proceso que lo generaba se detuvo.',
+        terminado=ahora, expira=ahora + timedelta(hours=HORAS_VIGENCIA),
+    )
+
+    vencidos = list(TrabajoReporte.objects.filter(expira__lt=ahora))
+    for trabajo in vencidos:
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+    TrabajoReporte.objects.filter(pk__in=[t.pk for t in vencidos]).delete()
+    return len(vencidos), huerfanos
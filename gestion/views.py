@@ -1,48 +1,90 @@
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import json
+import tempfile
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import get_template
-from django.db.models import Sum, Count  # <--- SE AGREGÓ 'Count' AQUÍ
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.db.models import Count, Max
 from django.utils import timezone
 from datetime import datetime, timedelta
-from xhtml2pdf import pisa
 from django.contrib import admin
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 
 # Importamos los modelos necesarios
-from .models import GuiaEntrega, Producto, Gasto, Cliente
+from .models import GuiaEntrega, Producto, Cliente, TrabajoReporte, PeriodoNomina
+from .reportes import (
+    calcular_kpis, escribir_excel_reporte, periodo_anterior, rendimiento_asesores,
+    TRAMOS_ANTIGUEDAD, antiguedad_por_cobrar, cartera_por_cobrar, deudores, rango_tramo,
+    PLAZOS_POR_PAGAR, resumen_por_pagar,
+)
+from . import cache as cache_reportes
+from . import cobranza
+from . import trabajos
+from . import pdf_guias
+from . import nomina
 
 # --- VISTA 1: GENERADOR DE PDF ---
+# El PDF sale de la caché en disco (pdf_guias.py); solo se renderiza cuando
+# cambió la guía. El ETag es la versión, así el modal "Ver" no lo vuelve a bajar.
 def generar_pdf_guia(request, guia_id):
-    guia = get_object_or_404(GuiaEntrega, pk=guia_id)
-    detalles = guia.detalles.all()
-    saldo_pendiente = guia.total_venta - guia.monto_cobrado
-    
-    context = {
-        'guia': guia,
-        'detalles': detalles,
-        'saldo_pendiente': saldo_pendiente,
-    }
-    
-    template_path = 'gestion/guia_pdf.html'
-    response = HttpResponse(content_type='application/pdf')
-    
+    motor = request.GET.get('motor')  # ?motor=reportlab para probar el motor directo
+    version = pdf_guias.version_guia(guia_id, motor)
+    if version is None:
+        raise Http404("Guía no encontrada")
+
+    etag = f'"{version}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    archivo, version_o_html = pdf_guias.abrir_pdf(guia_id, version, motor)
+    if archivo is None:
+        return HttpResponse('Tuvimos errores <pre>' + version_o_html + '</pre>')
+
     # Lógica para ver en modal (inline) vs descargar (attachment)
     if request.GET.get('ver') == 'true':
         disposition = 'inline'
     else:
         disposition = 'attachment'
 
-    response['Content-Disposition'] = f'{disposition}; filename="Guia-{guia.numero_guia}.pdf"'
-    
-    template = get_template(template_path)
-    html = template.render(context)
+    numero = GuiaEntrega.objects.values_list('numero_guia', flat=True).get(pk=guia_id)
+    response = FileResponse(archivo, content_type='application/pdf')
+    response['Content-Disposition'] = f'{disposition}; filename="Guia-{numero}.pdf"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'  # que el navegador pregunte siempre con If-None-Match
+    return response
+
+# --- VISTA 1B: VARIAS GUÍAS EN UN SOLO PDF (O ZIP) ---
+# Para que el chofer imprima las entregas del día de una vez. Hasta
+# LOTE_MAXIMO_DIRECTO guías se responde en la misma petición; más que eso se
+# encola para `manage.py procesar_reportes` y se va a la página de estado.
+# Una guía sin caché tarda ~0,45 s con xhtml2pdf: 20 guías entran de sobra en
+# los 30 s de timeout de gunicorn aun con un solo núcleo.
+LOTE_MAXIMO_DIRECTO = 20
+
+@login_required(login_url='/adminconfiguracion/login/')
+def generar_pdf_guias_lote(request):
+    ids = [int(i) for i in request.GET.get('ids', '').split(',') if i.strip().isdigit()]
+    formato = 'zip' if request.GET.get('formato') == 'zip' else 'pdf'
+    motor = request.GET.get('motor')
+    if not ids:
+        return HttpResponse("No se seleccionaron guías.", status=400)
 
-    pisa_status = pisa.CreatePDF(html, dest=response)
+    if len(ids) > LOTE_MAXIMO_DIRECTO:
+        trabajo = trabajos.encolar('PDF_LOTE', {'guias': ids, 'formato': formato, 'motor': motor}, request.user)
+        return redirect('trabajo_reporte', trabajo_id=trabajo.pk)
 
-    if pisa_status.err:
-        return HttpResponse('Tuvimos errores <pre>' + html + '</pre>')
+    # En la petición sin pool de procesos: no se hace fork dentro del worker web
+    pdfs = pdf_guias.pdfs_lote(ids, procesos=1, motor=motor)
+    if formato == 'zip':
+        response = HttpResponse(pdf_guias.zip_pdfs(pdfs), content_type='application/zip')
+    else:
+        response = HttpResponse(pdf_guias.unir_pdfs(pdfs), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="Guias-{timezone.localdate()}.{formato}"'
     return response
 
 # --- VISTA 2: DASHBOARD GERENCIAL (PROTEGIDO 🔒) ---
@@ -61,41 +103,44 @@ def dashboard_analiticas(request):
     fecha_inicio = request.GET.get('fecha_inicio', inicio_mes.strftime('%Y-%m-%d'))
     fecha_fin = request.GET.get('fecha_fin', hoy.strftime('%Y-%m-%d'))
 
-    # 2. Filtrar
-    ventas = GuiaEntrega.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin])
-    gastos = Gasto.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin])
-
-    # 3. Calcular
-    total_ventas = ventas.aggregate(total=Sum('total_venta'))['total'] or 0
-    total_cobrado = ventas.aggregate(total=Sum('monto_cobrado'))['total'] or 0
-    total_gastos = gastos.aggregate(total=Sum('monto'))['total'] or 0
-    
-    deuda_calle = 0
-    for g in GuiaEntrega.objects.exclude(estado_pago='PAGADO'):
-        deuda_calle += (g.total_venta - g.monto_cobrado)
+    # 2. Calcular (KPIs en 2 consultas, ver reportes.calcular_kpis) o tomarlo
+    #    de la caché si nada cambió desde la última vez (ver cache.py)
+    def calcular():
+        ventas = GuiaEntrega.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin])
+        return {
+            **calcular_kpis(fecha_inicio, fecha_fin),
+            'productos_bajo_stock': list(Producto.objects.filter(stock_actual__lte=10).order_by('stock_actual')[:5]),
+            'ultimas_ventas': list(ventas.select_related('cliente').order_by('-fecha_emision')[:10]),
+        }
 
-    ganancia_neta = total_ventas - total_gastos
+    datos = cache_reportes.obtener_o_calcular('dashboard', (fecha_inicio, fecha_fin), calcular)
 
-    productos_bajo_stock = Producto.objects.filter(stock_actual__lte=10).order_by('stock_actual')[:5]
-    ultimas_ventas = ventas.order_by('-fecha_emision')[:10]
+    # Cuentas por pagar: no dependen del rango, solo del día (vencido / esta semana)
+    por_pagar = cache_reportes.obtener_o_calcular('por_pagar', (hoy,), lambda: resumen_por_pagar(hoy))
 
-    # 4. PREPARAR EL MENÚ LATERAL
+    # 3. PREPARAR EL MENÚ LATERAL
     context = admin.site.each_context(request)
     
+    context.update(datos)
     context.update({
-        'total_ventas': total_ventas,
-        'total_cobrado': total_cobrado,
-        'total_gastos': total_gastos,
-        'ganancia_neta': ganancia_neta,
-        'deuda_calle': deuda_calle,
-        'productos_bajo_stock': productos_bajo_stock,
-        'ultimas_ventas': ultimas_ventas,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
+        'por_pagar': por_pagar,
+        'plazos_por_pagar': [
+            {'titulo': titulo, 'monto': por_pagar['totales'][campo], 'vencimiento': campo}
+            for campo, titulo in PLAZOS_POR_PAGAR
+        ],
     })
     
     return render(request, 'gestion/dashboard.html', context)
 
+# --- VISTA 2B: ESTADÍSTICAS DE LA CACHÉ DEL DASHBOARD (PROTEGIDO 🔒) ---
+@login_required(login_url='/adminconfiguracion/login/')
+def estadisticas_cache(request):
+    if not request.user.is_superuser:
+        return redirect('/adminconfiguracion/')
+    return JsonResponse(cache_reportes.estadisticas())
+
 # --- VISTA 3: EXPORTAR EXCEL (PROTEGIDO 🔒) ---
 @login_required(login_url='/adminconfiguracion/login/')
 def exportar_reporte_excel(request):
@@ -111,79 +156,69 @@ def exportar_reporte_excel(request):
     fecha_inicio = request.GET.get('fecha_inicio', inicio_mes.strftime('%Y-%m-%d'))
     fecha_fin = request.GET.get('fecha_fin', hoy.strftime('%Y-%m-%d'))
 
-    # 2. Consultar datos
-    ventas = GuiaEntrega.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin])
-    gastos = Gasto.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin])
+    # 2. Armar el Excel en un archivo temporal (memoria constante, ver
+    #    reportes.escribir_excel_reporte) y enviarlo por partes
+    archivo = tempfile.TemporaryFile()
+    escribir_excel_reporte(fecha_inicio, fecha_fin, archivo)
+    archivo.seek(0)
 
-    # 3. Crear el libro de Excel
-    wb = openpyxl.Workbook()
-    
-    # --- HOJA 1: RESUMEN Y VENTAS ---
-    ws = wb.active
-    ws.title = "Reporte Ventas"
-    
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="2c3e50", end_color="2c3e50", fill_type="solid")
-    
-    ws['A1'] = f"REPORTE DE MOVIMIENTOS: {fecha_inicio} al {fecha_fin}"
-    ws['A1'].font = Font(bold=True, size=14)
-    ws.merge_cells('A1:E1')
+    response = FileResponse(archivo, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response['Content-Disposition'] = f'attachment; filename=Reporte_MyM_{fecha_inicio}_{fecha_fin}.xlsx'
+    return response
 
-    headers = ["Fecha", "Guía N°", "Cliente", "Estado", "Total (S/.)"]
-    ws.append([]) 
-    ws.append(headers)
-    
-    for cell in ws[3]:
-        cell.fill = header_fill
-        cell.font = header_font
-
-    total_ventas = 0
-    for v in ventas:
-        ws.append([
-            v.fecha_emision,
-            v.numero_guia,
-            v.cliente.nombre_contacto,
-            v.get_estado_pago_display(),
-            v.total_venta
-        ])
-        total_ventas += v.total_venta
-    
-    ws.append(["", "", "", "TOTAL VENTAS:", total_ventas])
-    ws[f'E{ws.max_row}'].font = Font(bold=True)
+# --- VISTA 3B: EXCEL EN SEGUNDO PLANO ---
+# El botón del dashboard encola el reporte y responde al toque; el archivo lo
+# genera `manage.py procesar_reportes` y se descarga desde la página de estado.
+@login_required(login_url='/adminconfiguracion/login/')
+def encolar_reporte_excel(request):
+    if not request.user.is_superuser:
+        return redirect('/adminconfiguracion/')
 
-    # --- HOJA 2: GASTOS ---
-    ws2 = wb.create_sheet("Gastos")
-    ws2['A1'] = "DETALLE DE GASTOS Y COMPRAS"
-    ws2['A1'].font = Font(bold=True, size=14)
+    hoy = timezone.now().date()
+    parametros = {
+        'fecha_inicio': request.GET.get('fecha_inicio', hoy.replace(day=1).strftime('%Y-%m-%d')),
+        'fecha_fin': request.GET.get('fecha_fin', hoy.strftime('%Y-%m-%d')),
+    }
+    trabajo = trabajos.encolar('EXCEL', parametros, request.user)
+    return redirect('trabajo_reporte', trabajo_id=trabajo.pk)
 
-    headers_gastos = ["Fecha", "Proveedor", "Descripción", "Categoría", "Estado", "Monto (S/.)"]
-    ws2.append([])
-    ws2.append(headers_gastos)
-    
-    for cell in ws2[3]:
-        cell.fill = PatternFill(start_color="c0392b", end_color="c0392b", fill_type="solid")
-        cell.font = header_font
-
-    total_gastos = 0
-    for g in gastos:
-        ws2.append([
-            g.fecha_emision,
-            g.proveedor.razon_social,
-            g.descripcion,
-            g.get_categoria_display(),
-            g.get_estado_display(),
-            g.monto
-        ])
-        total_gastos += g.monto
-
-    ws2.append(["", "", "", "", "TOTAL GASTOS:", total_gastos])
-    ws2[f'F{ws2.max_row}'].font = Font(bold=True)
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename=Reporte_MyM_{fecha_inicio}_{fecha_fin}.xlsx'
-    
-    wb.save(response)
-    return response
+
+def _trabajo_del_usuario(request, trabajo_id):
+    # Cada quien ve sus reportes; el superusuario ve todos
+    trabajo = get_object_or_404(TrabajoReporte, pk=trabajo_id)
+    if not request.user.is_superuser and trabajo.solicitado_por_id != request.user.pk:
+        return None
+    return trabajo
+
+
+@login_required(login_url='/adminconfiguracion/login/')
+def trabajo_reporte(request, trabajo_id):
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if trabajo is None:
+        return redirect('/adminconfiguracion/')
+    return render(request, 'gestion/trabajo_reporte.html', {'trabajo': trabajo})
+
+
+@login_required(login_url='/adminconfiguracion/login/')
+def api_trabajo_reporte(request, trabajo_id):
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if trabajo is None:
+        return JsonResponse({'error': 'Sin permiso'}, status=403)
+    return JsonResponse({
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'descarga': reverse('descargar_trabajo_reporte', args=[trabajo.pk]) if trabajo.estado == 'TERMINADO' else None,
+    })
+
+
+@login_required(login_url='/adminconfiguracion/login/')
+def descargar_trabajo_reporte(request, trabajo_id):
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if trabajo is None or trabajo.estado != 'TERMINADO' or not trabajo.archivo:
+        return HttpResponse("El reporte no está disponible.", status=404)
+    return FileResponse(trabajo.archivo.open('rb'), as_attachment=True, filename=trabajo.archivo.name.split('/')[-1])
 
 # --- VISTA 4: HEALTH CHECK ---
 def health_check(request):
@@ -217,7 +252,110 @@ def api_info_cliente(request, cliente_id):
     except Cliente.DoesNotExist:
         return JsonResponse({'error': 'Cliente no encontrado', 'direccion': ''}, status=404)
 
-# --- VISTA 7: REPORTE DE ASESORES (NUEVA) ---
+
+def _direccion_cliente(cliente):
+    return cliente.direccion_principal or f"Dirección registrada en {cliente.ciudad}"
+
+
+def _ids(request, parametro, maximo=500):
+    ids = set()
+    for valor in request.GET.get(parametro, '').split(','):
+        if valor.strip().isdigit():
+            ids.add(int(valor))
+    return sorted(ids)[:maximo]
+
+
+# --- VISTA 6B: API EN LOTE (UNA PETICIÓN POR FORMULARIO, NO UNA POR FILA) ---
+# /api/info/?productos=1,2,3&clientes=7 -> precio y stock de cada producto y
+# dirección de cada cliente, una consulta por modelo. Los ids que no existen
+# simplemente no vienen en la respuesta.
+@login_required(login_url='/adminconfiguracion/login/')
+@cache_control(private=True, no_cache=True)
+def api_info_lote(request):
+    productos = _ids(request, 'productos')
+    clientes = _ids(request, 'clientes')
+    data = {'productos': {}, 'clientes': {}}
+    if productos:
+        for pk, precio, stock in Producto.objects.filter(pk__in=productos).values_list('pk', 'precio_unitario', 'stock_actual'):
+            data['productos'][pk] = {'precio': float(precio), 'stock': stock}
+    if clientes:
+        for cliente in Cliente.objects.filter(pk__in=clientes).only('direccion_principal', 'ciudad'):
+            data['clientes'][cliente.pk] = {'direccion': _direccion_cliente(cliente)}
+    return JsonResponse(data)
+
+
+# --- VISTA 6C: CATÁLOGO DE PRECIOS COMPLETO (CON ETag / Last-Modified) ---
+# Versión = (cantidad de productos, último Producto.actualizado): cambia con
+# cualquier alta, baja o edición. El navegador guarda el JSON y en cada
+# formulario solo pregunta "¿cambió?" (If-None-Match) y recibe un 304 vacío.
+def _version_catalogo(request):
+    if not hasattr(request, '_version_catalogo'):
+        request._version_catalogo = Producto.objects.aggregate(total=Count('id'), ultimo=Max('actualizado'))
+    return request._version_catalogo
+
+
+def _etag_catalogo(request):
+    version = _version_catalogo(request)
+    ultimo = version['ultimo'].timestamp() if version['ultimo'] else 0
+    return f"catalogo-{version['total']}-{ultimo:.6f}"
+
+
+def _modificado_catalogo(request):
+    return _version_catalogo(request)['ultimo']
+
+
+@login_required(login_url='/adminconfiguracion/login/')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_catalogo, last_modified_func=_modificado_catalogo)
+def api_catalogo_productos(request):
+    precios = {
+        pk: float(precio)
+        for pk, precio in Producto.objects.values_list('pk', 'precio_unitario').iterator(chunk_size=2000)
+    }
+    return JsonResponse({'precios': precios})
+
+# --- VISTA 6D: PAGO DE UN CLIENTE REPARTIDO EN SUS GUÍAS (API) ---
+# POST /api/cliente/<id>/pago/ con monto y comprobante_banco (JSON o formulario):
+# se reparte de la guía más antigua a la más nueva, ver cobranza.py
+@login_required(login_url='/adminconfiguracion/login/')
+@require_POST
+def api_registrar_pago(request, cliente_id):
+    if not request.user.has_perm('gestion.add_pago'):
+        return JsonResponse({'error': 'Sin permiso'}, status=403)
+    get_object_or_404(Cliente, pk=cliente_id)
+    if request.content_type == 'application/json':
+        try:
+            datos = json.loads(request.body)
+        except ValueError:
+            datos = None
+        if not isinstance(datos, dict):
+            return JsonResponse({'error': 'JSON inválido: se espera un objeto con monto y comprobante_banco'}, status=400)
+    else:
+        datos = request.POST
+    formulario = cobranza.FormularioPago(datos)
+    if not formulario.is_valid():
+        return JsonResponse({'error': formulario.primer_error()}, status=400)
+    try:
+        resultado = cobranza.registrar_pago_cliente(cliente_id, **formulario.cleaned_data)
+    except cobranza.ErrorPago as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(resultado)
+
+# --- VISTA 7: REPORTE DE ASESORES ---
+# Ranking y variación contra el periodo anterior salen de una sola consulta
+# con funciones de ventana (reportes.rendimiento_asesores).
+def _rango_asesores(request):
+    hoy = timezone.now().date()
+    try:
+        fecha_inicio = datetime.strptime(request.GET.get('fecha_inicio', ''), '%Y-%m-%d').date()
+        fecha_fin = datetime.strptime(request.GET.get('fecha_fin', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fecha_inicio, fecha_fin = hoy.replace(day=1), hoy
+    if fecha_fin < fecha_inicio:
+        fecha_inicio, fecha_fin = fecha_fin, fecha_inicio
+    return fecha_inicio, fecha_fin
+
+
 @login_required(login_url='/adminconfiguracion/login/')
 def reporte_asesores(request):
     
@@ -225,34 +363,122 @@ def reporte_asesores(request):
     if not request.user.is_superuser:
         return redirect('/adminconfiguracion/')
 
-    # 1. Obtener fechas del filtro
-    hoy = timezone.now().date()
-    inicio_mes = hoy.replace(day=1)
-    
-    fecha_inicio = request.GET.get('fecha_inicio', inicio_mes.strftime('%Y-%m-%d'))
-    fecha_fin = request.GET.get('fecha_fin', hoy.strftime('%Y-%m-%d'))
+    fecha_inicio, fecha_fin = _rango_asesores(request)
+    anterior_inicio, anterior_fin = periodo_anterior(fecha_inicio, fecha_fin)
+    reporte = rendimiento_asesores(fecha_inicio, fecha_fin)
 
-    # 2. Filtramos las ventas (GuiaEntrega)
-    ventas = GuiaEntrega.objects.filter(fecha_emision__range=[fecha_inicio, fecha_fin])
-
-    # 3. Agrupamos por usuario
-    # IMPORTANTE: Esto asume que tu modelo GuiaEntrega tiene un campo 'usuario'.
-    # Si en tu modelo se llama 'vendedor', cambia 'usuario' por 'vendedor' abajo.
-    reporte = ventas.values(
-        'usuario__username', 
-        'usuario__first_name', 
-        'usuario__last_name'
-    ).annotate(
-        cantidad_ventas=Count('id'),
-        total_dinero=Sum('total_venta')
-    ).order_by('-total_dinero')
-
-    # 4. Contexto para el template (incluyendo menú lateral de admin)
+    # Contexto para el template (incluyendo menú lateral de admin)
     context = admin.site.each_context(request)
     context.update({
         'reporte': reporte,
-        'fecha_inicio': fecha_inicio,
-        'fecha_fin': fecha_fin,
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': fecha_fin.isoformat(),
+        'anterior_inicio': anterior_inicio,
+        'anterior_fin': anterior_fin,
+        'total_guias': sum(fila['cantidad'] for fila in reporte),
+        'total_vendido': sum(fila['total'] for fila in reporte),
+        'total_cobrado': sum(fila['cobrado'] for fila in reporte),
     })
     
-    return render(request, 'gestion/reporte_asesores.html', context)
\ No newline at end of file
+    return render(request, 'gestion/reporte_asesores.html', context)
+
+
+# Los mismos números en JSON para los gráficos
+@login_required(login_url='/adminconfiguracion/login/')
+def api_reporte_asesores(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Sin permiso'}, status=403)
+
+    fecha_inicio, fecha_fin = _rango_asesores(request)
+    anterior_inicio, anterior_fin = periodo_anterior(fecha_inicio, fecha_fin)
+    dinero = ('total', 'cobrado', 'ticket_promedio', 'total_anterior', 'variacion', 'variacion_pct')
+    return JsonResponse({
+        'periodo': {'desde': fecha_inicio, 'hasta': fecha_fin},
+        'anterior': {'desde': anterior_inicio, 'hasta': anterior_fin},
+        'asesores': [
+            {**fila, **{campo: float(fila[campo]) if fila[campo] is not None else None for campo in dinero}}
+            for fila in rendimiento_asesores(fecha_inicio, fecha_fin)
+        ],
+    })
+
+
+# --- VISTA 7B: CUENTAS POR COBRAR POR ANTIGÜEDAD ---
+# Totales de la cartera en 1 consulta, la página de clientes ordenada por
+# deuda y el detalle por tramo solo de esos clientes (ver reportes.py).
+CLIENTES_POR_PAGINA = 50
+
+
+def _fecha_corte(request):
+    try:
+        return datetime.strptime(request.GET.get('fecha_corte', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return timezone.now().date()
+
+
+def _url_guias_abiertas(**filtros):
+    filtros = {'estado_pago__in': 'PENDIENTE,PARCIAL', **{k: v for k, v in filtros.items() if v is not None}}
+    return f"{reverse('admin:gestion_guiaentrega_changelist')}?{urlencode(filtros)}"
+
+
+@login_required(login_url='/adminconfiguracion/login/')
+def reporte_cobranza(request):
+    if not request.user.is_superuser:
+        return redirect('/adminconfiguracion/')
+
+    fecha_corte = _fecha_corte(request)
+    cartera = cartera_por_cobrar(fecha_corte)
+
+    paginador = Paginator(deudores(), CLIENTES_POR_PAGINA)
+    paginador.count = cartera['clientes']  # ya contado junto con los totales
+    pagina = paginador.get_page(request.GET.get('page'))
+    filas = list(antiguedad_por_cobrar(fecha_corte, clientes=[d['cliente_id'] for d in pagina]))
+
+    # Enlaces al listado de guías abiertas: por tramo, por cliente y por cliente+tramo
+    rangos = [(campo, titulo, *rango_tramo(fecha_corte, desde, hasta)) for campo, titulo, desde, hasta in TRAMOS_ANTIGUEDAD]
+    tramos = [
+        {'titulo': titulo, 'monto': cartera[campo], 'url': _url_guias_abiertas(fecha_emision__gte=inicio, fecha_emision__lte=fin)}
+        for campo, titulo, inicio, fin in rangos
+    ]
+    for fila in filas:
+        fila['url'] = _url_guias_abiertas(cliente__id__exact=fila['cliente_id'])
+        fila['celdas'] = [
+            {'monto': fila[campo], 'url': _url_guias_abiertas(cliente__id__exact=fila['cliente_id'], fecha_emision__gte=inicio, fecha_emision__lte=fin)}
+            for campo, _, inicio, fin in rangos
+        ]
+
+    context = admin.site.each_context(request)
+    context.update({
+        'fecha_corte': fecha_corte.isoformat(),
+        'cartera': cartera,
+        'tramos': tramos,
+        'filas': filas,
+        'pagina': pagina,
+    })
+    return render(request, 'gestion/reporte_cobranza.html', context)
+
+
+# Con decenas de miles de clientes el Excel tarda más que el timeout de
+# gunicorn: se encola como el del dashboard (VISTA 3B) y se baja desde la
+# página de estado.
+@login_required(login_url='/adminconfiguracion/login/')
+def exportar_cobranza_excel(request):
+    if not request.user.is_superuser:
+        return redirect('/adminconfiguracion/')
+
+    parametros = {'fecha_corte': _fecha_corte(request).isoformat()}
+    trabajo = trabajos.encolar('EXCEL_COBRANZA', parametros, request.user)
+    return redirect('trabajo_reporte', trabajo_id=trabajo.pk)
+
+
+# --- VISTA 8: RECIBOS DE UN PERIODO DE NÓMINA CERRADO ---
+# Salen tal como se guardaron al cerrar el periodo (ReciboNomina), sin recalcular.
+@login_required(login_url='/adminconfiguracion/login/')
+def recibos_periodo_nomina(request, periodo_id):
+    if not request.user.is_superuser:
+        return redirect('/adminconfiguracion/')
+    periodo = get_object_or_404(PeriodoNomina, pk=periodo_id)
+    return render(request, 'gestion/recibo_pago.html', {
+        'recibos': nomina.recibos_guardados(periodo),
+        'periodo': periodo,
+        'emitido': timezone.localtime(),
+    })
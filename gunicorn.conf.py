@@ -0,0 +1,55 @@
+# Configuración de gunicorn: se carga sola cuando se arranca desde la raíz del
+# proyecto (`gunicorn config.wsgi`), no hace falta pasar -c.
+import os
+
+
+def post_worker_init(worker):
+    # Cada worker deja listo el motor de PDFs (importaciones, plantilla, fuentes)
+    # antes de atender, así el primer "Ver PDF" no se come ese costo.
+    # PDF_CALENTAR=0 lo desactiva.
+    if os.environ.get('PDF_CALENTAR', '1') != '1':
+        return
+    from gestion.pdf_guias import calentar
+    try:
+        calentar()
+    except Exception:
+        worker.log.exception("No se pudo precalentar el render de PDFs")
+
+
+# --- WORKER DE REPORTES ---
+# Los Excel pesados y los PDFs en lote se encolan como TrabajoReporte y los
+# procesa `manage.py procesar_reportes`. Sin ese proceso se quedan en
+# PENDIENTE para siempre, así que el arbiter de gunicorn lo arranca junto con
+# la web (y lo relanza si se cae). Si el worker corre como servicio aparte
+# (por ejemplo un Background Worker de Render con
+# `python manage.py procesar_reportes`), poner REPORTES_WORKER=0.
+_grupo_worker_reportes = None
+
+
+def when_ready(server):
+    global _grupo_worker_reportes
+    if os.environ.get('REPORTES_WORKER', '1') != '1':
+        return
+    import shlex
+    import subprocess
+    import sys
+    comando = f"{shlex.quote(sys.executable)} manage.py procesar_reportes"
+    # El bucle queda en segundo plano y el `sh` sale al toque: así el arbiter
+    # no lo confunde con uno de sus workers al recoger procesos terminados.
+    lanzador = subprocess.Popen(
+        ['sh', '-c', f"while :; do {comando}; sleep 5; done &"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        start_new_session=True,  # grupo propio: on_exit lo cierra entero
+    )
+    _grupo_worker_reportes = lanzador.pid
+    server.log.info("Worker de reportes iniciado (grupo %s)", _grupo_worker_reportes)
+
+
+def on_exit(server):
+    if _grupo_worker_reportes is None:
+        return
+    import signal
+    try:
+        os.killpg(_grupo_worker_reportes, signal.SIGTERM)
+    except ProcessLookupError:
+        pass